@@ -0,0 +1,30 @@
+"""Add processed_commands
+
+Revision ID: 2f6d8a0c5e17
+Revises: 9b3c1f7e2a41
+Create Date: 2026-10-19 10:02:15.904417
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2f6d8a0c5e17"
+down_revision = "9b3c1f7e2a41"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "processed_commands",
+        sa.Column("idempotency_key", sa.String(length=255), nullable=False),
+        sa.Column("command_type", sa.String(length=255), nullable=False),
+        sa.Column("processed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("idempotency_key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("processed_commands")
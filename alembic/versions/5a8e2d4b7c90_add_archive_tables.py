@@ -0,0 +1,73 @@
+"""Add archive tables for exhausted batches
+
+Revision ID: 5a8e2d4b7c90
+Revises: c41e7b9d3f62
+Create Date: 2026-10-19 16:20:31.540912
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5a8e2d4b7c90"
+down_revision = "c41e7b9d3f62"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "batches_archive",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("reference", sa.String(length=255), nullable=True),
+        sa.Column("sku", sa.String(length=255), nullable=True),
+        sa.Column("purchased_quantity", sa.Integer(), nullable=False),
+        sa.Column("eta", sa.Date(), nullable=True),
+        sa.Column("allocated_quantity", sa.Integer(), nullable=False),
+        sa.Column("archived_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_batches_archive_sku"), "batches_archive", ["sku"], unique=False
+    )
+    op.create_table(
+        "allocations_archive",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("orderline_id", sa.Integer(), nullable=True),
+        sa.Column("batch_id", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_allocations_archive_batch_id"),
+        "allocations_archive",
+        ["batch_id"],
+        unique=False,
+    )
+    op.create_table(
+        "order_lines_archive",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("sku", sa.String(length=255), nullable=True),
+        sa.Column("qty", sa.Integer(), nullable=False),
+        sa.Column("orderid", sa.String(length=255), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_order_lines_archive_orderid"),
+        "order_lines_archive",
+        ["orderid"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_order_lines_archive_orderid"), table_name="order_lines_archive"
+    )
+    op.drop_table("order_lines_archive")
+    op.drop_index(
+        op.f("ix_allocations_archive_batch_id"), table_name="allocations_archive"
+    )
+    op.drop_table("allocations_archive")
+    op.drop_index(op.f("ix_batches_archive_sku"), table_name="batches_archive")
+    op.drop_table("batches_archive")
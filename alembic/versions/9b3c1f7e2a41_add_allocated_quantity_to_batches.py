@@ -0,0 +1,39 @@
+"""Add allocated_quantity to batches
+
+Revision ID: 9b3c1f7e2a41
+Revises: 4de895edd40c
+Create Date: 2026-10-19 09:12:44.318205
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9b3c1f7e2a41"
+down_revision = "4de895edd40c"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "batches",
+        sa.Column(
+            "allocated_quantity", sa.Integer(), server_default="0", nullable=False
+        ),
+    )
+    op.execute(
+        """
+        UPDATE batches SET allocated_quantity = (
+            SELECT COALESCE(SUM(order_lines.qty), 0)
+            FROM allocations
+            JOIN order_lines ON allocations.orderline_id = order_lines.id
+            WHERE allocations.batch_id = batches.id
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("batches", "allocated_quantity")
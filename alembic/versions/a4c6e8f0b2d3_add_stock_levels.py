@@ -0,0 +1,44 @@
+"""Add stock levels read model
+
+Revision ID: a4c6e8f0b2d3
+Revises: f3b5d7e9a1c2
+Create Date: 2026-10-19 19:12:44.518302
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a4c6e8f0b2d3"
+down_revision = "f3b5d7e9a1c2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "stock_levels",
+        sa.Column("sku", sa.String(length=255), nullable=False),
+        sa.Column("eta", sa.Date(), nullable=False),
+        sa.Column("purchased", sa.Integer(), nullable=False),
+        sa.Column("allocated", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("sku", "eta"),
+    )
+    # warehouse stock (no ETA) goes in the date.min bucket
+    op.execute(
+        """
+        INSERT INTO stock_levels (sku, eta, purchased, allocated)
+        SELECT sku, bucket, SUM(purchased_quantity), SUM(allocated_quantity)
+        FROM (
+            SELECT sku, COALESCE(eta, DATE '0001-01-01') AS bucket,
+                purchased_quantity, allocated_quantity
+            FROM batches
+        ) AS b
+        GROUP BY sku, bucket
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("stock_levels")
@@ -0,0 +1,38 @@
+"""Add dead letters for failed event handlers
+
+Revision ID: b2f4d6e8a013
+Revises: e7a3c5d91b08
+Create Date: 2026-10-19 17:48:40.116302
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b2f4d6e8a013"
+down_revision = "e7a3c5d91b08"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "dead_letters",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("handler", sa.String(length=255), nullable=False),
+        sa.Column("event_type", sa.String(length=255), nullable=False),
+        sa.Column("payload", sa.LargeBinary(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("failed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_dead_letters_handler"), "dead_letters", ["handler"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_dead_letters_handler"), table_name="dead_letters")
+    op.drop_table("dead_letters")
@@ -0,0 +1,24 @@
+"""Add the outcome of finished jobs
+
+Revision ID: b7d9f1a3c5e2
+Revises: a4c6e8f0b2d3
+Create Date: 2026-10-19 19:20:41.518306
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b7d9f1a3c5e2"
+down_revision = "a4c6e8f0b2d3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("jobs", sa.Column("result", sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("jobs", "result")
@@ -0,0 +1,24 @@
+"""Index order_lines.orderid
+
+Revision ID: c41e7b9d3f62
+Revises: 2f6d8a0c5e17
+Create Date: 2026-10-19 13:41:07.218734
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c41e7b9d3f62"
+down_revision = "2f6d8a0c5e17"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        op.f("ix_order_lines_orderid"), "order_lines", ["orderid"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_order_lines_orderid"), table_name="order_lines")
@@ -0,0 +1,37 @@
+"""Count each SKU's events since its last snapshot on a stream row
+
+Revision ID: c5e7a9b1d3f4
+Revises: b7d9f1a3c5e2
+Create Date: 2026-10-19 19:41:07.362815
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c5e7a9b1d3f4"
+down_revision = "b7d9f1a3c5e2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "event_streams",
+        sa.Column("sku", sa.String(length=255), nullable=False),
+        sa.Column("since_snapshot", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("sku"),
+    )
+    # snapshots are now stored as a single object rather than a one-item list;
+    # they are only a shortcut, so drop them and let every stream count afresh
+    op.execute("DELETE FROM product_snapshots")
+    op.execute(
+        "INSERT INTO event_streams (sku, since_snapshot)"
+        " SELECT sku, count(*) FROM event_store GROUP BY sku"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM product_snapshots")
+    op.drop_table("event_streams")
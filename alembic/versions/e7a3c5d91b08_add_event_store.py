@@ -0,0 +1,54 @@
+"""Add event store, product snapshots and projection checkpoints
+
+Revision ID: e7a3c5d91b08
+Revises: 5a8e2d4b7c90
+Create Date: 2026-10-19 17:05:12.208417
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e7a3c5d91b08"
+down_revision = "5a8e2d4b7c90"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "event_store",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("sku", sa.String(length=255), nullable=False),
+        sa.Column("sku_hash", sa.BigInteger(), nullable=False),
+        sa.Column("event_type", sa.String(length=255), nullable=False),
+        sa.Column("payload", sa.LargeBinary(), nullable=False),
+        sa.Column("recorded_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_event_store_sku"), "event_store", ["sku"], unique=False)
+    op.create_table(
+        "product_snapshots",
+        sa.Column("sku", sa.String(length=255), nullable=False),
+        sa.Column("sku_hash", sa.BigInteger(), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.Column("version_number", sa.Integer(), nullable=False),
+        sa.Column("state", sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint("sku"),
+    )
+    op.create_table(
+        "projection_checkpoints",
+        sa.Column("projection", sa.String(length=255), nullable=False),
+        sa.Column("partition", sa.Integer(), nullable=False),
+        sa.Column("partitions", sa.Integer(), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("projection", "partition"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("projection_checkpoints")
+    op.drop_table("product_snapshots")
+    op.drop_index(op.f("ix_event_store_sku"), table_name="event_store")
+    op.drop_table("event_store")
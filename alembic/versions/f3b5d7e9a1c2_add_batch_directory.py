@@ -0,0 +1,34 @@
+"""Add batch directory for sharded products
+
+Revision ID: f3b5d7e9a1c2
+Revises: d8c1a3f5b720
+Create Date: 2026-10-19 18:52:17.402611
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f3b5d7e9a1c2"
+down_revision = "d8c1a3f5b720"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "batch_directory",
+        sa.Column("reference", sa.String(length=255), nullable=False),
+        sa.Column("sku", sa.String(length=255), nullable=False),
+        sa.PrimaryKeyConstraint("reference"),
+    )
+    # the existing database becomes the home shard, holding every batch so far
+    op.execute(
+        "INSERT INTO batch_directory (reference, sku) "
+        "SELECT DISTINCT reference, sku FROM batches WHERE reference IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("batch_directory")
@@ -0,0 +1,60 @@
+"""Bulk batch import against one CreateBatch command per row.
+
+    python -m benchmarks.batch_import [--rows 5000] [--skus 100] [--url postgresql://...]
+"""
+from __future__ import annotations
+
+import argparse
+import pathlib
+import tempfile
+import time
+from unittest import mock
+
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.orm import clear_mappers, sessionmaker
+
+from src import bootstrap
+from src.adapters import orm, unit_of_work_strategy
+from src.domain import commands
+from src.service_layer import batch_import, messagebus
+
+
+def fresh_bus(engine: Engine) -> messagebus.MessageBus:
+    orm.mapper_registry.metadata.drop_all(engine)
+    orm.mapper_registry.metadata.create_all(engine)
+    clear_mappers()
+    return bootstrap.bootstrap(
+        start_orm=True,
+        uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(sessionmaker(bind=engine)),
+        notifications=mock.Mock(),
+        publish=lambda *args: None,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--skus", type=int, default=100)
+    parser.add_argument("--url")
+    args = parser.parse_args()
+    rows = [(f"b{i}", f"SKU{i % args.skus}", 100) for i in range(args.rows)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(args.url or f"sqlite:///{pathlib.Path(tmp) / 'b.db'}")
+
+        bus = fresh_bus(engine)
+        start = time.perf_counter()
+        for ref, sku, qty in rows:
+            bus.handle(commands.CreateBatch(ref=ref, sku=sku, qty=qty, eta=None))
+        elapsed = time.perf_counter() - start
+        print(f"commands: {args.rows / elapsed:.0f} rows/s")
+
+        bus = fresh_bus(engine)
+        lines = ["ref,sku,qty,eta", *(f"{r},{s},{q}," for r, s, q in rows)]
+        report = batch_import.import_batches(bus.uow, batch_import.CSV, lines)
+        print(f"import:   {report.rows_per_second:.0f} rows/s")
+        clear_mappers()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Per-message pydantic round trips versus the codec layer.
+
+    python -m benchmarks.codecs [--count 20000]
+"""
+from __future__ import annotations
+
+import argparse
+import timeit
+
+from pydantic import TypeAdapter
+
+from src.adapters import codecs
+from src.domain import commands, events
+
+
+def report(name: str, seconds: float, count: int) -> None:
+    print(f"{name:45} {count / seconds:12,.0f} msg/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=20_000)
+    args = parser.parse_args()
+    count = args.count
+
+    command = commands.ChangeBatchQuantity(ref="batch-001", qty=5)
+    event = events.Allocated(orderid="o1", sku="SKU", qty=3, batchref="b1")
+    views = [
+        events.AllocationsViewed(orderid="o1", sku=f"SKU{i}", batchref="b1")
+        for i in range(count)
+    ]
+
+    report(
+        "pydantic model_dump_json/model_validate_json",
+        timeit.timeit(
+            lambda: commands.ChangeBatchQuantity.model_validate_json(
+                command.model_dump_json()
+            ),
+            number=count,
+        ),
+        count,
+    )
+    report(
+        "uncached TypeAdapter per event",
+        timeit.timeit(
+            lambda: TypeAdapter(events.Allocated).validate_json(
+                TypeAdapter(events.Allocated).dump_json(event)
+            ),
+            number=count,
+        ),
+        count,
+    )
+    formats = [codecs.JSON] + ([codecs.MSGPACK] if codecs.msgpack else [])
+    for fmt in formats:
+        codec = codecs.Codec(fmt=fmt)
+        report(
+            f"codec[{fmt}] command round trip",
+            timeit.timeit(
+                lambda codec=codec: codec.decode(
+                    commands.ChangeBatchQuantity, codec.encode(command)
+                ),
+                number=count,
+            ),
+            count,
+        )
+        report(
+            f"codec[{fmt}] event round trip",
+            timeit.timeit(
+                lambda codec=codec: codec.decode(events.Allocated, codec.encode(event)),
+                number=count,
+            ),
+            count,
+        )
+        report(
+            f"codec[{fmt}] bulk round trip of {count:,} views",
+            timeit.timeit(
+                lambda codec=codec: codec.decode_many(
+                    events.AllocationsViewed,
+                    codec.encode_many(events.AllocationsViewed, views),
+                ),
+                number=1,
+            ),
+            count,
+        )
+
+
+if __name__ == "__main__":
+    main()
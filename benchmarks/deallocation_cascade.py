@@ -0,0 +1,70 @@
+"""Benchmarks a 1k-line deallocation cascade with coalescing and bulk reallocation.
+
+    python -m benchmarks.deallocation_cascade [--lines 1000]
+"""
+from __future__ import annotations
+
+import argparse
+import pathlib
+import tempfile
+import time
+from unittest import mock
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import clear_mappers, sessionmaker
+
+from src import bootstrap
+from src.adapters import orm, unit_of_work_strategy
+from src.domain import commands
+
+
+def run(
+    lines: int, coalesce_commands: bool, bulk_reallocation: bool
+) -> tuple[float, int]:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{pathlib.Path(tmp) / 'bench.db'}")
+        orm.mapper_registry.metadata.create_all(engine)
+        commits: list[None] = []
+        event.listen(engine, "commit", lambda conn: commits.append(None))
+
+        clear_mappers()
+        bus = bootstrap.bootstrap(
+            start_orm=True,
+            uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(sessionmaker(bind=engine)),
+            notifications=mock.Mock(),
+            publish=lambda *args: None,
+            coalesce_commands=coalesce_commands,
+            bulk_reallocation=bulk_reallocation,
+        )
+        bus.handle(commands.CreateBatch(ref="b1", sku="SKU", qty=lines, eta=None))
+        bus.handle(commands.CreateBatch(ref="b2", sku="SKU", qty=lines, eta=None))
+        for i in range(lines):
+            bus.handle(commands.Allocate(orderid=f"o{i}", sku="SKU", qty=1))
+
+        commits.clear()
+        start = time.perf_counter()
+        bus.handle(commands.ChangeBatchQuantity(ref="b1", qty=0))
+        elapsed = time.perf_counter() - start
+        clear_mappers()
+        return elapsed, len(commits)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=1000)
+    args = parser.parse_args()
+    for coalesce_commands, bulk_reallocation in [
+        (False, False),
+        (True, False),
+        (False, True),
+    ]:
+        elapsed, commits = run(args.lines, coalesce_commands, bulk_reallocation)
+        print(
+            f"coalesce_commands={coalesce_commands!s:5}"
+            f" bulk_reallocation={bulk_reallocation!s:5} lines={args.lines}"
+            f" elapsed={elapsed:.2f}s commits={commits}"
+        )
+
+
+if __name__ == "__main__":
+    main()
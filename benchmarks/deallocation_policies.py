@@ -0,0 +1,67 @@
+"""Cascade size and speed of the deallocation policies.
+
+Shrinks a batch holding lines of mixed sizes and reports how many lines each
+policy evicts, against evicting lines in arbitrary order (the old behaviour).
+
+    python -m benchmarks.deallocation_policies [--lines 1000] [--seed 0]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import timeit
+from collections.abc import Collection
+
+from src.domain import deallocation
+from src.domain.model import Batch, OrderLine, Product
+
+
+def arbitrary(lines: Collection[OrderLine], shortfall: int) -> list[OrderLine]:
+    evicted, pending = [], set(lines)
+    while shortfall > 0:
+        line = pending.pop()
+        evicted.append(line)
+        shortfall -= line.qty
+    return evicted
+
+
+def make_product(lines: int, seed: int) -> Product:
+    rng = random.Random(seed)
+    quantities = [rng.choice([1, 1, 1, 2, 5, 10, 50]) for _ in range(lines)]
+    batch = Batch(
+        reference="b1", sku="SKU", purchased_quantity=sum(quantities), eta=None
+    )
+    for i, qty in enumerate(quantities):
+        batch.allocate(OrderLine(orderid=f"o{i}", sku="SKU", qty=qty))
+    return Product(sku="SKU", batches=[batch])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    policies = {"arbitrary": arbitrary, **deallocation.POLICIES}
+    batch = make_product(args.lines, args.seed).batches[0]
+    for shrink in (0.1, 0.5, 0.9):
+        shortfall = int(batch.purchased_quantity * shrink)
+        for name, policy in policies.items():
+            evicted = make_product(args.lines, args.seed).change_batch_quantity(
+                ref="b1", qty=batch.purchased_quantity - shortfall, policy=policy
+            )
+            elapsed = timeit.timeit(
+                lambda policy=policy, shortfall=shortfall: policy(
+                    batch.allocations, shortfall
+                ),
+                number=10,
+            )
+            print(
+                f"shrink={shrink:.0%} policy={name:21} evicted={len(evicted):5}"
+                f" overshoot={sum(line.qty for line in evicted) - shortfall:3}"
+                f" elapsed={elapsed / 10 * 1000:.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Construction rate and memory of domain events and order lines.
+
+Compares the slotted event dataclasses with an equivalent frozen pydantic
+model, which is what events used to be.
+
+    python -m benchmarks.domain_objects [--count 50000]
+"""
+from __future__ import annotations
+
+import argparse
+import timeit
+import tracemalloc
+from collections.abc import Callable
+
+from pydantic import BaseModel, ConfigDict
+
+from src.domain import events, model
+
+
+class PydanticAllocated(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    orderid: str
+    sku: str
+    qty: int
+    batchref: str
+
+
+def construction_rate(factory: Callable[[], object], count: int) -> float:
+    return count / timeit.timeit(factory, number=count)
+
+
+def memory_of(factory: Callable[[int], object], count: int) -> int:
+    tracemalloc.start()
+    objects = [factory(i) for i in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=50_000)
+    args = parser.parse_args()
+
+    kinds: dict[str, Callable[..., object]] = {
+        "events.Allocated": events.Allocated,
+        "pydantic Allocated": PydanticAllocated,
+    }
+    for name, cls in kinds.items():
+        rate = construction_rate(
+            lambda cls=cls: cls(orderid="o1", sku="SKU", qty=1, batchref="b1"),
+            args.count,
+        )
+        memory = memory_of(
+            lambda i, cls=cls: cls(orderid=f"o{i}", sku="SKU", qty=1, batchref="b1"),
+            args.count,
+        )
+        print(
+            f"{name:20} {rate:12,.0f}/s"
+            f" {memory / args.count:8.1f} bytes/object ({args.count:,} objects)"
+        )
+
+    batch = model.Batch(
+        reference="b1", sku="SKU", purchased_quantity=args.count, eta=None
+    )
+    product = model.Product(sku="SKU", batches=[batch])
+    tracemalloc.start()
+    elapsed = timeit.timeit(
+        lambda: product.allocate(
+            model.OrderLine(orderid=f"o{len(batch.allocations)}", sku="SKU", qty=1)
+        ),
+        number=args.count,
+    )
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"Product.allocate x{args.count:,}: {args.count / elapsed:,.0f}/s,"
+        f" {current / args.count:.1f} bytes/line including events"
+    )
+
+
+if __name__ == "__main__":
+    main()
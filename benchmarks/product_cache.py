@@ -0,0 +1,90 @@
+"""Hot-SKU allocation latency with and without the product cache.
+
+Allocates repeatedly against one SKU with many batches and lines, and reports
+latency and SQL statements per allocation. Against the default SQLite file the
+saved round trips barely show in latency; point ``--url`` at a scratch
+Postgres database to see them.
+
+    python -m benchmarks.product_cache [--batches 20] [--lines 2000]
+        [--allocations 200] [--url postgresql://...]
+"""
+from __future__ import annotations
+
+import argparse
+import pathlib
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.orm import clear_mappers, sessionmaker
+
+from src import bootstrap
+from src.adapters import orm, unit_of_work_strategy
+from src.adapters.product_cache import ProductCache
+from src.domain import commands
+
+
+def run(
+    engine: Engine, batches: int, lines: int, allocations: int, cached: bool
+) -> tuple[list[float], int]:
+    orm.mapper_registry.metadata.drop_all(engine)
+    orm.mapper_registry.metadata.create_all(engine)
+    clear_mappers()
+    bus = bootstrap.bootstrap(
+        start_orm=True,
+        uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(
+            sessionmaker(bind=engine), ProductCache() if cached else None
+        ),
+        notifications=mock.Mock(),
+        publish=lambda *args: None,
+    )
+    qty = (lines + allocations) // batches + 1
+    for i in range(batches):
+        bus.handle(commands.CreateBatch(ref=f"b{i}", sku="HOT", qty=qty, eta=None))
+    for i in range(lines):
+        bus.handle(commands.Allocate(orderid=f"warm{i}", sku="HOT", qty=1))
+
+    statements: list[str] = []
+
+    def count(conn, cursor, statement, *args) -> None:
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    latencies = []
+    for i in range(allocations):
+        start = time.perf_counter()
+        bus.handle(commands.Allocate(orderid=f"o{i}", sku="HOT", qty=1))
+        latencies.append(time.perf_counter() - start)
+    event.remove(engine, "before_cursor_execute", count)
+    clear_mappers()
+    return latencies, len(statements)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--lines", type=int, default=2000)
+    parser.add_argument("--allocations", type=int, default=200)
+    parser.add_argument("--url")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(
+            args.url or f"sqlite:///{pathlib.Path(tmp) / 'bench.db'}"
+        )
+        for cached in (False, True):
+            latencies, statements = run(
+                engine, args.batches, args.lines, args.allocations, cached
+            )
+            p99 = statistics.quantiles(latencies, n=100)[98]
+            print(
+                f"cached={cached!s:5}"
+                f" median={statistics.median(latencies) * 1000:.2f}ms"
+                f" p99={p99 * 1000:.2f}ms"
+                f" statements/allocation={statements / args.allocations:.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from src.config import config
+from src.domain import events
+
+from . import codecs, redis_event_publisher
+
+logger = logging.getLogger(__name__)
+
+AllocationChange = events.Allocated | events.Deallocated | events.AllocationCancelled
+
+# the Redis channels allocation changes are published on, and what they carry
+CHANNELS: dict[str, type[AllocationChange]] = {
+    "line_allocated": events.Allocated,
+    "line_deallocated": events.Deallocated,
+    "allocation_cancelled": events.AllocationCancelled,
+}
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    """One client's buffered view of the feed, for an order and/or a SKU.
+
+    The buffer holds at most ``maxlen`` changes; when a slow client falls
+    further behind the oldest are dropped and counted, so it knows to reload.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        orderid: str | None,
+        sku: str | None,
+        maxlen: int,
+    ) -> None:
+        self.orderid = orderid
+        self.sku = sku
+        self.dropped = 0
+        self.loop = loop
+        self._buffer: collections.deque[AllocationChange] = collections.deque(
+            maxlen=maxlen
+        )
+        self._ready = asyncio.Event()
+
+    def wants(self, change: AllocationChange) -> bool:
+        return (self.orderid is None or change.orderid == self.orderid) and (
+            self.sku is None or change.sku == self.sku
+        )
+
+    def push(self, change: AllocationChange) -> None:
+        # called on the subscription's event loop only
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(change)
+        self._ready.set()
+
+    async def next(self, timeout: float) -> list[AllocationChange]:
+        """Waits up to ``timeout`` seconds, then takes everything buffered."""
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except TimeoutError:
+            return []
+        self._ready.clear()
+        changes = list(self._buffer)
+        self._buffer.clear()
+        return changes
+
+
+class ChangeFeed:
+    """Fans allocation changes out to subscriptions keyed by orderid and SKU.
+
+    ``publish`` may be called from any thread; each change is handed to the
+    event loops of the subscriptions that want it.
+    """
+
+    def __init__(self, buffer: int = 100, max_subscribers: int = 1000) -> None:
+        self.buffer = buffer
+        self.max_subscribers = max_subscribers
+        self._by_key: defaultdict[str, set[Subscription]] = defaultdict(set)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def subscribe(
+        self, orderid: str | None = None, sku: str | None = None
+    ) -> Subscription:
+        if orderid is None and sku is None:
+            raise ValueError("subscribe to an orderid, a sku or both")
+        subscription = Subscription(
+            asyncio.get_running_loop(), orderid, sku, self.buffer
+        )
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise TooManySubscribers(f"{self._count} subscribers already")
+            self._by_key[_key(subscription)].add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        key = _key(subscription)
+        with self._lock:
+            subscribers = self._by_key.get(key)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._by_key[key]
+            self._count -= 1
+
+    def publish(self, change: AllocationChange) -> None:
+        with self._lock:
+            subscribers = [
+                subscription
+                for key in (f"order:{change.orderid}", f"sku:{change.sku}")
+                for subscription in self._by_key.get(key, ())
+                if subscription.wants(change)
+            ]
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.push, change)
+            except RuntimeError:
+                # the client's loop has gone away
+                self.unsubscribe(subscription)
+
+
+def _key(subscription: Subscription) -> str:
+    # orders are the narrower key, so a combined subscription indexes by order
+    if subscription.orderid is not None:
+        return f"order:{subscription.orderid}"
+    return f"sku:{subscription.sku}"
+
+
+def listen(feed: ChangeFeed) -> None:
+    """Feeds the change channels published by the bus into ``feed``, forever."""
+    codec = codecs.Codec(fmt=config.REDIS_CODEC)
+    pubsub = redis_event_publisher.get_client().pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(*CHANNELS)
+    for message in pubsub.listen():
+        channel = message["channel"]
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        feed.publish(codec.decode(CHANNELS[channel], message["data"]))
+
+
+@functools.cache
+def get_feed() -> ChangeFeed:
+    """The process's feed, listening on Redis from a background thread."""
+    feed = ChangeFeed(
+        buffer=config.CHANGE_FEED_BUFFER,
+        max_subscribers=config.CHANGE_FEED_MAX_SUBSCRIBERS,
+    )
+    threading.Thread(
+        target=_listen_forever, args=(feed,), name="change-feed", daemon=True
+    ).start()
+    return feed
+
+
+def _listen_forever(feed: ChangeFeed) -> None:
+    while True:
+        try:
+            listen(feed)
+        except Exception:
+            logger.exception("change feed lost its Redis subscription, resubscribing")
+            time.sleep(1)
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import functools
+import struct
+from collections.abc import Iterable
+from typing import Any, TypeVar
+
+from pydantic import TypeAdapter
+
+from src.domain import commands, events
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+T = TypeVar("T")
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+SCHEMA_VERSION = 1
+
+# Binary payloads start with a header: magic, schema version, format code.
+# JSON payloads carry no header, so plain JSON producers keep working.
+_HEADER = struct.Struct("!2sBB")
+_MAGIC = b"AP"
+_FORMAT_CODES = {MSGPACK: 1}
+
+
+class UnsupportedPayload(Exception):
+    pass
+
+
+@functools.cache
+def type_adapter(tp: Any) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+
+class CodecRegistry:
+    """Maps message type names to types so payloads can be self-describing."""
+
+    def __init__(self, types: Iterable[type] = ()) -> None:
+        self._types: dict[str, type] = {}
+        for tp in types:
+            self.register(tp)
+
+    def register(self, tp: type) -> type:
+        self._types[tp.__name__] = tp
+        return tp
+
+    def type_for(self, name: str) -> type:
+        try:
+            return self._types[name]
+        except KeyError:
+            raise UnsupportedPayload(f"Unknown message type {name}") from None
+
+
+registry = CodecRegistry(
+    [
+        events.Allocated,
+        events.Deallocated,
+        events.AllocationCancelled,
+        events.BatchCreated,
+        events.BatchQuantityChanged,
+        events.AllocatedBatchRef,
+        events.AllocationsViewed,
+        events.OutOfStock,
+        commands.Allocate,
+        commands.Deallocate,
+        commands.CreateBatch,
+        commands.ChangeBatchQuantity,
+        commands.ArchiveBatches,
+    ]
+)
+
+
+class Codec:
+    """Encodes messages with cached pydantic type adapters.
+
+    ``fmt`` selects what ``encode`` produces: JSON, or msgpack behind a
+    schema-version header (requires the optional ``msgpack`` package).
+    ``decode`` accepts either format.
+    """
+
+    def __init__(self, fmt: str = JSON, schema_version: int = SCHEMA_VERSION) -> None:
+        if fmt not in (JSON, MSGPACK):
+            raise UnsupportedPayload(f"Unknown codec format {fmt}")
+        if fmt == MSGPACK and msgpack is None:
+            raise UnsupportedPayload("msgpack format requires the msgpack package")
+        self.fmt = fmt
+        self.schema_version = schema_version
+
+    def encode(self, message: Any) -> bytes:
+        return self._dump(type_adapter(type(message)), message)
+
+    def decode(self, tp: type[T], data: bytes | str) -> T:
+        return self._load(type_adapter(tp), data)
+
+    def encode_many(self, tp: type[T], messages: list[T]) -> bytes:
+        return self._dump(type_adapter(list[tp]), messages)  # type: ignore[valid-type]
+
+    def decode_many(self, tp: type[T], data: bytes | str) -> list[T]:
+        return self._load(type_adapter(list[tp]), data)  # type: ignore[valid-type]
+
+    def _dump(self, adapter: TypeAdapter, value: Any) -> bytes:
+        if self.fmt == JSON:
+            return adapter.dump_json(value)
+        header = _HEADER.pack(_MAGIC, self.schema_version, _FORMAT_CODES[self.fmt])
+        return header + msgpack.packb(adapter.dump_python(value, mode="json"))
+
+    def _load(self, adapter: TypeAdapter, data: bytes | str) -> Any:
+        if isinstance(data, str) or not data.startswith(_MAGIC):
+            return adapter.validate_json(data)
+        _, schema_version, format_code = _HEADER.unpack_from(data)
+        if schema_version != self.schema_version:
+            raise UnsupportedPayload(f"Unsupported schema version {schema_version}")
+        if format_code != _FORMAT_CODES[MSGPACK] or msgpack is None:
+            raise UnsupportedPayload(f"Unsupported payload format {format_code}")
+        return adapter.validate_python(msgpack.unpackb(data[_HEADER.size :]))
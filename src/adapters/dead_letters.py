@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING, Protocol
+
+from sqlalchemy import delete, insert, select, update
+
+from src.domain import events
+
+from . import codecs, orm
+
+if TYPE_CHECKING:
+    from .unit_of_work_strategy import UnitOfWorkStrategy
+
+
+@dataclass(frozen=True)
+class DeadLetter:
+    id: int
+    handler: str
+    event: events.Event
+    error: str
+    attempts: int
+    failed_at: datetime
+
+
+class DeadLetterStore(Protocol):
+    def add(self, handler: str, event: events.Event, error: str, attempts: int) -> None:
+        ...
+
+    def list(self, handler: str | None = None, limit: int = 100) -> list[DeadLetter]:
+        ...
+
+    def remove(self, id: int) -> None:
+        ...
+
+    def failed_again(self, id: int, error: str) -> None:
+        """Records another failed attempt at a replayed dead letter."""
+        ...
+
+
+class SqlAlchemyDeadLetterStore(DeadLetterStore):
+    """Dead letters kept in the dead_letters table, oldest first."""
+
+    def __init__(self, uow: UnitOfWorkStrategy, codec: codecs.Codec | None = None):
+        self.uow = uow
+        self.codec = codec or codecs.Codec()
+
+    def add(self, handler: str, event: events.Event, error: str, attempts: int) -> None:
+        with self.uow:
+            self.uow.execute(
+                insert(orm.dead_letters).values(
+                    handler=handler,
+                    event_type=type(event).__name__,
+                    payload=self.codec.encode(event),
+                    error=error,
+                    attempts=attempts,
+                    failed_at=datetime.now(UTC),
+                )
+            )
+            self.uow.commit()
+
+    def list(self, handler: str | None = None, limit: int = 100) -> list[DeadLetter]:
+        table = orm.dead_letters
+        query = select(table).order_by(table.c.id).limit(limit)
+        if handler is not None:
+            query = query.where(table.c.handler == handler)
+        with self.uow:
+            rows = self.uow.execute(query).all()
+        return [
+            DeadLetter(
+                id=r.id,
+                handler=r.handler,
+                event=self.codec.decode(
+                    codecs.registry.type_for(r.event_type), r.payload
+                ),
+                error=r.error,
+                attempts=r.attempts,
+                failed_at=r.failed_at,
+            )
+            for r in rows
+        ]
+
+    def remove(self, id: int) -> None:
+        with self.uow:
+            self.uow.execute(
+                delete(orm.dead_letters).where(orm.dead_letters.c.id == id)
+            )
+            self.uow.commit()
+
+    def failed_again(self, id: int, error: str) -> None:
+        table = orm.dead_letters
+        with self.uow:
+            self.uow.execute(
+                update(table)
+                .where(table.c.id == id)
+                .values(
+                    error=error,
+                    attempts=table.c.attempts + 1,
+                    failed_at=datetime.now(UTC),
+                )
+            )
+            self.uow.commit()
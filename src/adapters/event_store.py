@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import zlib
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import func, insert, select, update
+
+from src.domain import events, model
+
+from . import codecs, orm
+
+if TYPE_CHECKING:
+    from src.service_layer import unit_of_work
+
+
+def sku_hash(sku: str) -> int:
+    return zlib.crc32(sku.encode())
+
+
+def in_partition(column: Any, partitions: int, partition: int) -> Any:
+    return column % partitions == partition
+
+
+@dataclass(frozen=True)
+class StoredEvent:
+    position: int
+    sku: str
+    event: events.Event
+
+
+@dataclass(frozen=True)
+class ProductSnapshot:
+    sku: str
+    position: int
+    version_number: int
+    state: dict
+
+
+class EventStore:
+    """Append-only log of domain events, with periodic product snapshots.
+
+    Events are appended through the unit of work, so they commit or roll back
+    with the aggregate changes that raised them. Every ``snapshot_every``
+    events a product's full state is snapshotted at the latest position, so
+    readers can start from the snapshot instead of the beginning of the log.
+    Each SKU's stream row counts the events appended since its last snapshot,
+    so deciding whether one is due costs no scan of the log.
+    """
+
+    def __init__(
+        self, codec: codecs.Codec | None = None, snapshot_every: int = 100
+    ) -> None:
+        self.codec = codec or codecs.Codec()
+        self.snapshot_every = snapshot_every
+
+    def append(
+        self, uow: unit_of_work.UnitOfWork, new: Iterable[events.Event]
+    ) -> dict[str, int]:
+        """Appends the events, returning each SKU's count since its last snapshot."""
+        now = datetime.now(UTC)
+        rows = [
+            {
+                "sku": event.sku,  # type: ignore[attr-defined]
+                "sku_hash": sku_hash(event.sku),  # type: ignore[attr-defined]
+                "event_type": type(event).__name__,
+                "payload": self.codec.encode(event),
+                "recorded_at": now,
+            }
+            for event in new
+        ]
+        if not rows:
+            return {}
+        uow.execute(insert(orm.event_store), rows)
+        appended = Counter(row["sku"] for row in rows)
+        return {sku: self._extend(uow, sku, count) for sku, count in appended.items()}
+
+    def _extend(self, uow: unit_of_work.UnitOfWork, sku: str, count: int) -> int:
+        streams = orm.event_streams
+        since_snapshot = uow.execute(
+            update(streams)
+            .where(streams.c.sku == sku)
+            .values(since_snapshot=streams.c.since_snapshot + count)
+            .returning(streams.c.since_snapshot)
+        ).scalar()
+        if since_snapshot is None:
+            uow.execute(insert(streams).values(sku=sku, since_snapshot=count))
+            since_snapshot = count
+        return since_snapshot
+
+    def snapshot_if_due(
+        self, uow: unit_of_work.UnitOfWork, product: model.Product, since_snapshot: int
+    ) -> bool:
+        if since_snapshot < self.snapshot_every:
+            return False
+        position = uow.execute(
+            select(func.max(orm.event_store.c.id)).where(
+                orm.event_store.c.sku == product.sku
+            )
+        ).scalar_one()
+        self.save_snapshot(uow, product, position=position)
+        return True
+
+    def save_snapshot(
+        self, uow: unit_of_work.UnitOfWork, product: model.Product, position: int
+    ) -> None:
+        table = orm.product_snapshots
+        uow.execute(table.delete().where(table.c.sku == product.sku))
+        uow.execute(
+            insert(table).values(
+                sku=product.sku,
+                sku_hash=sku_hash(product.sku),
+                position=position,
+                version_number=product.version_number,
+                state=self.codec.encode(product_state(product)),
+            )
+        )
+        streams = orm.event_streams
+        uow.execute(
+            update(streams).where(streams.c.sku == product.sku).values(since_snapshot=0)
+        )
+
+    def head(self, uow: unit_of_work.UnitOfWork) -> int:
+        return uow.execute(select(func.max(orm.event_store.c.id))).scalar() or 0
+
+    def read(
+        self,
+        uow: unit_of_work.UnitOfWork,
+        after: int,
+        limit: int,
+        partitions: int = 1,
+        partition: int = 0,
+    ) -> list[StoredEvent]:
+        """The next ``limit`` events after position ``after``, keyset-paginated."""
+        table = orm.event_store
+        rows = uow.execute(
+            select(table.c.id, table.c.sku, table.c.event_type, table.c.payload)
+            .where(table.c.id > after)
+            .where(in_partition(table.c.sku_hash, partitions, partition))
+            .order_by(table.c.id)
+            .limit(limit)
+        )
+        return [
+            StoredEvent(
+                position=r.id,
+                sku=r.sku,
+                event=self.codec.decode(
+                    codecs.registry.type_for(r.event_type), r.payload
+                ),
+            )
+            for r in rows
+        ]
+
+    def snapshots(
+        self, uow: unit_of_work.UnitOfWork, partitions: int = 1, partition: int = 0
+    ) -> list[ProductSnapshot]:
+        table = orm.product_snapshots
+        rows = uow.execute(
+            select(table).where(in_partition(table.c.sku_hash, partitions, partition))
+        )
+        return [
+            ProductSnapshot(
+                sku=r.sku,
+                position=r.position,
+                version_number=r.version_number,
+                state=self.codec.decode(dict, r.state),
+            )
+            for r in rows
+        ]
+
+
+def product_state(product: model.Product) -> dict:
+    return {
+        "sku": product.sku,
+        "version_number": product.version_number,
+        "batches": [
+            {
+                "reference": batch.reference,
+                "eta": batch.eta.isoformat() if batch.eta else None,
+                "purchased_quantity": batch.purchased_quantity,
+                "allocations": sorted(
+                    [line.orderid, line.qty] for line in batch.allocations
+                ),
+            }
+            for batch in product.batches
+        ],
+    }
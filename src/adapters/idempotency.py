@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import itertools
+import threading
+from collections import OrderedDict
+from datetime import UTC, datetime, timedelta
+from typing import TYPE_CHECKING, Protocol
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from . import orm
+
+if TYPE_CHECKING:
+    from src.service_layer import unit_of_work
+
+DEFAULT_TTL = timedelta(days=1)
+
+
+class DuplicateCommand(Exception):
+    pass
+
+
+class DedupStore(Protocol):
+    def seen(self, uow: unit_of_work.UnitOfWork, key: str) -> bool:
+        """Whether a command with the key has already been processed."""
+        ...
+
+    def record(self, uow: unit_of_work.UnitOfWork, key: str, command_type: str) -> None:
+        """Records the key in the unit of work's current transaction.
+
+        Raises DuplicateCommand if another transaction recorded it first.
+        """
+        ...
+
+
+class SqlAlchemyDedupStore(DedupStore):
+    """Dedup store backed by the processed_commands table.
+
+    Keys are recorded in the command's own transaction, so they commit or roll
+    back with its changes, and concurrent duplicates race on the primary key
+    rather than both committing. Keys older than ``ttl`` are treated as unseen
+    and are purged every ``purge_every`` lookups.
+    """
+
+    def __init__(self, ttl: timedelta = DEFAULT_TTL, purge_every: int = 1000) -> None:
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._lookups = itertools.count(1)
+
+    def seen(self, uow: unit_of_work.UnitOfWork, key: str) -> bool:
+        table = orm.processed_commands
+        with uow:
+            seen = (
+                uow.execute(
+                    select(table.c.idempotency_key).where(
+                        (table.c.idempotency_key == key)
+                        & (table.c.processed_at >= datetime.now(UTC) - self.ttl)
+                    )
+                ).first()
+                is not None
+            )
+        if next(self._lookups) % self.purge_every == 0:
+            self.purge_expired(uow)
+        return seen
+
+    def record(self, uow: unit_of_work.UnitOfWork, key: str, command_type: str) -> None:
+        table = orm.processed_commands
+        now = datetime.now(UTC)
+        # an expired key is recorded afresh
+        uow.execute(
+            delete(table).where(
+                (table.c.idempotency_key == key)
+                & (table.c.processed_at < now - self.ttl)
+            )
+        )
+        try:
+            uow.execute(
+                insert(table).values(
+                    idempotency_key=key, command_type=command_type, processed_at=now
+                )
+            )
+        except IntegrityError as e:
+            raise DuplicateCommand(key) from e
+
+    def purge_expired(self, uow: unit_of_work.UnitOfWork) -> int:
+        with uow:
+            result = uow.execute(
+                delete(orm.processed_commands).where(
+                    orm.processed_commands.c.processed_at < datetime.now(UTC) - self.ttl
+                )
+            )
+            uow.commit()
+        return result.rowcount
+
+
+class CachedDedupStore(DedupStore):
+    """In-process LRU in front of another dedup store.
+
+    Keys the backing store has reported as processed short-circuit without a
+    database round trip. Recorded keys are not cached, as their transaction
+    may still roll back.
+    """
+
+    def __init__(
+        self, store: DedupStore, maxsize: int = 10_000, ttl: timedelta = DEFAULT_TTL
+    ) -> None:
+        self._store = store
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._seen: OrderedDict[str, datetime] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen(self, uow: unit_of_work.UnitOfWork, key: str) -> bool:
+        now = datetime.now(UTC)
+        with self._lock:
+            seen_at = self._seen.get(key)
+            if seen_at is not None and now - seen_at < self.ttl:
+                self._seen.move_to_end(key)
+                return True
+        if not self._store.seen(uow, key):
+            return False
+        with self._lock:
+            self._seen[key] = now
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.maxsize:
+                self._seen.popitem(last=False)
+        return True
+
+    def record(self, uow: unit_of_work.UnitOfWork, key: str, command_type: str) -> None:
+        self._store.record(uow, key, command_type)
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from typing import TYPE_CHECKING, Protocol
+
+from sqlalchemy import insert, select, update
+
+from src.domain import commands
+
+from . import codecs, orm
+
+if TYPE_CHECKING:
+    from .unit_of_work_strategy import UnitOfWorkStrategy
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class Job:
+    id: str
+    command: commands.Command
+    status: str
+    error: str | None
+    result: dict | None
+    created_at: datetime
+    finished_at: datetime | None
+
+
+class JobQueue(Protocol):
+    def enqueue(self, command: commands.Command) -> str:
+        """Durably queues the command, returning its job id."""
+        ...
+
+    def claim(self) -> Job | None:
+        """Marks the oldest queued job running and returns it, if there is one."""
+        ...
+
+    def complete(self, job_id: str, result: dict | None = None) -> None:
+        """Marks the job succeeded, keeping the outcome for clients to poll."""
+        ...
+
+    def fail(self, job_id: str, error: str) -> None:
+        ...
+
+    def get(self, job_id: str) -> Job | None:
+        ...
+
+
+class SqlAlchemyJobQueue(JobQueue):
+    """Job queue kept in the jobs table of the application database.
+
+    Workers claim with ``FOR UPDATE SKIP LOCKED`` where the database supports
+    it, and the claim only succeeds if the job is still queued, so a job is
+    never handed to two workers. One queue can be shared between threads: each
+    thread works through its own fork of ``uow``.
+    """
+
+    def __init__(self, uow: UnitOfWorkStrategy, codec: codecs.Codec | None = None):
+        self._uow = uow
+        self._threads = threading.local()
+        self.codec = codec or codecs.Codec()
+
+    @property
+    def uow(self) -> UnitOfWorkStrategy:
+        uow = getattr(self._threads, "uow", None)
+        if uow is None:
+            uow = self._threads.uow = self._uow.fork()
+        return uow
+
+    def enqueue(self, command: commands.Command) -> str:
+        job_id = str(uuid.uuid4())
+        with self.uow:
+            self.uow.execute(
+                insert(orm.jobs).values(
+                    id=job_id,
+                    command_type=type(command).__name__,
+                    payload=self.codec.encode(command),
+                    status=QUEUED,
+                    created_at=datetime.now(UTC),
+                )
+            )
+            self.uow.commit()
+        return job_id
+
+    def claim(self) -> Job | None:
+        jobs = orm.jobs
+        with self.uow:
+            row = self.uow.execute(
+                select(jobs)
+                .where(jobs.c.status == QUEUED)
+                .order_by(jobs.c.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).one_or_none()
+            if row is None:
+                return None
+            claimed = self.uow.execute(
+                update(jobs)
+                .where((jobs.c.id == row.id) & (jobs.c.status == QUEUED))
+                .values(status=RUNNING, started_at=datetime.now(UTC))
+            )
+            self.uow.commit()
+        if claimed.rowcount != 1:
+            return None
+        return self._job(row, status=RUNNING)
+
+    def complete(self, job_id: str, result: dict | None = None) -> None:
+        self._finish(
+            job_id,
+            SUCCEEDED,
+            result=None if result is None else self.codec.encode(result),
+        )
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._finish(job_id, FAILED, error=error)
+
+    def get(self, job_id: str) -> Job | None:
+        with self.uow:
+            row = self.uow.execute(
+                select(orm.jobs).where(orm.jobs.c.id == job_id)
+            ).one_or_none()
+        return None if row is None else self._job(row)
+
+    def requeue_stale(self, older_than: timedelta) -> int:
+        """Queues running jobs again whose worker has presumably died."""
+        jobs = orm.jobs
+        with self.uow:
+            result = self.uow.execute(
+                update(jobs)
+                .where(jobs.c.status == RUNNING)
+                .where(jobs.c.started_at < datetime.now(UTC) - older_than)
+                .values(status=QUEUED, started_at=None)
+            )
+            self.uow.commit()
+        return result.rowcount
+
+    def _finish(
+        self,
+        job_id: str,
+        status: str,
+        error: str | None = None,
+        result: bytes | None = None,
+    ) -> None:
+        with self.uow:
+            self.uow.execute(
+                update(orm.jobs)
+                .where(orm.jobs.c.id == job_id)
+                .values(
+                    status=status,
+                    error=error,
+                    result=result,
+                    finished_at=datetime.now(UTC),
+                )
+            )
+            self.uow.commit()
+
+    def _job(self, row, status: str | None = None) -> Job:
+        return Job(
+            id=row.id,
+            command=self.codec.decode(
+                codecs.registry.type_for(row.command_type), row.payload
+            ),
+            status=status or row.status,
+            error=row.error,
+            result=None if row.result is None else self.codec.decode(dict, row.result),
+            created_at=row.created_at,
+            finished_at=row.finished_at,
+        )
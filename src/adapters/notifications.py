@@ -1,24 +1,35 @@
 from __future__ import annotations
 
-import smtplib
-from typing import Protocol
+from typing import TYPE_CHECKING, Protocol
 
 from src.config import config
 
+if TYPE_CHECKING:
+    import smtplib
+
 
 class NotificationsProtocol(Protocol):
     def send(self, destination: str, message: str) -> None:
         raise NotImplementedError
 
 
-DEFAULT_HOST = config.get_email_host_and_port()["host"]
-DEFAULT_PORT = config.get_email_host_and_port()["port"]
-
-
 class EmailNotifications(NotificationsProtocol):
-    def __init__(self, smtp_host=DEFAULT_HOST, port=DEFAULT_PORT) -> None:
-        self.server = smtplib.SMTP(host=smtp_host, port=port)
-        self.server.noop()
+    """Sends notifications over SMTP, connecting on the first send."""
+
+    def __init__(self, smtp_host: str | None = None, port: int | None = None) -> None:
+        email = config.get_email_host_and_port()
+        self.smtp_host = smtp_host or email["host"]
+        self.port = port or email["port"]
+        self._server: smtplib.SMTP | None = None
+
+    @property
+    def server(self) -> smtplib.SMTP:
+        if self._server is None:
+            import smtplib
+
+            self._server = smtplib.SMTP(host=self.smtp_host, port=self.port)
+            self._server.noop()
+        return self._server
 
     def send(self, destination, message) -> None:
         msg = f"Subject: allocation service notification\n{message}"
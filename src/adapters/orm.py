@@ -1,6 +1,20 @@
 from __future__ import annotations
 
-from sqlalchemy import Column, Date, ForeignKey, Integer, String, Table, event
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    PrimaryKeyConstraint,
+    String,
+    Table,
+    Text,
+    event,
+)
 from sqlalchemy.orm import registry, relationship
 
 from src.domain import model
@@ -14,7 +28,7 @@ order_lines = Table(
     Column("id", Integer, primary_key=True, autoincrement=True),
     Column("sku", String(255)),
     Column("qty", Integer, nullable=False),
-    Column("orderid", String(255)),
+    Column("orderid", String(255), index=True),
 )
 
 products = Table(
@@ -32,6 +46,7 @@ batches = Table(
     Column("sku", ForeignKey("products.sku")),
     Column("purchased_quantity", Integer, nullable=False),
     Column("eta", Date, nullable=True),
+    Column("allocated_quantity", Integer, nullable=False, server_default="0"),
 )
 
 allocations = Table(
@@ -50,6 +65,135 @@ allocations_view = Table(
     Column("batchref", String(255)),
 )
 
+# batches moved out of the live tables once exhausted and delivered, with
+# their allocations and order lines, so products only load live stock
+batches_archive = Table(
+    "batches_archive",
+    mapper_registry.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("reference", String(255)),
+    Column("sku", String(255), index=True),
+    Column("purchased_quantity", Integer, nullable=False),
+    Column("eta", Date, nullable=True),
+    Column("allocated_quantity", Integer, nullable=False),
+    Column("archived_at", DateTime(timezone=True), nullable=False),
+)
+
+allocations_archive = Table(
+    "allocations_archive",
+    mapper_registry.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("orderline_id", Integer),
+    Column("batch_id", Integer, index=True),
+)
+
+order_lines_archive = Table(
+    "order_lines_archive",
+    mapper_registry.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("sku", String(255)),
+    Column("qty", Integer, nullable=False),
+    Column("orderid", String(255), index=True),
+)
+
+# id is the global position of the event; sku_hash partitions replays
+event_store = Table(
+    "event_store",
+    mapper_registry.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("sku", String(255), nullable=False, index=True),
+    Column("sku_hash", BigInteger, nullable=False),
+    Column("event_type", String(255), nullable=False),
+    Column("payload", LargeBinary, nullable=False),
+    Column("recorded_at", DateTime(timezone=True), nullable=False),
+)
+
+# how many events each SKU's stream has gained since its last snapshot
+event_streams = Table(
+    "event_streams",
+    mapper_registry.metadata,
+    Column("sku", String(255), primary_key=True),
+    Column("since_snapshot", Integer, nullable=False),
+)
+
+product_snapshots = Table(
+    "product_snapshots",
+    mapper_registry.metadata,
+    Column("sku", String(255), primary_key=True),
+    Column("sku_hash", BigInteger, nullable=False),
+    Column("position", Integer, nullable=False),
+    Column("version_number", Integer, nullable=False),
+    Column("state", LargeBinary, nullable=False),
+)
+
+projection_checkpoints = Table(
+    "projection_checkpoints",
+    mapper_registry.metadata,
+    Column("projection", String(255)),
+    Column("partition", Integer),
+    Column("partitions", Integer, nullable=False),
+    Column("position", Integer, nullable=False),
+    PrimaryKeyConstraint("projection", "partition"),
+)
+
+# event handler runs that failed every retry, kept for replay
+dead_letters = Table(
+    "dead_letters",
+    mapper_registry.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("handler", String(255), nullable=False, index=True),
+    Column("event_type", String(255), nullable=False),
+    Column("payload", LargeBinary, nullable=False),
+    Column("error", Text, nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("failed_at", DateTime(timezone=True), nullable=False),
+)
+
+# commands accepted by the API and waiting for a worker
+jobs = Table(
+    "jobs",
+    mapper_registry.metadata,
+    Column("id", String(36), primary_key=True),
+    Column("command_type", String(255), nullable=False),
+    Column("payload", LargeBinary, nullable=False),
+    Column("status", String(16), nullable=False),
+    Column("error", Text),
+    # what the command's handler returned, encoded like the payload
+    Column("result", LargeBinary),
+    Column("created_at", DateTime(timezone=True), nullable=False),
+    Column("started_at", DateTime(timezone=True)),
+    Column("finished_at", DateTime(timezone=True)),
+    Index("ix_jobs_status_created_at", "status", "created_at"),
+)
+
+# which SKU each batch belongs to, kept on the home shard when sharding
+batch_directory = Table(
+    "batch_directory",
+    mapper_registry.metadata,
+    Column("reference", String(255), primary_key=True),
+    Column("sku", String(255), nullable=False),
+)
+
+# purchased and allocated quantity per SKU and ETA; warehouse stock is dated
+# date.min, so everything available by a date is one range of rows
+stock_levels = Table(
+    "stock_levels",
+    mapper_registry.metadata,
+    Column("sku", String(255), nullable=False),
+    Column("eta", Date, nullable=False),
+    Column("purchased", Integer, nullable=False),
+    Column("allocated", Integer, nullable=False),
+    PrimaryKeyConstraint("sku", "eta"),
+)
+
+processed_commands = Table(
+    "processed_commands",
+    mapper_registry.metadata,
+    Column("idempotency_key", String(255), primary_key=True),
+    Column("command_type", String(255), nullable=False),
+    Column("processed_at", DateTime(timezone=True), nullable=False),
+)
+
 
 def start_mappers() -> None:
     order_lines_mapper = mapper_registry.map_imperatively(model.OrderLine, order_lines)
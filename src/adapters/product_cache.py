@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import functools
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import TYPE_CHECKING
+
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import Session
+
+from src.config import config
+from src.domain import model
+
+from . import orm, redis_event_publisher, repository
+
+if TYPE_CHECKING:
+    import redis
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "product_cache_invalidation"
+
+
+class ProductCache:
+    """Bounded LRU of detached Product snapshots (product and batches), by sku.
+
+    Snapshots are never handed out directly: each unit of work merges a copy
+    into its own session, and the copy replaces the snapshot once committed.
+    ``on_put`` is called with the sku of every snapshot whose version changed,
+    so other processes can be told to drop theirs.
+    """
+
+    def __init__(
+        self, maxsize: int = 1024, on_put: Callable[[str], None] | None = None
+    ) -> None:
+        self.maxsize = maxsize
+        self.on_put = on_put
+        self.hits = 0
+        self.misses = 0
+        self._products: OrderedDict[str, model.Product] = OrderedDict()
+        self._skus_by_batchref: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get(self, sku: str) -> model.Product | None:
+        with self._lock:
+            product = self._products.get(sku)
+            if product is None:
+                self.misses += 1
+                return None
+            self._products.move_to_end(sku)
+            self.hits += 1
+            return product
+
+    def sku_for_batchref(self, batchref: str) -> str | None:
+        with self._lock:
+            return self._skus_by_batchref.get(batchref)
+
+    def put(self, product: model.Product) -> None:
+        with self._lock:
+            previous = self._products.get(product.sku)
+            self._products[product.sku] = product
+            self._products.move_to_end(product.sku)
+            for batch in product.batches:
+                self._skus_by_batchref[batch.reference] = product.sku
+            while len(self._products) > self.maxsize:
+                _, evicted = self._products.popitem(last=False)
+                self._forget_batchrefs(evicted)
+        changed = previous is None or previous.version_number != product.version_number
+        if changed and self.on_put is not None:
+            self.on_put(product.sku)
+
+    def invalidate(self, sku: str) -> None:
+        with self._lock:
+            product = self._products.pop(sku, None)
+            if product is not None:
+                self._forget_batchrefs(product)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._products.clear()
+            self._skus_by_batchref.clear()
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def _forget_batchrefs(self, product: model.Product) -> None:
+        for batch in product.batches:
+            self._skus_by_batchref.pop(batch.reference, None)
+
+
+def is_cacheable(product: model.Product) -> bool:
+    """Whether the product and its batches are loaded and can outlive the session."""
+    state = inspect(product)
+    if state.expired_attributes or "batches" in state.unloaded:
+        return False
+    return all(
+        not inspect(batch).expired_attributes - {"allocations"}
+        for batch in product.batches
+    )
+
+
+def snapshot(session: Session, product: model.Product) -> None:
+    """Drops the allocation lines so only the product and batches are cached.
+
+    Lines are loaded lazily, a batch at a time, wherever the snapshot is used
+    next, which keeps merging a snapshot cheap however many lines it holds.
+    """
+    for batch in product.batches:
+        session.expire(batch, ["allocations"])
+
+
+class CachedRepository(repository.SqlAlchemyRepository):
+    """Serves products from a ProductCache when their version is current.
+
+    A hit costs one ``version_number`` lookup and a ``merge(load=False)``
+    into the session; a stale or missing entry falls back to a full load.
+    Products this repository hands out are kept in ``loaded``, both so repeated
+    lookups in the same session return the session's own (possibly modified)
+    instance and so the unit of work can cache them after a successful commit.
+    """
+
+    def __init__(self, session: Session, cache: ProductCache) -> None:
+        super().__init__(session)
+        self.cache = cache
+        self.loaded: dict[str, model.Product] = {}
+
+    def add(self, product: model.Product) -> model.Product:
+        self.loaded[product.sku] = product
+        return super().add(product)
+
+    def get(self, sku: str) -> model.Product | None:
+        product = self.loaded.get(sku) or self._get_cached(sku) or super().get(sku)
+        if product is not None:
+            self.loaded[sku] = product
+        return product
+
+    def get_by_batchref(self, batchref: str) -> model.Product | None:
+        sku = self.cache.sku_for_batchref(batchref)
+        if sku is not None:
+            product = self.get(sku)
+            if product is not None and any(
+                batch.reference == batchref for batch in product.batches
+            ):
+                return product
+        product = super().get_by_batchref(batchref)
+        if product is not None:
+            self.loaded[product.sku] = product
+        return product
+
+    def _get_cached(self, sku: str) -> model.Product | None:
+        cached = self.cache.get(sku)
+        if cached is None:
+            return None
+        version = self.session.scalar(
+            select(orm.products.c.version_number).where(orm.products.c.sku == sku)
+        )
+        if version != cached.version_number:
+            self.cache.invalidate(sku)
+            return None
+        product = self.session.merge(cached, load=False)
+        product.messages = []
+        return product
+
+
+class RedisCacheInvalidator:
+    """Tells other processes to drop their snapshot of a changed product."""
+
+    def __init__(self, client: redis.Redis) -> None:
+        self.client = client
+        self.node_id = uuid.uuid4().hex
+
+    def publish(self, sku: str) -> None:
+        self.client.publish(INVALIDATION_CHANNEL, f"{self.node_id}:{sku}")
+
+    def listen(self, cache: ProductCache) -> threading.Thread:
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(INVALIDATION_CHANNEL)
+
+        def run() -> None:
+            for m in pubsub.listen():
+                node_id, _, sku = m["data"].decode().partition(":")
+                if node_id != self.node_id:
+                    cache.invalidate(sku)
+
+        thread = threading.Thread(
+            target=run, name="product-cache-invalidation", daemon=True
+        )
+        thread.start()
+        return thread
+
+
+@functools.cache
+def get_cache() -> ProductCache:
+    """The process-wide product cache, invalidated across nodes through Redis."""
+    invalidator = RedisCacheInvalidator(redis_event_publisher.get_client())
+    cache = ProductCache(maxsize=config.PRODUCT_CACHE_SIZE, on_put=invalidator.publish)
+    invalidator.listen(cache)
+    return cache
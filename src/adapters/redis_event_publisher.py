@@ -1,17 +1,30 @@
 from __future__ import annotations
 
+import functools
 import logging
-
-import redis
+from typing import TYPE_CHECKING
 
 from src.config import config
 from src.domain import events
 
+from . import codecs
+
+if TYPE_CHECKING:
+    import redis
+
 logger = logging.getLogger(__name__)
 
-r = redis.Redis(**config.get_redis_host_and_port())  # type: ignore
+codec = codecs.Codec(fmt=config.REDIS_CODEC)
+
+
+@functools.cache
+def get_client() -> redis.Redis:
+    """Creates the Redis client (and its connection pool) on first use."""
+    import redis
+
+    return redis.Redis(**config.get_redis_host_and_port())  # type: ignore
 
 
 def publish(channel, event: events.Event) -> None:
     logging.debug("publishing: channel=%s, event=%s", channel, event)
-    r.publish(channel, event.model_dump_json())
+    get_client().publish(channel, codec.encode(event))
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from collections.abc import Callable
 from typing import Protocol, TypeVar
 
 from sqlalchemy import select
@@ -7,7 +8,7 @@ from sqlalchemy.orm import Session
 
 from src.domain import model
 
-from . import orm
+from . import orm, sharding
 
 ModelType = TypeVar("ModelType")
 
@@ -22,6 +23,10 @@ class Repository(Protocol[ModelType]):
     def get_by_batchref(self, batchref: str) -> ModelType | None:
         ...
 
+    def allocations(self, sku: str, orderid: str) -> list[tuple[str, model.OrderLine]]:
+        """An order's allocated lines of a SKU, with their batch references."""
+        ...
+
 
 class SqlAlchemyRepository(Repository[model.Product]):
     def __init__(self, session: Session) -> None:
@@ -43,6 +48,54 @@ class SqlAlchemyRepository(Repository[model.Product]):
         )
         return self.session.scalar(query)
 
+    def allocations(self, sku: str, orderid: str) -> list[tuple[str, model.OrderLine]]:
+        # through the orderid index, without loading the product's other lines
+        query = (
+            select(model.OrderLine, orm.batches.c.reference)
+            .join(
+                orm.allocations, orm.allocations.c.orderline_id == orm.order_lines.c.id
+            )
+            .join(orm.batches, orm.batches.c.id == orm.allocations.c.batch_id)
+            .where((orm.order_lines.c.orderid == orderid) & (orm.batches.c.sku == sku))
+        )
+        return [(batchref, line) for line, batchref in self.session.execute(query)]
+
+
+class ShardedRepository(Repository[model.Product]):
+    """Finds each product in the database of the shard its SKU hashes to.
+
+    Batches are found through the batch directory on the home shard.
+    """
+
+    def __init__(
+        self,
+        session_for: Callable[[str], Session],
+        directory: Callable[[], Session],
+    ) -> None:
+        self.session_for = session_for
+        self.directory = directory
+
+    def add(self, product: model.Product) -> model.Product:
+        self.session_for(product.sku).add(product)
+        return product
+
+    def get(self, sku: str) -> model.Product | None:
+        return SqlAlchemyRepository(self.session_for(sku)).get(sku)
+
+    def get_by_batchref(self, batchref: str) -> model.Product | None:
+        sku = sharding.sku_for_batchref(self.directory(), batchref)
+        if sku is None:
+            return None
+        product = self.get(sku)
+        # the directory is committed first, so may briefly name a batch that
+        # never was
+        if product is None or all(b.reference != batchref for b in product.batches):
+            return None
+        return product
+
+    def allocations(self, sku: str, orderid: str) -> list[tuple[str, model.OrderLine]]:
+        return SqlAlchemyRepository(self.session_for(sku)).allocations(sku, orderid)
+
 
 class TrackingRepository(Repository[model.Product]):
     seen: set[model.Product]
@@ -67,3 +120,6 @@ class TrackingRepository(Repository[model.Product]):
         if product:
             self.seen.add(product)
         return product
+
+    def allocations(self, sku: str, orderid: str) -> list[tuple[str, model.OrderLine]]:
+        return self._repo.allocations(sku, orderid)
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from sqlalchemy import insert, select, update
+
+from src.domain import model
+
+from . import orm
+
+if TYPE_CHECKING:
+    from .unit_of_work_strategy import UnitOfWorkStrategy
+
+
+class RowLockAllocator:
+    """Allocates an order line in SQL without loading the Product aggregate.
+
+    Available quantity is read from the batches' ``allocated_quantity`` column
+    and batches are tried in the same order as ``Product.allocate``: warehouse
+    stock (no ETA) first, then by ETA. A batch is claimed by a single guarded
+    ``UPDATE`` that only increments its ``allocated_quantity`` while enough
+    remains, so the check is made against the row as it is now rather than the
+    transaction's snapshot. The update waits for any transaction holding the
+    row, so a locked earlier batch is never passed over for a later one; under
+    REPEATABLE READ a concurrent change to it fails this transaction instead.
+
+    As with the aggregate, a successful allocation bumps the product's
+    ``version_number``, which serialises allocations against the same SKU on
+    the product row.
+    """
+
+    def product_exists(self, uow: UnitOfWorkStrategy, sku: str) -> bool:
+        query = select(orm.products.c.sku).where(orm.products.c.sku == sku)
+        return uow.execute(query).first() is not None
+
+    def allocate(self, uow: UnitOfWorkStrategy, line: model.OrderLine) -> str | None:
+        for batch_id, reference, available_quantity in self.candidate_batches(
+            uow, line.sku
+        ):
+            if available_quantity < line.qty:
+                continue
+            if not self.claim(uow, batch_id, line.qty):
+                continue
+            self.insert_allocation(uow, batch_id, line)
+            self.bump_version(uow, line.sku)
+            return reference
+        return None
+
+    def candidate_batches(
+        self, uow: UnitOfWorkStrategy, sku: str
+    ) -> list[tuple[int, str, int]]:
+        query = (
+            select(orm.batches.c.id, orm.batches.c.reference, _available_quantity())
+            .where(orm.batches.c.sku == sku)
+            .order_by(orm.batches.c.eta.asc().nulls_first(), orm.batches.c.id)
+        )
+        return [(r[0], r[1], r[2]) for r in uow.execute(query)]
+
+    def claim(self, uow: UnitOfWorkStrategy, batch_id: int, qty: int) -> bool:
+        result = uow.execute(
+            update(orm.batches)
+            .where(orm.batches.c.id == batch_id, _available_quantity() >= qty)
+            .values(allocated_quantity=orm.batches.c.allocated_quantity + qty)
+        )
+        return result.rowcount == 1
+
+    def insert_allocation(
+        self, uow: UnitOfWorkStrategy, batch_id: int, line: model.OrderLine
+    ) -> None:
+        result = uow.execute(
+            insert(orm.order_lines).values(
+                orderid=line.orderid, sku=line.sku, qty=line.qty
+            )
+        )
+        [orderline_id] = result.inserted_primary_key
+        uow.execute(
+            insert(orm.allocations).values(orderline_id=orderline_id, batch_id=batch_id)
+        )
+
+    def bump_version(self, uow: UnitOfWorkStrategy, sku: str) -> None:
+        uow.execute(
+            update(orm.products)
+            .where(orm.products.c.sku == sku)
+            .values(version_number=orm.products.c.version_number + 1)
+        )
+
+
+def _available_quantity():
+    return orm.batches.c.purchased_quantity - orm.batches.c.allocated_quantity
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import bisect
+import functools
+import hashlib
+from collections.abc import Iterable
+
+from sqlalchemy import Connection, delete, insert, select
+from sqlalchemy.orm import Session
+
+from . import orm
+
+
+class HashRing:
+    """Maps keys onto shards by consistent hashing.
+
+    Each shard is placed at ``replicas`` points on the ring and a key belongs
+    to the first shard point at or after its hash, so adding a shard moves
+    only about 1/N of the keys, all of them onto the new shard.
+    """
+
+    def __init__(self, shards: Iterable[str], replicas: int = 64) -> None:
+        self.shards = list(shards)
+        if not self.shards:
+            raise ValueError("a hash ring needs at least one shard")
+        points = sorted(
+            (_hash(f"{shard}#{i}"), shard)
+            for shard in self.shards
+            for i in range(replicas)
+        )
+        self._hashes = [h for h, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_for(self, key: str) -> str:
+        i = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[i]
+
+
+@functools.cache
+def ring_for(shards: tuple[str, ...]) -> HashRing:
+    # built once per process, as the API bootstraps a unit of work per request
+    return HashRing(shards)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest())
+
+
+def sku_for_batchref(session: Session | Connection, batchref: str) -> str | None:
+    query = select(orm.batch_directory.c.sku).where(
+        orm.batch_directory.c.reference == batchref
+    )
+    return session.execute(query).scalar()
+
+
+def record_batches(session: Session, refs: dict[str, str]) -> set[str]:
+    """Adds new batches, by reference -> sku, to the directory.
+
+    Entries never change once written. Returns the references added.
+    """
+    if not refs:
+        return set()
+    known = set(
+        session.execute(
+            select(orm.batch_directory.c.reference).where(
+                orm.batch_directory.c.reference.in_(refs)
+            )
+        ).scalars()
+    )
+    rows = [{"reference": r, "sku": sku} for r, sku in refs.items() if r not in known]
+    if rows:
+        session.execute(insert(orm.batch_directory), rows)
+    return {row["reference"] for row in rows}
+
+
+def forget_batches(session: Session, refs: Iterable[str]) -> None:
+    session.execute(
+        delete(orm.batch_directory).where(orm.batch_directory.c.reference.in_(refs))
+    )
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Protocol
+
+from sqlalchemy import Engine, exc, select, text
+
+from . import orm
+
+logger = logging.getLogger(__name__)
+
+# Postgres's error code for a lock wait cut short by lock_timeout
+LOCK_NOT_AVAILABLE = "55P03"
+
+
+class SkuLockTimeout(Exception):
+    pass
+
+
+class SkuLock(Protocol):
+    """Serializes commands on one SKU before they load its aggregate.
+
+    Contended SKUs then queue for the lock instead of all doing the work and
+    all but one failing at commit. The lock is an optimization only: the
+    aggregate's version check still guards against concurrent writes.
+    """
+
+    def hold(self, sku: str) -> AbstractContextManager[None]:
+        ...
+
+    def hold_batch(self, batchref: str) -> AbstractContextManager[None]:
+        """Holds the lock of the SKU the batch belongs to, if it exists."""
+        ...
+
+
+@dataclass
+class LockStats:
+    """How long commands have waited for SKU locks."""
+
+    acquired: int = 0
+    timeouts: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def mean_wait(self) -> float:
+        return self.total_wait / self.acquired if self.acquired else 0.0
+
+    def record(self, sku: str, wait: float) -> None:
+        with self._lock:
+            self.acquired += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        logger.debug("waited %.3fs for the lock on %s", wait, sku)
+
+    def timed_out(self, sku: str, wait: float) -> SkuLockTimeout:
+        with self._lock:
+            self.timeouts += 1
+        logger.warning("gave up on the lock on %s after %.3fs", sku, wait)
+        return SkuLockTimeout(f"timed out waiting for the lock on {sku}")
+
+
+class NoSkuLock(SkuLock):
+    def hold(self, sku: str) -> AbstractContextManager[None]:
+        return nullcontext()
+
+    def hold_batch(self, batchref: str) -> AbstractContextManager[None]:
+        return nullcontext()
+
+
+class LocalSkuLock(SkuLock):
+    """SKU locks shared by the threads of one process, for single-node setups.
+
+    SKUs are hashed onto a fixed set of lock stripes, so memory stays bounded;
+    SKUs sharing a stripe are serialized together. ``sku_for_batchref`` finds
+    a batch's SKU, by default in the batches table of ``engine``.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        timeout: float = 5.0,
+        stripes: int = 1024,
+        sku_for_batchref: Callable[[str], str | None] | None = None,
+    ) -> None:
+        self.engine = engine
+        self.timeout = timeout
+        self._sku_for_batchref = sku_for_batchref or functools.partial(
+            batch_sku, engine
+        )
+        self.stats = LockStats()
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+
+    @contextmanager
+    def hold(self, sku: str) -> Iterator[None]:
+        lock = self._stripes[lock_key(sku) % len(self._stripes)]
+        start = time.monotonic()
+        if not lock.acquire(timeout=self.timeout):
+            raise self.stats.timed_out(sku, time.monotonic() - start)
+        self.stats.record(sku, time.monotonic() - start)
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def hold_batch(self, batchref: str) -> AbstractContextManager[None]:
+        sku = self._sku_for_batchref(batchref)
+        return nullcontext() if sku is None else self.hold(sku)
+
+
+class AdvisoryLock(SkuLock):
+    """SKU locks shared by every node, as Postgres session advisory locks.
+
+    Each lock is held on a pooled connection of its own, outside the
+    command's transaction, so that transaction only starts (and takes its
+    REPEATABLE READ snapshot) once the lock is held. Size the pool for one
+    extra connection per command in flight.
+
+    ``engine_for`` picks the database a SKU's lock is taken in, and
+    ``sku_for_batchref`` finds a batch's SKU; by default both use ``engine``.
+    Sharded setups lock each SKU on its own shard.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        timeout: float = 5.0,
+        engine_for: Callable[[str], Engine] | None = None,
+        sku_for_batchref: Callable[[str], str | None] | None = None,
+    ) -> None:
+        self.engine = engine
+        self.timeout = timeout
+        self.stats = LockStats()
+        self._engine_for = engine_for or (lambda sku: engine)
+        self._sku_for_batchref = sku_for_batchref or functools.partial(
+            batch_sku, engine
+        )
+
+    @contextmanager
+    def hold(self, sku: str) -> Iterator[None]:
+        key = lock_key(sku)
+        start = time.monotonic()
+        with self._engine_for(sku).connect() as connection:
+            try:
+                connection.execute(
+                    text("SELECT set_config('lock_timeout', :timeout, true)"),
+                    {"timeout": f"{round(self.timeout * 1000)}ms"},
+                )
+                connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": key})
+                # the lock is the session's, and outlives this transaction
+                connection.commit()
+            except exc.OperationalError as e:
+                if getattr(e.orig, "pgcode", None) != LOCK_NOT_AVAILABLE:
+                    raise
+                connection.rollback()
+                raise self.stats.timed_out(sku, time.monotonic() - start) from e
+            self.stats.record(sku, time.monotonic() - start)
+            try:
+                yield
+            finally:
+                connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": key}
+                )
+                connection.commit()
+
+    def hold_batch(self, batchref: str) -> AbstractContextManager[None]:
+        sku = self._sku_for_batchref(batchref)
+        return nullcontext() if sku is None else self.hold(sku)
+
+
+def lock_key(sku: str) -> int:
+    # a signed 64-bit int, as Postgres advisory locks take
+    digest = hashlib.blake2b(sku.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def batch_sku(engine: Engine, batchref: str) -> str | None:
+    # a batch never changes SKU, so this needs no transaction of the command's
+    query = select(orm.batches.c.sku).where(orm.batches.c.reference == batchref)
+    with engine.connect() as connection:
+        return connection.execute(query).scalar()
+
+
+SKU_LOCKS: dict[str, type[LocalSkuLock] | type[AdvisoryLock]] = {
+    "local": LocalSkuLock,
+    "advisory": AdvisoryLock,
+}
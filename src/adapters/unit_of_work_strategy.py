@@ -1,13 +1,29 @@
 from __future__ import annotations
 
-from collections.abc import Callable
-from typing import Any, Protocol, Self
+import functools
+import logging
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from typing import Any, Protocol, Self, runtime_checkable
 
-from sqlalchemy import Engine, create_engine
+from sqlalchemy import Engine, Table, create_engine, event
 from sqlalchemy.orm import Session, sessionmaker
 
-from src.adapters import repository
+from src.adapters import bulk_insert, orm, product_cache, repository, sharding
 from src.config import config
+from src.domain import model
+
+logger = logging.getLogger(__name__)
+
+
+class Savepoint(Protocol):
+    is_active: bool
+
+    def commit(self) -> None:
+        ...
+
+    def rollback(self) -> None:
+        ...
 
 
 class UnitOfWorkStrategy(Protocol):
@@ -25,41 +41,296 @@ class UnitOfWorkStrategy(Protocol):
     def rollback(self) -> None:
         ...
 
-    def execute(self, *args, **kwargs) -> Any:
+    def execute(self, *args, sku: str | None = None, **kwargs) -> Any:
+        """Runs a statement in the current transaction.
+
+        ``sku`` names the product a statement is about when its parameters do
+        not, for strategies that keep products in different places.
+        """
+        ...
+
+    def query(
+        self, *args, consistent: bool = False, sku: str | None = None, **kwargs
+    ) -> Any:
+        """Runs a read-only statement, on a replica when one is configured.
+
+        ``consistent`` reads from the primary instead, seeing every commit.
+        """
+        ...
+
+    def insert_rows(self, table: Table, rows: Sequence[dict[str, Any]]) -> None:
+        """Writes many rows in the current transaction, with COPY on Postgres."""
+        ...
+
+    def fork(self) -> UnitOfWorkStrategy:
+        """A new strategy on the same database, safe to use from another thread."""
         ...
 
 
-class SqlAlchemyUnitOfWork(UnitOfWorkStrategy):
+@runtime_checkable
+class SupportsSavepoints(Protocol):
+    """A strategy whose transaction can nest savepoints, as coalescing needs."""
+
+    def begin_nested(self) -> Savepoint:
+        ...
+
+
+class SqlAlchemyUnitOfWork(UnitOfWorkStrategy, SupportsSavepoints):
     session: Session
     products: repository.Repository
 
     def __init__(
         self,
         session_factory: Callable[[], Session] | None = None,
+        cache: product_cache.ProductCache | None = None,
+        read_session_factory: Callable[[], Session] | None = None,
     ) -> None:
         self.session_factory = session_factory or get_session
+        self.cache = cache
+        # queries share the write session unless given somewhere else to go
+        if read_session_factory is None:
+            replicated = session_factory is None and config.POSTGRES_REPLICA_URI
+            read_session_factory = (
+                get_read_session if replicated else self.session_factory
+            )
+        self.read_session_factory = read_session_factory
 
     def __enter__(self) -> Self:
         self.session = self.session_factory()
-        self.products = repository.SqlAlchemyRepository(self.session)
+        self._read_session: Session | None = None
+        self._committed: list[model.Product] = []
+        if self.cache is None:
+            self.products = repository.SqlAlchemyRepository(self.session)
+            return self
+        # cached snapshots must keep their state once detached
+        self.session.expire_on_commit = False
+        self.products = product_cache.CachedRepository(self.session, self.cache)
         return self
 
     def __exit__(self, *args) -> None:
+        if self._read_session is not None:
+            self._read_session.close()
+        if self.cache is None:
+            self.session.close()
+            return
+        cacheable = [p for p in self._committed if product_cache.is_cacheable(p)]
+        for product in cacheable:
+            product_cache.snapshot(self.session, product)
         self.session.close()
+        for product in cacheable:
+            self.cache.put(product)
 
     def commit(self) -> None:
         self.session.commit()
+        if self.cache is not None:
+            self._committed = list(self.products.loaded.values())  # type: ignore[attr-defined]
 
     def rollback(self) -> None:
-        self.session.rollback()
+        session = self.session
+        if session.in_transaction() or session.dirty or session.new:
+            # anything rolled back leaves the loaded products unfit to cache
+            self._committed = []
+        session.rollback()
 
-    def execute(self, *args, **kwargs) -> Any:
+    def execute(self, *args, sku: str | None = None, **kwargs) -> Any:
         return self.session.execute(*args, **kwargs)
 
+    def query(
+        self, *args, consistent: bool = False, sku: str | None = None, **kwargs
+    ) -> Any:
+        if consistent or self.read_session_factory is self.session_factory:
+            return self.session.execute(*args, **kwargs)
+        if self._read_session is None:
+            self._read_session = self.read_session_factory()
+        return self._read_session.execute(*args, **kwargs)
+
+    def begin_nested(self) -> Savepoint:
+        return self.session.begin_nested()
+
+    def insert_rows(self, table: Table, rows: Sequence[dict[str, Any]]) -> None:
+        bulk_insert.insert_rows(self.session.connection(), table, rows)
+
+    def fork(self) -> SqlAlchemyUnitOfWork:
+        return SqlAlchemyUnitOfWork(
+            self.session_factory, self.cache, self.read_session_factory
+        )
+
+
+class ShardedUnitOfWork(UnitOfWorkStrategy):
+    """Spreads products over several databases by consistent hashing of SKUs.
+
+    Statements given a ``sku``, or whose parameters name one, run on that
+    SKU's shard, and the rest on the home shard (the first), which also keeps
+    the batch directory and the tables that are not per product. ``query``
+    without a ``sku`` is scattered to every shard and the results merged.
+
+    A transaction that touched several shards is not atomic: the shards
+    commit one at a time, home first, and one failing leaves those before it
+    committed. Directory entries for batches that were not written are then
+    removed again.
+    """
+
+    products: repository.Repository
+
+    def __init__(
+        self,
+        session_factories: dict[str, Callable[[], Session]],
+        ring: sharding.HashRing | None = None,
+    ) -> None:
+        self.session_factories = session_factories
+        self.ring = ring or sharding.HashRing(session_factories)
+        self.home = next(iter(session_factories))
+
+    def __enter__(self) -> Self:
+        self._sessions: dict[str, Session] = {}
+        # reference -> sku of the batches to add to the directory at commit
+        self._new_batches: dict[str, str] = {}
+        self.products = repository.ShardedRepository(
+            self.session_for, lambda: self._session(self.home)
+        )
+        return self
+
+    def __exit__(self, *args) -> None:
+        for session in self._sessions.values():
+            session.close()
+
+    def session_for(self, sku: str) -> Session:
+        return self._session(self.ring.shard_for(sku))
+
+    def _session(self, shard: str) -> Session:
+        if shard not in self._sessions:
+            session = self.session_factories[shard]()
+            event.listen(session, "before_flush", self._collect_new_batches)
+            self._sessions[shard] = session
+        return self._sessions[shard]
+
+    def _collect_new_batches(self, session: Session, *args) -> None:
+        self._new_batches.update(
+            {o.reference: o.sku for o in session.new if isinstance(o, model.Batch)}
+        )
+
+    def commit(self) -> None:
+        shards = sorted(self._sessions, key=lambda shard: shard != self.home)
+        for shard in shards:
+            self._sessions[shard].flush()
+        new_batches, self._new_batches = self._new_batches, {}
+        recorded = set()
+        if new_batches:
+            home = self._session(self.home)
+            recorded = sharding.record_batches(home, new_batches)
+            if self.home not in shards:
+                shards.insert(0, self.home)
+        for i, shard in enumerate(shards):
+            try:
+                self._sessions[shard].commit()
+            except Exception:
+                if i > 0:
+                    unwritten = set(shards[i:])
+                    self._forget_batches(
+                        ref
+                        for ref in recorded
+                        if self.ring.shard_for(new_batches[ref]) in unwritten
+                    )
+                raise
+
+    def _forget_batches(self, refs: Iterable[str]) -> None:
+        # the directory is already committed, so undone in a new transaction
+        refs = list(refs)
+        if not refs:
+            return
+        session = self.session_factories[self.home]()
+        try:
+            sharding.forget_batches(session, refs)
+            session.commit()
+        except Exception:
+            logger.exception("Could not remove unwritten batches %s", refs)
+        finally:
+            session.close()
+
+    def rollback(self) -> None:
+        self._new_batches = {}
+        for session in self._sessions.values():
+            session.rollback()
+
+    def execute(
+        self, statement: Any, params: Any = None, sku: str | None = None, **kwargs
+    ) -> Any:
+        if sku is not None:
+            return self.session_for(sku).execute(statement, params, **kwargs)
+        if isinstance(params, list):
+            # many rows at once: each shard gets its own
+            rows: defaultdict[str, list] = defaultdict(list)
+            for row in params:
+                rows[self._shard_of(row)].append(row)
+            results = [
+                self._session(shard).execute(statement, shard_rows, **kwargs)
+                for shard, shard_rows in rows.items()
+            ]
+            return results[-1] if results else None
+        return self._session(self._shard_of(params)).execute(
+            statement, params, **kwargs
+        )
+
+    def query(
+        self,
+        statement: Any,
+        params: Any = None,
+        consistent: bool = False,
+        sku: str | None = None,
+        **kwargs,
+    ) -> Any:
+        # shards are read from their primaries, so every query is consistent
+        if sku is not None or (isinstance(params, Mapping) and "sku" in params):
+            return self.execute(statement, params, sku=sku, **kwargs)
+        results = [
+            self._session(shard).execute(statement, params, **kwargs)
+            for shard in self.session_factories
+        ]
+        return results[0].merge(*results[1:])
+
+    def insert_rows(self, table: Table, rows: Sequence[dict[str, Any]]) -> None:
+        by_shard: defaultdict[str, list] = defaultdict(list)
+        for row in rows:
+            by_shard[self._shard_of(row)].append(row)
+        for shard, shard_rows in by_shard.items():
+            bulk_insert.insert_rows(
+                self._session(shard).connection(), table, shard_rows
+            )
+        if table is orm.batches:
+            self._new_batches.update({row["reference"]: row["sku"] for row in rows})
+
+    def fork(self) -> ShardedUnitOfWork:
+        return ShardedUnitOfWork(self.session_factories, self.ring)
+
+    def _shard_of(self, params: Any) -> str:
+        if isinstance(params, Mapping) and params.get("sku") is not None:
+            return self.ring.shard_for(params["sku"])
+        return self.home
+
+
+def get_sharded_unit_of_work(urls: list[str]) -> ShardedUnitOfWork:
+    shards = {
+        shard: functools.partial(get_session, engine)
+        for shard, engine in shard_engines(urls).items()
+    }
+    return ShardedUnitOfWork(shards, sharding.ring_for(tuple(shards)))
+
+
+def shard_engines(urls: list[str]) -> dict[str, Engine]:
+    """The shards' engines by name, the home shard first."""
+    return {f"shard-{i}": get_engine(url) for i, url in enumerate(urls)}
+
 
 def get_engine(url: str | None = None) -> Engine:
-    url = url or config.POSTGRES_URI
-    return create_engine(url, isolation_level="REPEATABLE READ")
+    return _create_engine(url or config.POSTGRES_URI)
+
+
+@functools.cache
+def _create_engine(url: str) -> Engine:
+    # one engine (and connection pool) per URL for the life of the process
+    return create_engine(
+        url, isolation_level="REPEATABLE READ", pool_size=config.POSTGRES_POOL_SIZE
+    )
 
 
 def get_session(
@@ -67,3 +338,10 @@ def get_session(
 ) -> Session:
     engine = engine or get_engine()
     return sessionmaker(bind=engine)()
+
+
+def get_read_session(
+    engine: Engine | None = None,
+) -> Session:
+    engine = engine or get_engine(config.POSTGRES_REPLICA_URI)
+    return sessionmaker(bind=engine)()
@@ -1,12 +1,27 @@
+import functools
 import inspect
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
 from sqlalchemy.orm import clear_mappers
 
-from src.adapters import orm, redis_event_publisher, unit_of_work_strategy
+from src.adapters import (
+    dead_letters,
+    event_store,
+    idempotency,
+    orm,
+    product_cache,
+    redis_event_publisher,
+    row_lock_allocator,
+    sharding,
+    sku_locks,
+    unit_of_work_strategy,
+)
 from src.adapters.notifications import EmailNotifications, NotificationsProtocol
-from src.service_layer import handlers, messagebus, unit_of_work
+from src.config import config
+from src.domain import commands, deallocation, events
+from src.service_layer import handlers, messagebus, retries, unit_of_work
 
 
 def bootstrap(
@@ -14,31 +29,179 @@ def bootstrap(
     uow: unit_of_work_strategy.UnitOfWorkStrategy | None = None,
     notifications: NotificationsProtocol | None = None,
     publish: Callable = redis_event_publisher.publish,
+    allocation_strategy: str = config.ALLOCATION_STRATEGY,
+    dedup_store: idempotency.DedupStore | None = None,
+    coalesce_commands: bool = config.COALESCE_COMMANDS,
+    deallocation_policy: str = config.DEALLOCATION_POLICY,
+    bulk_reallocation: bool = config.BULK_REALLOCATION,
+    record_events: bool = config.EVENT_STORE,
+    event_handler_threads: int = config.EVENT_HANDLER_THREADS,
+    retry_scheduler: retries.RetryScheduler | None = None,
+    sku_lock: sku_locks.SkuLock | None = None,
 ) -> messagebus.MessageBus:
-    uow = uow or unit_of_work_strategy.SqlAlchemyUnitOfWork()
-    uow_ = unit_of_work.UnitOfWork(uow=uow)
+    if uow is None and config.SHARD_URIS:
+        uow = unit_of_work_strategy.get_sharded_unit_of_work(config.SHARD_URIS)
+    uow = uow or unit_of_work_strategy.SqlAlchemyUnitOfWork(
+        cache=product_cache.get_cache() if config.PRODUCT_CACHE_SIZE else None
+    )
+    if (
+        isinstance(uow, unit_of_work_strategy.ShardedUnitOfWork)
+        and allocation_strategy == "row_lock"
+    ):
+        # it writes through a single transaction that sharding cannot give
+        raise ValueError("Sharding does not support row_lock allocation")
+    if coalesce_commands and not isinstance(
+        uow, unit_of_work_strategy.SupportsSavepoints
+    ):
+        raise ValueError("Coalescing needs a unit of work that supports savepoints")
+    if isinstance(uow, unit_of_work_strategy.ShardedUnitOfWork) and record_events:
+        # the log is one sequence of positions that replay and snapshots count
+        # in, which events appended to each SKU's own shard would not form
+        raise ValueError("The event store cannot be used with sharding")
+    if allocation_strategy == "row_lock" and getattr(uow, "cache", None) is not None:
+        # row-lock allocation writes behind the aggregate's back without
+        # bumping its version, so cached products would go stale unnoticed
+        raise ValueError("The product cache cannot be used with row_lock allocation")
+    dedup_store = dedup_store or process_dedup_store()
+    uow_ = unit_of_work.UnitOfWork(
+        uow=uow,
+        event_store=(
+            event_store.EventStore(snapshot_every=config.EVENT_SNAPSHOT_EVERY)
+            if record_events
+            else None
+        ),
+        dedup_store=dedup_store,
+    )
+    if retry_scheduler is None and config.RETRY_FAILED_HANDLERS:
+        retry_scheduler = handler_retry_scheduler()
+    sku_lock = sku_lock or process_sku_lock(config.SKU_LOCK)
     notifications = notifications or EmailNotifications()
     if start_orm:
-        clear_mappers()
-        orm.start_mappers()
+        start_mappers()
+
+    dependencies = {
+        "uow": uow_,
+        "notifications": notifications,
+        "publish": publish,
+        "allocator": row_lock_allocator.RowLockAllocator(),
+        "deallocation_policy": deallocation.POLICIES[deallocation_policy],
+        "sku_lock": sku_lock,
+    }
+    command_handlers = {
+        **handlers.COMMAND_HANDLERS,
+        commands.Allocate: handlers.ALLOCATION_STRATEGIES[allocation_strategy],
+    }
+    handlers_by_event = handlers.EVENT_HANDLERS
+    if bulk_reallocation:
+        command_handlers[
+            commands.ChangeBatchQuantity
+        ] = handlers.change_batch_quantity_and_reallocate
+        handlers_by_event = {
+            **handlers_by_event,
+            events.Deallocated: [
+                handler
+                for handler in handlers_by_event[events.Deallocated]
+                if handler is not handlers.reallocate
+            ],
+        }
+
+    def inject(handler: Callable) -> Callable[[Any], Any]:
+        if event_handler_threads and getattr(handler, "independent", False):
+            return isolate(handler, dependencies)
+        return inject_dependencies(handler, dependencies)
 
-    dependencies = {"uow": uow_, "notifications": notifications, "publish": publish}
     injected_event_handlers = {
-        event_type: [
-            inject_dependencies(handler, dependencies) for handler in event_handlers
-        ]
-        for event_type, event_handlers in handlers.EVENT_HANDLERS.items()
+        event_type: [inject(handler) for handler in event_handlers]
+        for event_type, event_handlers in handlers_by_event.items()
     }
     injected_command_handlers = {
         command_type: inject_dependencies(handler, dependencies)
-        for command_type, handler in handlers.COMMAND_HANDLERS.items()
+        for command_type, handler in command_handlers.items()
     }
 
     return messagebus.MessageBus(
         uow=uow_,
         event_handlers=injected_event_handlers,
         command_handlers=injected_command_handlers,
+        dedup_store=dedup_store,
+        coalesce_commands=coalesce_commands,
+        executor=(
+            event_handler_pool(event_handler_threads) if event_handler_threads else None
+        ),
+        retries=retry_scheduler,
+    )
+
+
+@functools.cache
+def event_handler_pool(threads: int) -> ThreadPoolExecutor:
+    # shared by every bus in the process, as the API bootstraps one per request
+    return ThreadPoolExecutor(max_workers=threads, thread_name_prefix="event-handler")
+
+
+@functools.cache
+def process_dedup_store() -> idempotency.DedupStore:
+    # shared by every bus in the process, so the LRU and purge count are too
+    return idempotency.CachedDedupStore(idempotency.SqlAlchemyDedupStore())
+
+
+@functools.cache
+def handler_retry_scheduler() -> retries.RetryScheduler:
+    scheduler = retries.RetryScheduler(
+        bus_factory=lambda: bootstrap(start_orm=False),
+        dead_letters=dead_letters.SqlAlchemyDeadLetterStore(
+            unit_of_work_strategy.SqlAlchemyUnitOfWork()
+        ),
     )
+    scheduler.start()
+    return scheduler
+
+
+@functools.cache
+def process_sku_lock(kind: str) -> sku_locks.SkuLock:
+    # shared by every bus in the process, so local locks and wait stats are too
+    if not kind:
+        return sku_locks.NoSkuLock()
+    if not config.SHARD_URIS:
+        return sku_locks.SKU_LOCKS[kind](
+            unit_of_work_strategy.get_engine(), timeout=config.SKU_LOCK_TIMEOUT
+        )
+    # batches are found through the directory and each SKU locked on its shard
+    engines = unit_of_work_strategy.shard_engines(config.SHARD_URIS)
+    ring = sharding.ring_for(tuple(engines))
+    home = next(iter(engines.values()))
+
+    def sku_for_batchref(batchref: str) -> str | None:
+        with home.connect() as connection:
+            return sharding.sku_for_batchref(connection, batchref)
+
+    if kind == "local":
+        return sku_locks.LocalSkuLock(
+            home, config.SKU_LOCK_TIMEOUT, sku_for_batchref=sku_for_batchref
+        )
+    return sku_locks.AdvisoryLock(
+        home,
+        config.SKU_LOCK_TIMEOUT,
+        engine_for=lambda sku: engines[ring.shard_for(sku)],
+        sku_for_batchref=sku_for_batchref,
+    )
+
+
+def start_mappers() -> None:
+    clear_mappers()
+    orm.start_mappers()
+
+
+def warm_up(connections: int = config.POSTGRES_POOL_SIZE) -> None:
+    """Opens database and Redis connections ahead of the first request."""
+    urls = {config.POSTGRES_URI, config.POSTGRES_REPLICA_URI or config.POSTGRES_URI}
+    # products live on the shards, while jobs and dead letters stay on the primary
+    urls.update(config.SHARD_URIS)
+    for url in urls:
+        engine = unit_of_work_strategy.get_engine(url)
+        opened = [engine.connect() for _ in range(connections)]
+        for connection in opened:
+            connection.close()
+    redis_event_publisher.get_client().ping()
 
 
 def inject_dependencies(handler: Callable, dependencies: dict) -> Callable[[Any], Any]:
@@ -46,4 +209,18 @@ def inject_dependencies(handler: Callable, dependencies: dict) -> Callable[[Any]
     deps = {
         name: dependency for name, dependency in dependencies.items() if name in params
     }
-    return lambda message: handler(message, **deps)
+
+    @functools.wraps(handler)
+    def injected(message: Any) -> Any:
+        return handler(message, **deps)
+
+    return injected
+
+
+def isolate(handler: Callable, dependencies: dict) -> Callable[[Any], Any]:
+    """Injects a handler with a unit of work of its own, to run on another thread."""
+    params = inspect.signature(handler).parameters
+    uow = dependencies["uow"].fork() if "uow" in params else None
+    injected = inject_dependencies(handler, {**dependencies, "uow": uow})
+    injected.uow = uow  # type: ignore[attr-defined]
+    return injected
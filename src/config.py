@@ -20,8 +20,53 @@ class Config:
     PROJECT_NAME: str = "Architecture Patterns with Python"
     API_V1_STR: str = "/api/v1"
     POSTGRES_URI: str = "postgresql://user:password@db:5432/app_db"
+    POSTGRES_REPLICA_URI: str | None = os.environ.get("POSTGRES_REPLICA_URI")
+    # databases products are sharded over by SKU, comma separated, the first
+    # being the home shard; unset keeps everything in POSTGRES_URI
+    SHARD_URIS: list[str] = [
+        uri for uri in os.environ.get("SHARD_URIS", "").split(",") if uri
+    ]
+    POSTGRES_POOL_SIZE: int = int(os.environ.get("POSTGRES_POOL_SIZE", 5))
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
+    ALLOCATION_STRATEGY: str = os.environ.get("ALLOCATION_STRATEGY", "aggregate")
+    DEALLOCATION_POLICY: str = os.environ.get("DEALLOCATION_POLICY", "fewest_lines")
+    # number of Product aggregates cached per process; 0 disables the cache
+    PRODUCT_CACHE_SIZE: int = int(os.environ.get("PRODUCT_CACHE_SIZE", 0))
+    REDIS_CODEC: str = os.environ.get("REDIS_CODEC", "json")
+    BULK_REALLOCATION: bool = os.environ.get("BULK_REALLOCATION", "") == "1"
+    COALESCE_COMMANDS: bool = os.environ.get("COALESCE_COMMANDS", "") == "1"
+    # append domain events to the event store, snapshotting every N per product
+    EVENT_STORE: bool = os.environ.get("EVENT_STORE", "") == "1"
+    EVENT_SNAPSHOT_EVERY: int = int(os.environ.get("EVENT_SNAPSHOT_EVERY", 100))
+    # threads running independent event handlers concurrently; 0 runs them in turn
+    EVENT_HANDLER_THREADS: int = int(os.environ.get("EVENT_HANDLER_THREADS", 0))
+    # retry failed event handlers in the background, dead-lettering the rest
+    RETRY_FAILED_HANDLERS: bool = os.environ.get("RETRY_FAILED_HANDLERS", "") == "1"
+    # queue POST /allocations for job workers instead of allocating in-request
+    ASYNC_ALLOCATIONS: bool = os.environ.get("ASYNC_ALLOCATIONS", "") == "1"
+    # changes buffered per change-feed client, and clients allowed per process
+    CHANGE_FEED_BUFFER: int = int(os.environ.get("CHANGE_FEED_BUFFER", 100))
+    CHANGE_FEED_MAX_SUBSCRIBERS: int = int(
+        os.environ.get("CHANGE_FEED_MAX_SUBSCRIBERS", 1000)
+    )
+    # commands run at once by each API process (0 disables admission control),
+    # how many may wait for a slot, and for how many seconds
+    ADMISSION_CAPACITY: int = int(os.environ.get("ADMISSION_CAPACITY", 0))
+    ADMISSION_QUEUE: int = int(os.environ.get("ADMISSION_QUEUE", 100))
+    ADMISSION_TIMEOUT: float = float(os.environ.get("ADMISSION_TIMEOUT", 2.0))
+    # lock each SKU before allocating against it: "local" within one process,
+    # "advisory" across nodes with Postgres advisory locks; "" takes no lock
+    SKU_LOCK: str = os.environ.get("SKU_LOCK", "")
+    SKU_LOCK_TIMEOUT: float = float(os.environ.get("SKU_LOCK_TIMEOUT", 5.0))
+    # lanes running consumed commands concurrently by SKU (1 runs them inline),
+    # how many commands each lane may queue before the reader waits, and how
+    # often, in seconds, the lanes' queue depths are logged
+    COMMAND_LANES: int = int(os.environ.get("COMMAND_LANES", 1))
+    COMMAND_LANE_QUEUE: int = int(os.environ.get("COMMAND_LANE_QUEUE", 1000))
+    COMMAND_LANE_STATS_EVERY: float = float(
+        os.environ.get("COMMAND_LANE_STATS_EVERY", 60.0)
+    )
 
     def get_redis_host_and_port(self) -> dict[str, str | int]:
         return _get_redis_host_and_port()
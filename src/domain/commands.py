@@ -8,6 +8,8 @@ from pydantic import BaseModel, ConfigDict
 class Command(BaseModel):
     model_config = ConfigDict(frozen=True)
 
+    idempotency_key: str | None = None
+
 
 class Allocate(Command):
     orderid: str
@@ -15,6 +17,11 @@ class Allocate(Command):
     qty: int
 
 
+class Deallocate(Command):
+    orderid: str
+    sku: str
+
+
 class CreateBatch(Command):
     ref: str
     sku: str
@@ -25,3 +32,8 @@ class CreateBatch(Command):
 class ChangeBatchQuantity(Command):
     ref: str
     qty: int
+
+
+class ArchiveBatches(Command):
+    sku: str
+    before: date
@@ -0,0 +1,70 @@
+"""Policies choosing which lines to evict when a batch shrinks.
+
+A policy takes a batch's allocated lines and the quantity that must be freed,
+and returns the lines to deallocate, in eviction order.
+"""
+from __future__ import annotations
+
+from collections.abc import Callable, Collection
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .model import OrderLine
+
+DeallocationPolicy = Callable[[Collection["OrderLine"], int], list["OrderLine"]]
+
+
+def _largest_first(line: OrderLine) -> tuple[int, str]:
+    return (-line.qty, line.orderid)
+
+
+def fewest_lines(lines: Collection[OrderLine], shortfall: int) -> list[OrderLine]:
+    """Frees ``shortfall`` with as few evictions as possible.
+
+    Takes the largest lines until the next one would cover the rest, then picks
+    the smallest line that still covers it, so the last eviction overshoots as
+    little as possible.
+    """
+    by_size = sorted(lines, key=_largest_first)
+    evicted: list[OrderLine] = []
+    remaining = shortfall
+    for i, line in enumerate(by_size):
+        if remaining <= 0:
+            break
+        if line.qty < remaining:
+            evicted.append(line)
+            remaining -= line.qty
+            continue
+        best_fit = i
+        while best_fit + 1 < len(by_size) and by_size[best_fit + 1].qty >= remaining:
+            best_fit += 1
+        evicted.append(by_size[best_fit])
+        break
+    return evicted
+
+
+def by_priority(
+    key: Callable[[OrderLine], Any], reverse: bool = False
+) -> DeallocationPolicy:
+    """Evicts lines in ``key`` order until ``shortfall`` is freed."""
+
+    def policy(lines: Collection[OrderLine], shortfall: int) -> list[OrderLine]:
+        evicted: list[OrderLine] = []
+        remaining = shortfall
+        for line in sorted(lines, key=key, reverse=reverse):
+            if remaining <= 0:
+                break
+            evicted.append(line)
+            remaining -= line.qty
+        return evicted
+
+    return policy
+
+
+largest_first = by_priority(_largest_first)
+
+POLICIES: dict[str, DeallocationPolicy] = {
+    "fewest_lines": fewest_lines,
+    "largest_first": largest_first,
+    "latest_orderid_first": by_priority(lambda line: line.orderid, reverse=True),
+}
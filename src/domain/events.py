@@ -1,12 +1,22 @@
 from __future__ import annotations
 
+from dataclasses import dataclass
+from datetime import date
+
 from pydantic import BaseModel, ConfigDict
 
 
-class Event(BaseModel):
-    model_config = ConfigDict(frozen=True)
+@dataclass(frozen=True, slots=True, kw_only=True)
+class Event:
+    """Base class for domain events.
+
+    Events are raised on the hot path (one or more per allocation), so they are
+    plain slotted dataclasses rather than pydantic models; they are validated
+    by the codecs' pydantic adapters when they cross Redis or the event store.
+    """
 
 
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Allocated(Event):
     orderid: str
     sku: str
@@ -14,21 +24,51 @@ class Allocated(Event):
     batchref: str
 
 
+@dataclass(frozen=True, slots=True, kw_only=True)
 class Deallocated(Event):
     orderid: str
     sku: str
     qty: int
 
 
+@dataclass(frozen=True, slots=True, kw_only=True)
+class AllocationCancelled(Event):
+    orderid: str
+    sku: str
+    qty: int
+    batchref: str
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class BatchCreated(Event):
+    sku: str
+    batchref: str
+    qty: int
+    eta: date | None
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class BatchQuantityChanged(Event):
+    sku: str
+    batchref: str
+    qty: int
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
 class AllocatedBatchRef(Event):
     batchref: str
 
 
-class AllocationsViewed(Event):
+class AllocationsViewed(BaseModel):
+    """A row of the allocations read model, as the API returns it."""
+
+    model_config = ConfigDict(frozen=True)
+
     orderid: str
     sku: str
     batchref: str
 
 
+@dataclass(frozen=True, slots=True, kw_only=True)
 class OutOfStock(Event):
     sku: str
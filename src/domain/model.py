@@ -1,9 +1,10 @@
 from __future__ import annotations
 
+from collections.abc import Iterable
 from dataclasses import dataclass, field
 from datetime import date
 
-from . import commands
+from . import commands, deallocation
 from . import events as domain_events
 from .entity import Entity
 from .value_object import ValueObject
@@ -18,7 +19,9 @@ class Product:
 
     def allocate(self, line: OrderLine) -> domain_events.AllocatedBatchRef | None:
         try:
-            batch = next(b for b in sorted(self.batches) if b.can_allocate(line))
+            batch = next(
+                b for b in sorted(self.batches, key=eta_order) if b.can_allocate(line)
+            )
             batch.allocate(line)
             self.version_number += 1
             self.messages.append(
@@ -34,16 +37,66 @@ class Product:
             self.messages.append(domain_events.OutOfStock(sku=line.sku))
             return None
 
-    def change_batch_quantity(self, ref: str, qty: int):
+    def reallocate(
+        self, lines: list[OrderLine]
+    ) -> list[domain_events.AllocatedBatchRef | None]:
+        return [self.allocate(line) for line in lines]
+
+    def change_batch_quantity(
+        self,
+        ref: str,
+        qty: int,
+        policy: deallocation.DeallocationPolicy = deallocation.fewest_lines,
+    ) -> list[OrderLine]:
         batch = next(b for b in self.batches if b.reference == ref)
         batch.purchased_quantity = qty
-        while batch.available_quantity < 0:
-            line = batch.deallocate_one()
+        self.version_number += 1
+        if batch.available_quantity >= 0:
+            return []
+        lines = policy(batch.allocations, -batch.available_quantity)
+        batch.deallocate(lines)
+        for line in lines:
             self.messages.append(
                 domain_events.Deallocated(
                     orderid=line.orderid, sku=line.sku, qty=line.qty
                 )
             )
+        return lines
+
+    def allocations_for(self, orderid: str) -> list[tuple[Batch, OrderLine]]:
+        return [
+            (batch, line)
+            for batch in self.batches
+            for line in batch.allocations
+            if line.orderid == orderid
+        ]
+
+    def deallocate(
+        self, orderid: str, allocated: Iterable[tuple[str, OrderLine]] | None = None
+    ) -> list[OrderLine]:
+        """Cancels the order's lines of this product.
+
+        ``allocated`` gives the lines with their batch references when they
+        have been looked up already, so other batches' lines are not read.
+        """
+        if allocated is None:
+            found = self.allocations_for(orderid)
+        else:
+            by_ref = {batch.reference: batch for batch in self.batches}
+            found = [(by_ref[ref], line) for ref, line in allocated]
+        for batch, line in found:
+            batch.deallocate([line])
+            self.messages.append(
+                domain_events.AllocationCancelled(
+                    orderid=line.orderid,
+                    sku=line.sku,
+                    qty=line.qty,
+                    batchref=batch.reference,
+                )
+            )
+        if found:
+            self.version_number += 1
+        return [line for _, line in found]
 
     def __hash__(self) -> int:
         return hash(self.sku)
@@ -63,6 +116,10 @@ class Batch(Entity):
     eta: date | None
     purchased_quantity: int
     allocations: set[OrderLine] = field(default_factory=set)
+    allocated_quantity: int = field(default=0, init=False)
+
+    def __post_init__(self) -> None:
+        self.allocated_quantity = sum(line.qty for line in self.allocations)
 
     def __repr__(self):
         return f"<Batch {self.reference}>"
@@ -83,15 +140,19 @@ class Batch(Entity):
         return self.eta > other.eta
 
     def allocate(self, line: OrderLine):
-        if self.can_allocate(line):
+        if self.can_allocate(line) and line not in self.allocations:
             self.allocations.add(line)
+            self.allocated_quantity += line.qty
 
     def deallocate_one(self) -> OrderLine:
-        return self.allocations.pop()
+        line = self.allocations.pop()
+        self.allocated_quantity -= line.qty
+        return line
 
-    @property
-    def allocated_quantity(self) -> int:
-        return sum(line.qty for line in self.allocations)
+    def deallocate(self, lines: list[OrderLine]) -> None:
+        for line in lines:
+            self.allocations.remove(line)
+            self.allocated_quantity -= line.qty
 
     @property
     def available_quantity(self) -> int:
@@ -99,3 +160,8 @@ class Batch(Entity):
 
     def can_allocate(self, line: OrderLine) -> bool:
         return self.sku == line.sku and self.available_quantity >= line.qty
+
+
+def eta_order(batch: Batch) -> tuple[bool, date]:
+    # same order as sorting by Batch.__gt__: warehouse stock first, then by ETA
+    return (batch.eta is not None, batch.eta or date.min)
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import time
+from datetime import date, timedelta
+
+from src import bootstrap
+from src.domain import commands
+from src.service_layer import archival
+
+logger = logging.getLogger(__name__)
+
+
+def run_once(older_than_days: int) -> int:
+    bus = bootstrap.bootstrap()
+    before = date.today() - timedelta(days=older_than_days)
+    skus = archival.archivable_skus(bus.uow, before)
+    for sku in skus:
+        bus.handle(commands.ArchiveBatches(sku=sku, before=before))
+    logger.info("archived batches for %s skus", len(skus))
+    return len(skus)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Archive exhausted batches whose ETA has passed"
+    )
+    parser.add_argument(
+        "--older-than-days",
+        type=int,
+        default=0,
+        help="only archive batches delivered at least this many days ago",
+    )
+    parser.add_argument(
+        "--every",
+        type=int,
+        metavar="SECONDS",
+        help="keep running, archiving every SECONDS",
+    )
+    args = parser.parse_args()
+
+    run_once(args.older_than_days)
+    while args.every:
+        time.sleep(args.every)
+        run_once(args.older_than_days)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
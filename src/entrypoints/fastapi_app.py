@@ -1,13 +1,37 @@
 from __future__ import annotations
 
+import functools
+import logging
+import threading
+from collections.abc import AsyncIterator, Callable
+from datetime import date
 from typing import TYPE_CHECKING
 
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, Response
+import anyio
+from fastapi import (
+    APIRouter,
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Request,
+    Response,
+)
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from tenacity import retry, wait_exponential
 
 from src import bootstrap, views
+from src.adapters import (
+    change_feed,
+    codecs,
+    job_queue,
+    sku_locks,
+    unit_of_work_strategy,
+)
 from src.config import config
 from src.domain import commands, events
-from src.service_layer import handlers
+from src.service_layer import admission, batch_import, handlers
 
 if TYPE_CHECKING:
     from src.service_layer import messagebus
@@ -16,44 +40,365 @@ app = FastAPI(
     title=config.PROJECT_NAME, openapi_url=f"{config.API_V1_STR}/openapi.json"
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
+json_codec = codecs.Codec()
+ready = threading.Event()
+# seconds between comments that keep idle change streams open through proxies
+KEEPALIVE_SECONDS = 15.0
+# SKUs one stock query may ask about
+MAX_STOCK_QUERY_SKUS = 1000
+
+
+class StockQuery(BaseModel):
+    skus: list[str] = Field(max_length=MAX_STOCK_QUERY_SKUS)
+    by: date | None = None
 
 
 def fast_api_bootstrap() -> messagebus.MessageBus:
-    return bootstrap.bootstrap()
+    return bootstrap.bootstrap(start_orm=False)
+
+
+def get_change_feed() -> change_feed.ChangeFeed:
+    return change_feed.get_feed()
+
+
+@functools.cache
+def get_admission() -> admission.AdmissionController:
+    return admission.AdmissionController(
+        capacity=config.ADMISSION_CAPACITY,
+        max_queue=config.ADMISSION_QUEUE,
+        timeout=config.ADMISSION_TIMEOUT,
+    )
+
+
+@functools.cache
+def admitted(
+    command_type: type[commands.Command],
+) -> Callable[[], AsyncIterator[None]]:
+    """A dependency holding an admission slot until the response is sent.
+
+    It waits on the event loop, so a queued request holds no worker thread and
+    has built no message bus yet; declare it before the other dependencies.
+    """
+
+    async def admit() -> AsyncIterator[None]:
+        async with get_admission().admit_async(command_type):
+            yield
+
+    return admit
+
+
+def runs_async(prefer: str | None) -> bool:
+    return config.ASYNC_ALLOCATIONS or prefer == "respond-async"
+
+
+async def admit_allocation(
+    prefer: str | None = Header(default=None),  # noqa: B008
+) -> AsyncIterator[None]:
+    # a queued allocation is only written down here, and admitted when it runs
+    if runs_async(prefer):
+        yield
+        return
+    async with get_admission().admit_async(commands.Allocate):
+        yield
+
+
+def get_job_queue() -> job_queue.JobQueue:
+    return job_queue.SqlAlchemyJobQueue(unit_of_work_strategy.SqlAlchemyUnitOfWork())
+
+
+@retry(wait=wait_exponential(max=10))
+def warm_up() -> None:
+    bootstrap.warm_up()
+    ready.set()
+    logger.info("warm-up complete")
+
+
+@app.on_event("startup")
+def startup() -> None:
+    bootstrap.start_mappers()
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+
+@app.exception_handler(admission.Rejected)
+def rejected_handler(request: Request, exc: admission.Rejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(sku_locks.SkuLockTimeout)
+def lock_timeout_handler(
+    request: Request, exc: sku_locks.SkuLockTimeout
+) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, round(config.SKU_LOCK_TIMEOUT)))},
+    )
+
+
+@app.get("/health/live")
+def liveness() -> dict[str, str]:
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def readiness() -> Response:
+    if not ready.is_set():
+        return Response(status_code=503)
+    return Response(status_code=200)
+
+
+def with_idempotency_key(
+    command: commands.Command, idempotency_key: str | None
+) -> commands.Command:
+    if idempotency_key is None:
+        return command
+    return command.model_copy(update={"idempotency_key": idempotency_key})
 
 
 @router.post("/batches", status_code=201)
 def add_batch_endpoint(
     batch_create: commands.CreateBatch,
+    _: None = Depends(admitted(commands.CreateBatch)),  # noqa: B008
     bus: messagebus.MessageBus = Depends(fast_api_bootstrap),  # noqa: B008
+    idempotency_key: str | None = Header(default=None),  # noqa: B008
 ) -> dict[str, str]:
-    bus.handle(batch_create)
+    bus.handle(with_idempotency_key(batch_create, idempotency_key))
     return {"message": "OK"}
 
 
+@router.post("/batches/import", status_code=201)
+async def import_batches_endpoint(
+    request: Request,
+    _: None = Depends(admitted(commands.CreateBatch)),  # noqa: B008
+    bus: messagebus.MessageBus = Depends(fast_api_bootstrap),  # noqa: B008
+) -> dict:
+    """Imports a CSV (ref,sku,qty,eta) or NDJSON stream of batches.
+
+    The body is read chunk by chunk while a worker thread validates and writes
+    it, so uploads of any size run in bounded memory.
+    """
+    fmt = batch_import.format_for(request.headers.get("content-type", ""))
+    body = request.stream()
+
+    async def next_chunk() -> bytes | None:
+        return await anext(body, None)
+
+    def run_import() -> batch_import.ImportReport:
+        chunks = iter(lambda: anyio.from_thread.run(next_chunk), None)
+        return batch_import.import_batches(
+            bus.uow, fmt, batch_import.decode_lines(chunks)
+        )
+
+    report = await anyio.to_thread.run_sync(run_import)
+    return {
+        "rows": report.rows,
+        "products_created": report.products_created,
+        "duplicates": report.duplicates,
+        "rows_per_second": round(report.rows_per_second),
+        "errors": [{"line": e.line, "error": e.error} for e in report.errors],
+    }
+
+
 @router.post("/allocations", status_code=202)
 def allocate_endpoint(
     allocate: commands.Allocate,
+    _: None = Depends(admit_allocation),  # noqa: B008
     bus: messagebus.MessageBus = Depends(fast_api_bootstrap),  # noqa: B008
+    jobs: job_queue.JobQueue = Depends(get_job_queue),  # noqa: B008
+    idempotency_key: str | None = Header(default=None),  # noqa: B008
+    prefer: str | None = Header(default=None),  # noqa: B008
 ) -> Response:
+    """Allocates straight away, or queues it for a worker when running async.
+
+    Allocation is queued when ``ASYNC_ALLOCATIONS`` is set or the request sends
+    ``Prefer: respond-async``; the response then carries a job id to poll at
+    ``/jobs/{job_id}``.
+    """
+    command = with_idempotency_key(allocate, idempotency_key)
+    if runs_async(prefer):
+        job_id = jobs.enqueue(command)
+        return JSONResponse(
+            status_code=202,
+            content={"job_id": job_id},
+            headers={"Location": f"{config.API_V1_STR}/jobs/{job_id}"},
+        )
     try:
-        bus.handle(allocate)  # type: ignore
+        bus.handle(command)
     except (handlers.InvalidSku, handlers.InvalidRef) as e:
         raise HTTPException(status_code=400, detail=str(e)) from e
 
     return Response(status_code=202)
 
 
-@router.get("/allocations/{orderid}", status_code=200)
+@router.get("/jobs/{job_id}", status_code=200)
+def job_endpoint(
+    job_id: str,
+    jobs: job_queue.JobQueue = Depends(get_job_queue),  # noqa: B008
+) -> dict:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="not found")
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "error": job.error,
+        "result": job.result,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+@router.delete("/allocations/{orderid}", status_code=204)
+def deallocate_endpoint(
+    orderid: str,
+    _: None = Depends(admitted(commands.Deallocate)),  # noqa: B008
+    bus: messagebus.MessageBus = Depends(fast_api_bootstrap),  # noqa: B008
+    idempotency_key: str | None = Header(default=None),  # noqa: B008
+) -> Response:
+    allocated = views.allocations(orderid, bus.uow, consistent=True)
+    if not allocated:
+        raise HTTPException(status_code=404, detail="not found")
+    for sku in sorted({allocation.sku for allocation in allocated}):
+        key = idempotency_key and f"{idempotency_key}:{sku}"
+        bus.handle(
+            with_idempotency_key(commands.Deallocate(orderid=orderid, sku=sku), key)
+        )
+    return Response(status_code=204)
+
+
+def sse(event: str, data: bytes) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+@router.get("/allocation-changes")
+async def allocation_changes_endpoint(
+    request: Request,
+    orderid: str | None = None,
+    sku: str | None = None,
+    feed: change_feed.ChangeFeed = Depends(get_change_feed),  # noqa: B008
+    bus: messagebus.MessageBus = Depends(fast_api_bootstrap),  # noqa: B008
+) -> StreamingResponse:
+    """Streams allocation changes for an order or SKU as server-sent events.
+
+    A stream for an order opens with a ``snapshot`` of its allocations, read
+    after subscribing so no change in between is missed. Each client buffers
+    a bounded number of changes; if it falls behind, an ``overflow`` event
+    says how many were dropped and it should reload.
+    """
+    if orderid is None and sku is None:
+        raise HTTPException(status_code=400, detail="pass an orderid or a sku")
+    try:
+        subscription = feed.subscribe(orderid=orderid, sku=sku)
+    except change_feed.TooManySubscribers as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+
+    async def stream() -> AsyncIterator[bytes]:
+        try:
+            if orderid is not None:
+                current = await anyio.to_thread.run_sync(
+                    functools.partial(
+                        views.allocations, orderid, bus.uow, consistent=True
+                    )
+                )
+                yield sse(
+                    "snapshot",
+                    json_codec.encode_many(events.AllocationsViewed, current),
+                )
+            reported = 0
+            while not await request.is_disconnected():
+                changes = await subscription.next(timeout=KEEPALIVE_SECONDS)
+                if subscription.dropped > reported:
+                    yield sse("overflow", b"%d" % (subscription.dropped - reported))
+                    reported = subscription.dropped
+                if not changes:
+                    yield b": keepalive\n\n"
+                for change in changes:
+                    yield sse(type(change).__name__, json_codec.encode(change))
+        finally:
+            feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@router.get(
+    "/allocations/{orderid}",
+    status_code=200,
+    response_model=list[events.AllocationsViewed],
+)
 def allocations_view_endpoint(
     orderid: str,
+    consistent: bool = False,
     bus: messagebus.MessageBus = Depends(fast_api_bootstrap),  # noqa: B008
-) -> list[events.AllocationsViewed]:
-    result = views.allocations(orderid, bus.uow)
+) -> Response:
+    """Served from the read replica.
+
+    Pass ``consistent=true`` to read your own writes straight after allocating.
+    """
+    result = views.allocations(orderid, bus.uow, consistent=consistent)
     if not result:
         raise HTTPException(status_code=404, detail="not found")
-    return result
+    # already-validated read model rows; skip FastAPI's re-validation
+    return Response(
+        content=json_codec.encode_many(events.AllocationsViewed, result),
+        media_type="application/json",
+    )
+
+
+def stock_response(sku: str, levels: list[views.StockLevel], by: date) -> dict:
+    return {
+        "sku": sku,
+        "by": by,
+        "available": views.available_by(levels, by),
+        "levels": [
+            {
+                "eta": level.eta,
+                "purchased": level.purchased,
+                "allocated": level.allocated,
+                "available": level.available,
+            }
+            for level in levels
+        ],
+    }
+
+
+@router.get("/stock/{sku}", status_code=200)
+def stock_endpoint(
+    sku: str,
+    by: date | None = None,
+    bus: messagebus.MessageBus = Depends(fast_api_bootstrap),  # noqa: B008
+) -> dict:
+    """How much of a SKU can be allocated to ship today, or by ``by``.
+
+    Read from the stock-level read model, one row per ETA, without loading
+    the product.
+    """
+    levels = views.stock_levels([sku], bus.uow).get(sku)
+    if not levels:
+        raise HTTPException(status_code=404, detail="not found")
+    return stock_response(sku, levels, by or date.today())
+
+
+@router.post("/stock/query", status_code=200)
+def stock_query_endpoint(
+    query: StockQuery,
+    bus: messagebus.MessageBus = Depends(fast_api_bootstrap),  # noqa: B008
+) -> list[dict]:
+    """Stock of many SKUs in one read; unknown SKUs are left out."""
+    skus = list(dict.fromkeys(query.skus))
+    levels = views.stock_levels(skus, bus.uow)
+    by = query.by or date.today()
+    return [stock_response(sku, levels[sku], by) for sku in skus if sku in levels]
 
 
 app.include_router(router, prefix=config.API_V1_STR)
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+
+from src import bootstrap
+from src.service_layer import batch_import
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk import batches")
+    parser.add_argument("path", help="CSV or NDJSON file of batches, or - for stdin")
+    parser.add_argument(
+        "--format",
+        choices=[batch_import.CSV, batch_import.NDJSON],
+        help="defaults to ndjson for .ndjson/.jsonl files, csv otherwise",
+    )
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    fmt = args.format or batch_import.format_for(args.path)
+    # the bus's unit of work, with the event store and dedup store it records to
+    uow = bootstrap.bootstrap(start_orm=False).uow
+    with sys.stdin if args.path == "-" else open(args.path, newline="") as f:
+        report = batch_import.import_batches(
+            uow, fmt, (line.rstrip("\r\n") for line in f), args.chunk_size
+        )
+    for error in report.errors:
+        logger.warning("line %s rejected: %s", error.line, error.error)
+    print(
+        f"{report.rows} batches imported in {report.seconds:.2f}s"
+        f" ({report.rows_per_second:.0f} rows/s),"
+        f" {report.products_created} products created,"
+        f" {report.duplicates} duplicates skipped,"
+        f" {len(report.errors)} rows rejected"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
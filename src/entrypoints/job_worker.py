@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import argparse
+import logging
+from datetime import timedelta
+
+from src import bootstrap
+from src.adapters import job_queue, unit_of_work_strategy
+from src.service_layer import jobs
+
+logger = logging.getLogger(__name__)
+
+
+def queue_factory() -> job_queue.SqlAlchemyJobQueue:
+    return job_queue.SqlAlchemyJobQueue(unit_of_work_strategy.SqlAlchemyUnitOfWork())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run commands queued by the API")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument(
+        "--requeue-after",
+        type=int,
+        default=300,
+        metavar="SECONDS",
+        help="queue jobs again that have been running this long at startup",
+    )
+    args = parser.parse_args()
+
+    bootstrap.start_mappers()
+    requeued = queue_factory().requeue_stale(timedelta(seconds=args.requeue_after))
+    logger.info("requeued %s stale jobs", requeued)
+    workers = jobs.JobWorkers(
+        queue_factory,
+        lambda: bootstrap.bootstrap(start_orm=False),
+        workers=args.workers,
+        poll_interval=args.poll_interval,
+    )
+    workers.start()
+    try:
+        workers.join()
+    except KeyboardInterrupt:
+        workers.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import logging
+import sys
+import time
+from collections import Counter
+
+from src import bootstrap
+from src.adapters import unit_of_work_strategy
+from src.domain import model
+from src.service_layer import planning, unit_of_work
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Work out where forecast orders would be allocated, without "
+        "allocating them"
+    )
+    parser.add_argument(
+        "orders",
+        type=argparse.FileType(),
+        help="CSV of orderid,sku,qty in arrival order, or - for stdin",
+    )
+    parser.add_argument(
+        "--lines", action="store_true", help="print the batch of every order line"
+    )
+    args = parser.parse_args()
+
+    lines = [
+        model.OrderLine(orderid=orderid, sku=sku, qty=int(qty))
+        for orderid, sku, qty in csv.reader(args.orders)
+    ]
+    bootstrap.start_mappers()
+    uow = unit_of_work.UnitOfWork(unit_of_work_strategy.SqlAlchemyUnitOfWork())
+    stock = planning.load_stock(uow, {line.sku for line in lines})
+    start = time.perf_counter()
+    plan = planning.plan(stock, lines)
+    logger.info("planned %s lines in %.3fs", len(lines), time.perf_counter() - start)
+
+    writer = csv.writer(sys.stdout)
+    if args.lines:
+        for line, batchref, eta in zip(
+            plan.lines, plan.batchrefs, plan.etas, strict=True
+        ):
+            writer.writerow(
+                [line.orderid, line.sku, line.qty, batchref or "", eta or ""]
+            )
+        return
+    # each SKU that runs out: the line it runs out at, and how many miss out
+    missed = Counter(line.sku for line in plan.out_of_stock)
+    writer.writerow(["sku", "orderid", "position", "lines_out_of_stock"])
+    for sku, position in sorted(plan.first_out_of_stock.items()):
+        writer.writerow([sku, plan.lines[position].orderid, position, missed[sku]])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import argparse
+import logging
+
+from src import bootstrap
+from src.adapters import unit_of_work_strategy
+from src.service_layer import replay, unit_of_work
+
+logger = logging.getLogger(__name__)
+
+
+def uow_factory() -> unit_of_work.UnitOfWork:
+    return unit_of_work.UnitOfWork(unit_of_work_strategy.SqlAlchemyUnitOfWork())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Rebuild a projection by replaying the event store"
+    )
+    parser.add_argument("projection", choices=sorted(replay.PROJECTIONS))
+    parser.add_argument("--partitions", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue from the saved checkpoints instead of starting over",
+    )
+    parser.add_argument(
+        "--snapshot-all",
+        action="store_true",
+        help="snapshot every product first, e.g. when enabling the event store",
+    )
+    args = parser.parse_args()
+
+    bootstrap.start_mappers()
+    if args.snapshot_all:
+        replay.snapshot_all(uow_factory())
+    replay.rebuild(
+        replay.PROJECTIONS[args.projection],
+        uow_factory,
+        partitions=args.partitions,
+        batch_size=args.batch_size,
+        restart=not args.resume,
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
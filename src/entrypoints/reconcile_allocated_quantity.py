@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import argparse
+import logging
+
+from src.adapters import unit_of_work_strategy
+from src.config import config
+from src.service_layer import reconciliation, unit_of_work
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Verify and repair batches.allocated_quantity"
+    )
+    parser.add_argument("--dry-run", action="store_true", help="only report drift")
+    args = parser.parse_args()
+
+    strategy = (
+        unit_of_work_strategy.get_sharded_unit_of_work(config.SHARD_URIS)
+        if config.SHARD_URIS
+        else unit_of_work_strategy.SqlAlchemyUnitOfWork()
+    )
+    uow = unit_of_work.UnitOfWork(uow=strategy)
+    drift = reconciliation.reconcile_allocated_quantities(uow, repair=not args.dry_run)
+    logger.info("%s batches with allocated_quantity drift", len(drift))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
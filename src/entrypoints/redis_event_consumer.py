@@ -1,32 +1,77 @@
 from __future__ import annotations
 
 import logging
+import threading
+import time
+from concurrent.futures import Future
 
-import redis
-
-from src import bootstrap
+from src import bootstrap, views
+from src.adapters import codecs, redis_event_publisher
 from src.config import config
 from src.domain import commands
-from src.service_layer import messagebus
+from src.service_layer import executor, messagebus
 
 logger = logging.getLogger(__name__)
 
-r = redis.Redis(**config.get_redis_host_and_port())  # type: ignore
+codec = codecs.Codec(fmt=config.REDIS_CODEC)
 
 
 def main() -> None:
     logger.info("Redis pubsub starting")
     bus = bootstrap.bootstrap()
-    pubsub = r.pubsub(ignore_subscribe_messages=True)
+    pubsub = redis_event_publisher.get_client().pubsub(ignore_subscribe_messages=True)
     pubsub.subscribe("change_batch_quantity")
 
+    if config.COMMAND_LANES <= 1:
+        for m in pubsub.listen():
+            handle_change_batch_quantity(m, bus)
+        return
+
+    lanes = executor.ShardedCommandExecutor(
+        bus_factory=lambda: bootstrap.bootstrap(start_orm=False),
+        lanes=config.COMMAND_LANES,
+        # a batch created moments ago may not have reached the replica yet
+        resolve_sku=lambda ref: views.sku_for_batchref(ref, bus.uow, consistent=True),
+        # a full lane blocks submit, so we stop reading and Redis buffers instead
+        queue_size=config.COMMAND_LANE_QUEUE,
+    )
+    threading.Thread(
+        target=report_lane_stats,
+        args=(lanes, config.COMMAND_LANE_STATS_EVERY),
+        name="command-lane-stats",
+        daemon=True,
+    ).start()
     for m in pubsub.listen():
-        handle_change_batch_quantity(m, bus)
+        logging.debug("handling %s", m)
+        cmd = codec.decode(commands.ChangeBatchQuantity, m["data"])
+        lanes.submit(cmd).add_done_callback(
+            lambda future, cmd=cmd: log_failure(cmd, future)
+        )
+
+
+def log_failure(cmd: commands.Command, future: Future) -> None:
+    if future.cancelled() or future.exception() is None:
+        return
+    logger.error("command lane failed to handle %s", cmd, exc_info=future.exception())
+
+
+def report_lane_stats(lanes: executor.ShardedCommandExecutor, every: float) -> None:
+    while True:
+        time.sleep(every)
+        for stats in lanes.stats():
+            logger.info(
+                "command lane %d: %d queued (max %d), %d processed, %d failed",
+                stats.lane,
+                stats.queue_depth,
+                stats.max_queue_depth,
+                stats.processed,
+                stats.failed,
+            )
 
 
 def handle_change_batch_quantity(m: dict[str, str], bus: messagebus.MessageBus) -> None:
     logging.debug("handling %s", m)
-    cmd = commands.ChangeBatchQuantity.model_validate_json(m["data"])
+    cmd = codec.decode(commands.ChangeBatchQuantity, m["data"])
     bus.handle(cmd)
 
 
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import argparse
+import logging
+
+from src import bootstrap
+from src.adapters import dead_letters, unit_of_work_strategy
+from src.service_layer import retries
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="List or replay event handlers that failed every retry"
+    )
+    parser.add_argument("--handler", help="only dead letters of this handler")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument(
+        "--list", action="store_true", help="print the dead letters, do not replay"
+    )
+    args = parser.parse_args()
+
+    store = dead_letters.SqlAlchemyDeadLetterStore(
+        unit_of_work_strategy.SqlAlchemyUnitOfWork()
+    )
+    if args.list:
+        for letter in store.list(handler=args.handler, limit=args.limit):
+            print(
+                f"{letter.id}\t{letter.failed_at:%Y-%m-%d %H:%M:%S}\t{letter.handler}"
+                f"\t{letter.attempts}\t{letter.event}\t{letter.error}"
+            )
+        return
+    bus = bootstrap.bootstrap()
+    retries.replay_dead_letters(bus, store, handler=args.handler, limit=args.limit)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+
+from src.domain import commands
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 1
+
+
+@dataclass(frozen=True)
+class CommandClass:
+    """Scheduling class for a command type.
+
+    Lower priorities are admitted first; ``share`` caps the fraction of the
+    capacity commands of the class may hold at once.
+    """
+
+    priority: int
+    share: float = 1.0
+
+
+CLASSES: dict[type[commands.Command], CommandClass] = {
+    commands.Allocate: CommandClass(INTERACTIVE),
+    commands.Deallocate: CommandClass(INTERACTIVE),
+    commands.CreateBatch: CommandClass(BULK, share=0.5),
+    commands.ChangeBatchQuantity: CommandClass(BULK, share=0.5),
+    commands.ArchiveBatches: CommandClass(BULK, share=0.25),
+}
+DEFAULT_CLASS = CommandClass(BULK, share=0.5)
+
+
+class Rejected(Exception):
+    """The command was shed; the client should retry after ``retry_after``."""
+
+    def __init__(self, message: str, status_code: int, retry_after: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    command_type: type[commands.Command] = field(compare=False)
+    granted: bool = field(default=False, compare=False)
+    evicted: bool = field(default=False, compare=False)
+    # wakes a waiter on an event loop, which the condition cannot reach
+    wake: Callable[[], None] | None = field(default=None, compare=False)
+
+
+class AdmissionController:
+    """Bounds how many commands run at once, queueing and shedding the excess.
+
+    Up to ``capacity`` commands run concurrently, each class within its
+    share. Others wait, best priority first, for at most ``timeout`` seconds
+    (503 after that). At most ``max_queue`` may wait; when full, a command
+    displaces the lowest-priority waiter if it outranks it, and is
+    otherwise turned away (429). A capacity of 0 admits everything.
+
+    ``admit`` waits on the calling thread; ``admit_async`` waits on the event
+    loop, so a request can queue for a slot without holding a worker thread.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        max_queue: int = 100,
+        timeout: float = 2.0,
+        classes: dict[type[commands.Command], CommandClass] | None = None,
+    ) -> None:
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.classes = CLASSES if classes is None else classes
+        self.rejected = 0
+        self._running: Counter[type[commands.Command]] = Counter()
+        self._waiting: list[_Waiter] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        # moving average of how long admitted commands hold their slot
+        self._service_time = 0.05
+
+    @property
+    def running(self) -> int:
+        return sum(self._running.values())
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    @contextmanager
+    def admit(self, command_type: type[commands.Command]) -> Iterator[None]:
+        if self.capacity <= 0:
+            yield
+            return
+        self._acquire(command_type)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(command_type, time.monotonic() - start)
+
+    @asynccontextmanager
+    async def admit_async(
+        self, command_type: type[commands.Command]
+    ) -> AsyncIterator[None]:
+        if self.capacity <= 0:
+            yield
+            return
+        await self._acquire_async(command_type)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(command_type, time.monotonic() - start)
+
+    def _class(self, command_type: type[commands.Command]) -> CommandClass:
+        return self.classes.get(command_type, DEFAULT_CLASS)
+
+    def _limit(self, command_type: type[commands.Command]) -> int:
+        return max(1, math.ceil(self.capacity * self._class(command_type).share))
+
+    def _has_room(self, command_type: type[commands.Command]) -> bool:
+        return self.running < self.capacity and self._running[
+            command_type
+        ] < self._limit(command_type)
+
+    def _acquire(self, command_type: type[commands.Command]) -> None:
+        with self._condition:
+            waiter = self._enqueue(command_type)
+            if waiter is None:
+                return
+            deadline = time.monotonic() + self.timeout
+            while not (waiter.granted or waiter.evicted):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._time_out(waiter)
+                self._condition.wait(remaining)
+            self._settle(waiter)
+
+    async def _acquire_async(self, command_type: type[commands.Command]) -> None:
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        with self._condition:
+            waiter = self._enqueue(
+                command_type, wake=lambda: loop.call_soon_threadsafe(woken.set)
+            )
+            if waiter is None:
+                return
+        try:
+            await asyncio.wait_for(woken.wait(), self.timeout)
+        except TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # the client went away while waiting: give back what it was given
+            with self._condition:
+                granted = waiter.granted
+                if not (granted or waiter.evicted):
+                    self._forget(waiter)
+            if granted:
+                # it never ran, so leave the service time average as it is
+                self._release(command_type, self._service_time)
+            raise
+        with self._condition:
+            if not (waiter.granted or waiter.evicted):
+                self._time_out(waiter)
+            self._settle(waiter)
+
+    def _enqueue(
+        self,
+        command_type: type[commands.Command],
+        wake: Callable[[], None] | None = None,
+    ) -> _Waiter | None:
+        """Takes a slot if there is room, else queues a waiter for one."""
+        # waiters are granted as soon as there is room for them, so any still
+        # waiting are blocked and a command with room can go ahead
+        if self._has_room(command_type):
+            self._running[command_type] += 1
+            return None
+        priority = self._class(command_type).priority
+        if len(self._waiting) >= self.max_queue:
+            self._make_room(priority)
+        waiter = _Waiter(priority, next(self._sequence), command_type, wake=wake)
+        heapq.heappush(self._waiting, waiter)
+        return waiter
+
+    def _time_out(self, waiter: _Waiter) -> None:
+        self._forget(waiter)
+        self._reject(f"timed out waiting to run {waiter.command_type.__name__}", 503)
+
+    def _settle(self, waiter: _Waiter) -> None:
+        if waiter.evicted:
+            self._reject(
+                f"{waiter.command_type.__name__} shed for higher priority work", 429
+            )
+
+    def _forget(self, waiter: _Waiter) -> None:
+        self._waiting.remove(waiter)
+        heapq.heapify(self._waiting)
+
+    def _make_room(self, priority: int) -> None:
+        lowest = max(self._waiting)
+        if lowest.priority <= priority:
+            self._reject("too many commands waiting", 429)
+        self._forget(lowest)
+        lowest.evicted = True
+        self._wake([lowest])
+
+    def _grant(self) -> None:
+        granted = []
+        for waiter in sorted(self._waiting):
+            if self.running >= self.capacity:
+                break
+            if self._has_room(waiter.command_type):
+                self._running[waiter.command_type] += 1
+                waiter.granted = True
+                granted.append(waiter)
+        if granted:
+            self._waiting = [w for w in self._waiting if not w.granted]
+            heapq.heapify(self._waiting)
+            self._wake(granted)
+
+    def _wake(self, waiters: list[_Waiter]) -> None:
+        self._condition.notify_all()
+        for waiter in waiters:
+            if waiter.wake is not None:
+                waiter.wake()
+
+    def _release(self, command_type: type[commands.Command], held: float) -> None:
+        with self._condition:
+            self._running[command_type] -= 1
+            self._service_time += 0.1 * (held - self._service_time)
+            self._grant()
+
+    def _reject(self, message: str, status_code: int) -> None:
+        # roughly how long until the current backlog has drained
+        backlog = (len(self._waiting) + 1) / self.capacity
+        retry_after = max(1, math.ceil(backlog * self._service_time))
+        self.rejected += 1
+        logger.warning("%s (retry after %ss)", message, retry_after)
+        raise Rejected(message, status_code, retry_after)
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import logging
+from datetime import UTC, date, datetime
+from typing import TYPE_CHECKING
+
+from sqlalchemy import delete, insert, literal, select, update
+
+from src.adapters import orm
+
+if TYPE_CHECKING:
+    from . import unit_of_work
+
+logger = logging.getLogger(__name__)
+
+batches = orm.batches
+allocations = orm.allocations
+order_lines = orm.order_lines
+
+
+def _archivable(before: date):
+    # nothing left to allocate and already delivered
+    return (batches.c.allocated_quantity >= batches.c.purchased_quantity) & (
+        batches.c.eta < before
+    )
+
+
+def archivable_skus(uow: unit_of_work.UnitOfWork, before: date) -> list[str]:
+    with uow:
+        return list(
+            uow.query(
+                select(batches.c.sku).where(_archivable(before)).distinct(),
+                consistent=True,
+            ).scalars()
+        )
+
+
+def archive_batches(uow: unit_of_work.UnitOfWork, sku: str, before: date) -> list[str]:
+    """Moves the SKU's exhausted, delivered batches into the archive tables.
+
+    Their allocations and order lines move with them, and the product's version
+    is bumped so cached copies and concurrent writers see the change. Runs in
+    the caller's transaction, every statement on the SKU's database; returns
+    the archived batch references.
+    """
+    archived = uow.execute(
+        select(batches.c.id, batches.c.reference).where(
+            (batches.c.sku == sku) & _archivable(before)
+        ),
+        sku=sku,
+    ).all()
+    if not archived:
+        return []
+    batch_ids = [r.id for r in archived]
+    line_ids = select(allocations.c.orderline_id).where(
+        allocations.c.batch_id.in_(batch_ids)
+    )
+
+    uow.execute(
+        insert(orm.order_lines_archive).from_select(
+            ["id", "sku", "qty", "orderid"],
+            select(
+                order_lines.c.id,
+                order_lines.c.sku,
+                order_lines.c.qty,
+                order_lines.c.orderid,
+            ).where(order_lines.c.id.in_(line_ids)),
+        ),
+        sku=sku,
+    )
+    uow.execute(
+        insert(orm.allocations_archive).from_select(
+            ["id", "orderline_id", "batch_id"],
+            select(
+                allocations.c.id, allocations.c.orderline_id, allocations.c.batch_id
+            ).where(allocations.c.batch_id.in_(batch_ids)),
+        ),
+        sku=sku,
+    )
+    uow.execute(
+        insert(orm.batches_archive).from_select(
+            [
+                "id",
+                "reference",
+                "sku",
+                "purchased_quantity",
+                "eta",
+                "allocated_quantity",
+                "archived_at",
+            ],
+            select(
+                batches.c.id,
+                batches.c.reference,
+                batches.c.sku,
+                batches.c.purchased_quantity,
+                batches.c.eta,
+                batches.c.allocated_quantity,
+                literal(datetime.now(UTC), orm.batches_archive.c.archived_at.type),
+            ).where(batches.c.id.in_(batch_ids)),
+        ),
+        sku=sku,
+    )
+    archived_line_ids = list(uow.execute(line_ids, sku=sku).scalars())
+    uow.execute(
+        delete(allocations).where(allocations.c.batch_id.in_(batch_ids)), sku=sku
+    )
+    uow.execute(
+        delete(order_lines).where(order_lines.c.id.in_(archived_line_ids)), sku=sku
+    )
+    uow.execute(delete(batches).where(batches.c.id.in_(batch_ids)), sku=sku)
+    uow.execute(
+        update(orm.products)
+        .where(orm.products.c.sku == sku)
+        .values(version_number=orm.products.c.version_number + 1),
+        sku=sku,
+    )
+    refs = [r.reference for r in archived]
+    logger.info("archived %s batches of %s: %s", len(refs), sku, refs)
+    return refs
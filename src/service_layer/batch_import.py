@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import codecs
+import csv
+import logging
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from pydantic import ValidationError
+from sqlalchemy import select, text
+
+from src.adapters import orm
+from src.domain import commands, events
+
+from . import stock_levels
+
+if TYPE_CHECKING:
+    from . import unit_of_work
+
+logger = logging.getLogger(__name__)
+
+CSV = "csv"
+NDJSON = "ndjson"
+
+# one row per SKU, so a sharded unit of work can send each to its shard
+_bump_version = text(
+    "UPDATE products SET version_number = version_number + 1 WHERE sku = :sku"
+)
+
+
+@dataclass(frozen=True)
+class RowError:
+    line: int
+    error: str
+
+
+@dataclass
+class ImportReport:
+    rows: int = 0
+    products_created: int = 0
+    duplicates: int = 0
+    errors: list[RowError] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def format_for(content_type: str) -> str:
+    return NDJSON if "ndjson" in content_type or "jsonl" in content_type else CSV
+
+
+def decode_lines(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[str]:
+    """Splits a stream of byte chunks into text lines without buffering it all."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        yield from (line.removesuffix("\r") for line in lines)
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.removesuffix("\r")
+
+
+def parse(
+    fmt: str, lines: Iterable[str], report: ImportReport
+) -> Iterator[commands.CreateBatch]:
+    """Validates rows one at a time; invalid rows are recorded and skipped."""
+    if fmt == CSV:
+        rows = csv.DictReader(lines)
+        for row in rows:
+            try:
+                yield commands.CreateBatch.model_validate(
+                    {**row, "eta": row.get("eta") or None}
+                )
+            except ValidationError as e:
+                report.errors.append(RowError(line=rows.line_num, error=str(e)))
+        return
+    for line_num, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield commands.CreateBatch.model_validate_json(line)
+        except ValidationError as e:
+            report.errors.append(RowError(line=line_num, error=str(e)))
+
+
+def import_batches(
+    uow: unit_of_work.UnitOfWork,
+    fmt: str,
+    lines: Iterable[str],
+    chunk_size: int = 1000,
+) -> ImportReport:
+    """Streams CreateBatch rows into the database, one transaction per chunk.
+
+    Rows skip the message bus, so each chunk records their ``BatchCreated``
+    events and idempotency keys itself, in the transaction that writes them.
+    """
+    report = ImportReport()
+    start = time.perf_counter()
+    chunk: list[commands.CreateBatch] = []
+    for cmd in parse(fmt, lines, report):
+        chunk.append(cmd)
+        if len(chunk) >= chunk_size:
+            _write_chunk(uow, chunk, report)
+            chunk = []
+    _write_chunk(uow, chunk, report)
+    report.seconds = time.perf_counter() - start
+    logger.info(
+        "imported %s batches (%s products created, %s duplicates skipped,"
+        " %s rows rejected) at %.0f rows/s",
+        report.rows,
+        report.products_created,
+        report.duplicates,
+        len(report.errors),
+        report.rows_per_second,
+    )
+    return report
+
+
+def _write_chunk(
+    uow: unit_of_work.UnitOfWork,
+    chunk: list[commands.CreateBatch],
+    report: ImportReport,
+) -> None:
+    if not chunk:
+        return
+    with uow:
+        rows = _unprocessed(uow, chunk)
+        report.duplicates += len(chunk) - len(rows)
+        if not rows:
+            return
+        chunk = rows
+        skus = {cmd.sku for cmd in chunk}
+        existing = set(
+            uow.query(
+                select(orm.products.c.sku).where(orm.products.c.sku.in_(skus)),
+                consistent=True,
+            ).scalars()
+        )
+        uow.insert_rows(
+            orm.products,
+            [{"sku": sku, "version_number": 0} for sku in sorted(skus - existing)],
+        )
+        uow.insert_rows(
+            orm.batches,
+            [
+                {
+                    "reference": cmd.ref,
+                    "sku": cmd.sku,
+                    "purchased_quantity": cmd.qty,
+                    "eta": cmd.eta,
+                    "allocated_quantity": 0,
+                }
+                for cmd in chunk
+            ],
+        )
+        # new batches change the aggregate, as add_batch does
+        uow.execute(_bump_version, [{"sku": sku} for sku in sorted(skus)])
+        # bulk writes raise no events, so the stock levels are recomputed here
+        stock_levels.rebuild(uow, skus)
+        if uow.event_store is not None:
+            uow.event_store.append(
+                uow,
+                [
+                    events.BatchCreated(
+                        sku=cmd.sku, batchref=cmd.ref, qty=cmd.qty, eta=cmd.eta
+                    )
+                    for cmd in chunk
+                ],
+            )
+        if uow.dedup_store is not None:
+            for cmd in chunk:
+                if cmd.idempotency_key is not None:
+                    uow.dedup_store.record(uow, cmd.idempotency_key, "CreateBatch")
+        uow.commit()
+    report.rows += len(chunk)
+    report.products_created += len(skus - existing)
+
+
+def _unprocessed(
+    uow: unit_of_work.UnitOfWork, chunk: list[commands.CreateBatch]
+) -> list[commands.CreateBatch]:
+    """The chunk without rows whose idempotency key was already processed."""
+    if uow.dedup_store is None:
+        return chunk
+    keys: set[str] = set()
+    rows = []
+    for cmd in chunk:
+        key = cmd.idempotency_key
+        if key is not None:
+            if key in keys or uow.dedup_store.seen(uow, key):
+                continue
+            keys.add(key)
+        rows.append(cmd)
+    return rows
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import zlib
+from collections.abc import Callable
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from src.domain import commands
+
+from . import handlers
+
+if TYPE_CHECKING:
+    from . import messagebus
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+@dataclass(frozen=True)
+class LaneStats:
+    lane: int
+    queue_depth: int
+    max_queue_depth: int
+    processed: int
+    failed: int
+
+
+class _Lane:
+    def __init__(
+        self,
+        index: int,
+        bus_factory: Callable[[], messagebus.MessageBus],
+        queue_size: int,
+    ):
+        self.index = index
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.max_queue_depth = 0
+        self.processed = 0
+        self.failed = 0
+        self._bus_factory = bus_factory
+        self.thread = threading.Thread(
+            target=self._run, name=f"command-lane-{index}", daemon=True
+        )
+
+    def put(self, item: object) -> None:
+        self.queue.put(item)
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    def _run(self) -> None:
+        try:
+            bus = self._bus_factory()
+        except Exception as e:
+            logger.exception("command lane %d could not start", self.index)
+            self._fail_all(e)
+            return
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            command, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                bus.handle(command)
+            except Exception as e:
+                self.failed += 1
+                future.set_exception(e)
+            else:
+                self.processed += 1
+                future.set_result(None)
+
+    def _fail_all(self, error: Exception) -> None:
+        # keep draining so queued and later submissions fail instead of hanging
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            _, future = item
+            if future.set_running_or_notify_cancel():
+                self.failed += 1
+                future.set_exception(error)
+
+
+class ShardedCommandExecutor:
+    """Runs commands on N single-threaded lanes keyed by SKU.
+
+    Commands for the same SKU always land on the same lane, so they execute in
+    submission order and never contend for the same Product, while commands for
+    different SKUs run concurrently. Each lane owns its own message bus (and so
+    its own unit of work), built by ``bus_factory`` on the lane's thread; if
+    that fails, every command routed to the lane fails with the same error.
+
+    A ``ChangeBatchQuantity`` goes to the lane of its batch's SKU, learnt from
+    the ``CreateBatch`` submitted here or else looked up with ``resolve_sku``.
+    One for a batch that cannot be found is rejected, since routing it anywhere
+    else could let it overtake the ``CreateBatch`` it depends on.
+
+    Each lane queues at most ``queue_size`` commands (0 for no limit); once a
+    lane is full, ``submit`` blocks until it has room, holding back the caller.
+    """
+
+    def __init__(
+        self,
+        bus_factory: Callable[[], messagebus.MessageBus],
+        lanes: int,
+        resolve_sku: Callable[[str], str | None],
+        queue_size: int = 0,
+    ) -> None:
+        self._lanes = [_Lane(i, bus_factory, queue_size) for i in range(lanes)]
+        self._resolve_sku = resolve_sku
+        self._skus_by_batchref: dict[str, str] = {}
+        for lane in self._lanes:
+            lane.thread.start()
+
+    def submit(self, command: commands.Command) -> Future:
+        future: Future = Future()
+        try:
+            lane = self.lane_for(command)
+        except handlers.InvalidRef as e:
+            future.set_exception(e)
+            return future
+        if isinstance(command, commands.CreateBatch):
+            self._skus_by_batchref[command.ref] = command.sku
+        self._lanes[lane].put((command, future))
+        return future
+
+    def lane_for(self, command: commands.Command) -> int:
+        key = self.shard_key(command)
+        return zlib.crc32(key.encode()) % len(self._lanes)
+
+    def shard_key(self, command: commands.Command) -> str:
+        if isinstance(command, commands.ChangeBatchQuantity):
+            sku = self.sku_for_batchref(command.ref)
+            if sku is None:
+                raise handlers.InvalidRef(f"Invalid ref {command.ref}")
+            return sku
+        return command.sku  # type: ignore[attr-defined]
+
+    def sku_for_batchref(self, batchref: str) -> str | None:
+        sku = self._skus_by_batchref.get(batchref)
+        if sku is None:
+            sku = self._resolve_sku(batchref)
+            if sku is not None:
+                self._skus_by_batchref[batchref] = sku
+        return sku
+
+    def stats(self) -> list[LaneStats]:
+        return [
+            LaneStats(
+                lane=lane.index,
+                queue_depth=lane.queue.qsize(),
+                max_queue_depth=lane.max_queue_depth,
+                processed=lane.processed,
+                failed=lane.failed,
+            )
+            for lane in self._lanes
+        ]
+
+    def shutdown(self, wait: bool = True) -> None:
+        for lane in self._lanes:
+            lane.put(_STOP)
+        if wait:
+            for lane in self._lanes:
+                lane.thread.join()
@@ -8,8 +8,12 @@ from sqlalchemy import text
 from src.domain import commands, events, model
 from src.domain.model import OrderLine
 
+from . import archival, stock_levels
+from .retries import RetryPolicy
+
 if TYPE_CHECKING:
-    from src.adapters import notifications
+    from src.adapters import notifications, row_lock_allocator, sku_locks
+    from src.domain import deallocation
 
     from . import unit_of_work
 
@@ -22,6 +26,26 @@ class InvalidRef(Exception):
     pass
 
 
+def independent(handler: Callable) -> Callable:
+    """Marks an event handler as not depending on the event's other handlers.
+
+    When the bus has an executor, independent handlers of an event run
+    concurrently, each with a unit of work of its own.
+    """
+    handler.independent = True  # type: ignore[attr-defined]
+    return handler
+
+
+def retrying(policy: RetryPolicy) -> Callable[[Callable], Callable]:
+    """Sets how an event handler is retried when the bus has a retry scheduler."""
+
+    def mark(handler: Callable) -> Callable:
+        handler.retry_policy = policy  # type: ignore[attr-defined]
+        return handler
+
+    return mark
+
+
 def add_batch(
     cmd: commands.CreateBatch,
     uow: unit_of_work.UnitOfWork,
@@ -36,15 +60,21 @@ def add_batch(
                 reference=cmd.ref, sku=cmd.sku, purchased_quantity=cmd.qty, eta=cmd.eta
             )
         )
+        product.version_number += 1
+        uow.messages.append(
+            events.BatchCreated(sku=cmd.sku, batchref=cmd.ref, qty=cmd.qty, eta=cmd.eta)
+        )
         uow.commit()
 
 
 def allocate(
     cmd: commands.Allocate,
     uow: unit_of_work.UnitOfWork,
+    sku_lock: sku_locks.SkuLock,
 ) -> events.AllocatedBatchRef | None:
     line = OrderLine(orderid=cmd.orderid, sku=cmd.sku, qty=cmd.qty)
-    with uow:
+    # locked before the transaction starts, so it sees the last holder's writes
+    with sku_lock.hold(line.sku), uow:
         product = uow.products.get(sku=line.sku)
         if product is None:
             raise InvalidSku(f"Invalid sku {line.sku}")
@@ -53,6 +83,42 @@ def allocate(
         return batchref
 
 
+def deallocate(
+    cmd: commands.Deallocate,
+    uow: unit_of_work.UnitOfWork,
+) -> None:
+    with uow:
+        product = uow.products.get(sku=cmd.sku)
+        if product is None:
+            raise InvalidSku(f"Invalid sku {cmd.sku}")
+        allocated = uow.products.allocations(cmd.sku, cmd.orderid)
+        product.deallocate(cmd.orderid, allocated)
+        uow.commit()
+
+
+def allocate_with_row_locks(
+    cmd: commands.Allocate,
+    uow: unit_of_work.UnitOfWork,
+    allocator: row_lock_allocator.RowLockAllocator,
+) -> events.AllocatedBatchRef | None:
+    line = OrderLine(orderid=cmd.orderid, sku=cmd.sku, qty=cmd.qty)
+    with uow:
+        if not allocator.product_exists(uow, line.sku):
+            raise InvalidSku(f"Invalid sku {line.sku}")
+        batchref = allocator.allocate(uow, line)
+        if batchref is None:
+            uow.messages.append(events.OutOfStock(sku=line.sku))
+            uow.commit()
+            return None
+        uow.messages.append(
+            events.Allocated(
+                orderid=line.orderid, sku=line.sku, qty=line.qty, batchref=batchref
+            )
+        )
+        uow.commit()
+        return events.AllocatedBatchRef(batchref=batchref)
+
+
 def reallocate(
     event: events.Deallocated,
     uow: unit_of_work.UnitOfWork,
@@ -61,22 +127,70 @@ def reallocate(
         product = uow.products.get(sku=event.sku)
         if not product:
             raise InvalidSku(f"Invalid sku {event.sku}")
-        product.messages.append(commands.Allocate(**event.model_dump()))
-        uow.commit()
+        product.messages.append(
+            commands.Allocate.model_construct(
+                orderid=event.orderid, sku=event.sku, qty=event.qty
+            )
+        )
 
 
 def change_batch_quantity(
     cmd: commands.ChangeBatchQuantity,
     uow: unit_of_work.UnitOfWork,
+    deallocation_policy: deallocation.DeallocationPolicy,
+    sku_lock: sku_locks.SkuLock,
 ) -> None:
-    with uow:
+    with sku_lock.hold_batch(cmd.ref), uow:
+        product = uow.products.get_by_batchref(batchref=cmd.ref)
+        if product is None:
+            raise InvalidRef(f"Invalid sku {cmd.ref}")
+        product.change_batch_quantity(
+            ref=cmd.ref, qty=cmd.qty, policy=deallocation_policy
+        )
+        uow.messages.append(
+            events.BatchQuantityChanged(sku=product.sku, batchref=cmd.ref, qty=cmd.qty)
+        )
+        uow.commit()
+
+
+def change_batch_quantity_and_reallocate(
+    cmd: commands.ChangeBatchQuantity,
+    uow: unit_of_work.UnitOfWork,
+    deallocation_policy: deallocation.DeallocationPolicy,
+    sku_lock: sku_locks.SkuLock,
+) -> None:
+    """Reallocates every line evicted by the change in the same transaction.
+
+    Emits the same events as ``change_batch_quantity`` followed by one
+    ``reallocate`` per ``Deallocated`` event, with a single product load and
+    commit, so it replaces ``reallocate`` as a ``Deallocated`` handler.
+    """
+    with sku_lock.hold_batch(cmd.ref), uow:
         product = uow.products.get_by_batchref(batchref=cmd.ref)
         if product is None:
             raise InvalidRef(f"Invalid sku {cmd.ref}")
-        product.change_batch_quantity(ref=cmd.ref, qty=cmd.qty)
+        lines = product.change_batch_quantity(
+            ref=cmd.ref, qty=cmd.qty, policy=deallocation_policy
+        )
+        product.reallocate(lines)
+        uow.messages.append(
+            events.BatchQuantityChanged(sku=product.sku, batchref=cmd.ref, qty=cmd.qty)
+        )
         uow.commit()
 
 
+def archive_batches(
+    cmd: commands.ArchiveBatches,
+    uow: unit_of_work.UnitOfWork,
+) -> None:
+    with uow:
+        if archival.archive_batches(uow, sku=cmd.sku, before=cmd.before):
+            stock_levels.rebuild(uow, [cmd.sku])
+        uow.commit()
+
+
+@independent
+@retrying(RetryPolicy(attempts=3, base_delay=5.0))
 def send_out_of_stock_notification(
     event: events.OutOfStock,
     notifications: notifications.NotificationsProtocol,
@@ -87,6 +201,8 @@ def send_out_of_stock_notification(
     )
 
 
+@independent
+@retrying(RetryPolicy())
 def publish_allocated_event(
     event: events.Allocated,
     publish: Callable,
@@ -94,6 +210,26 @@ def publish_allocated_event(
     publish("line_allocated", event)
 
 
+@independent
+@retrying(RetryPolicy())
+def publish_deallocated_event(
+    event: events.Deallocated,
+    publish: Callable,
+) -> None:
+    publish("line_deallocated", event)
+
+
+@independent
+@retrying(RetryPolicy())
+def publish_allocation_cancelled_event(
+    event: events.AllocationCancelled,
+    publish: Callable,
+) -> None:
+    publish("allocation_cancelled", event)
+
+
+@independent
+@retrying(RetryPolicy())
 def add_allocation_to_read_model(
     event: events.Allocated,
     uow: unit_of_work.UnitOfWork,
@@ -111,8 +247,10 @@ def add_allocation_to_read_model(
         uow.commit()
 
 
+@independent
+@retrying(RetryPolicy())
 def remove_allocation_from_read_model(
-    event: events.Deallocated,
+    event: events.Deallocated | events.AllocationCancelled,
     uow: unit_of_work.UnitOfWork,
 ) -> None:
     with uow:
@@ -128,19 +266,50 @@ def remove_allocation_from_read_model(
         uow.commit()
 
 
+@independent
+@retrying(RetryPolicy())
+def update_stock_level(
+    event: events.Allocated
+    | events.AllocationCancelled
+    | events.BatchCreated
+    | events.BatchQuantityChanged,
+    uow: unit_of_work.UnitOfWork,
+) -> None:
+    # lines evicted by a quantity change are covered by BatchQuantityChanged,
+    # raised in the same transaction, so Deallocated needs no refresh
+    with uow:
+        stock_levels.refresh(uow, event.sku, event.batchref)
+        uow.commit()
+
+
 EVENT_HANDLERS: dict[type[events.Event], list[Callable]] = {
     events.Allocated: [
         publish_allocated_event,
         add_allocation_to_read_model,
+        update_stock_level,
     ],
     events.Deallocated: [
+        publish_deallocated_event,
         remove_allocation_from_read_model,
         reallocate,
     ],
+    events.AllocationCancelled: [
+        publish_allocation_cancelled_event,
+        remove_allocation_from_read_model,
+        update_stock_level,
+    ],
+    events.BatchCreated: [update_stock_level],
+    events.BatchQuantityChanged: [update_stock_level],
     events.OutOfStock: [send_out_of_stock_notification],
 }
+ALLOCATION_STRATEGIES: dict[str, Callable] = {
+    "aggregate": allocate,
+    "row_lock": allocate_with_row_locks,
+}
 COMMAND_HANDLERS: dict[type[commands.Command], Callable] = {
     commands.Allocate: allocate,
+    commands.Deallocate: deallocate,
     commands.CreateBatch: add_batch,
     commands.ChangeBatchQuantity: change_batch_quantity,
+    commands.ArchiveBatches: archive_batches,
 }
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import logging
+import threading
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
+from src import views
+from src.adapters import idempotency
+from src.domain import commands, events
+
+if TYPE_CHECKING:
+    from src.adapters import job_queue
+
+    from . import messagebus
+
+logger = logging.getLogger(__name__)
+
+
+def run_next(queue: job_queue.JobQueue, bus: messagebus.MessageBus) -> bool:
+    """Claims and runs the oldest queued job; returns False if there was none."""
+    job = queue.claim()
+    if job is None:
+        return False
+    try:
+        result = bus.handle(job.command)
+    except idempotency.DuplicateCommand:
+        # a retried request whose original already ran: report that outcome
+        queue.complete(job.id, outcome(bus, job.command, None))
+    except Exception as e:
+        logger.warning("job %s failed: %r", job.id, e)
+        queue.fail(job.id, str(e))
+    else:
+        queue.complete(job.id, outcome(bus, job.command, result))
+    return True
+
+
+def outcome(
+    bus: messagebus.MessageBus, command: commands.Command, result: Any
+) -> dict | None:
+    """What clients polling a job are told its command did."""
+    if not isinstance(command, commands.Allocate):
+        return None
+    if isinstance(result, events.AllocatedBatchRef):
+        batchref: str | None = result.batchref
+    else:
+        # a duplicate of an allocation already made returns nothing either
+        batchref = next(
+            (
+                allocation.batchref
+                for allocation in views.allocations(
+                    command.orderid, bus.uow, consistent=True
+                )
+                if allocation.sku == command.sku
+            ),
+            None,
+        )
+    return {"batchref": batchref, "out_of_stock": batchref is None}
+
+
+class JobWorkers:
+    """Threads draining the job queue, each with its own queue and message bus.
+
+    Both are built by the factories on the worker's thread, as neither is safe
+    to share. Idle workers poll every ``poll_interval`` seconds.
+    """
+
+    def __init__(
+        self,
+        queue_factory: Callable[[], job_queue.JobQueue],
+        bus_factory: Callable[[], messagebus.MessageBus],
+        workers: int = 4,
+        poll_interval: float = 0.2,
+    ) -> None:
+        self.poll_interval = poll_interval
+        self._queue_factory = queue_factory
+        self._bus_factory = bus_factory
+        self._stopping = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self) -> None:
+        for thread in self._threads:
+            thread.start()
+
+    def join(self) -> None:
+        for thread in self._threads:
+            thread.join()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self.join()
+
+    def _run(self) -> None:
+        queue, bus = self._queue_factory(), self._bus_factory()
+        while not self._stopping.is_set():
+            try:
+                if run_next(queue, bus):
+                    continue
+            except Exception:
+                logger.exception("could not claim or settle a job")
+            self._stopping.wait(self.poll_interval)
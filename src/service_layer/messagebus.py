@@ -2,12 +2,14 @@ from __future__ import annotations
 
 import logging
 from collections.abc import Callable
-from typing import TYPE_CHECKING
+from concurrent.futures import Executor
+from typing import TYPE_CHECKING, Any
 
+from src.adapters import idempotency
 from src.domain import commands, events
 
 if TYPE_CHECKING:
-    from . import unit_of_work
+    from . import retries, unit_of_work
 
 logger = logging.getLogger(__name__)
 
@@ -20,38 +22,154 @@ class MessageBus:
         uow: unit_of_work.UnitOfWork,
         event_handlers: dict[type[events.Event], list[Callable]],
         command_handlers: dict[type[commands.Command], Callable],
+        dedup_store: idempotency.DedupStore | None = None,
+        coalesce_commands: bool = False,
+        executor: Executor | None = None,
+        retries: retries.RetryScheduler | None = None,
     ) -> None:
         self.uow = uow
         self.event_handlers = event_handlers
         self.command_handlers = command_handlers
+        self.dedup_store = dedup_store
+        self.coalesce_commands = coalesce_commands
+        self.executor = executor
+        self.retries = retries
 
-    def handle(self, message: Message) -> None:
-        self.queue = [message]
+    def handle(self, message: Message) -> Any:
+        """Handles a message and everything it leads to.
+
+        Returns what the handler of a command returned, or None for an event
+        or a duplicate command.
+        """
+        self.queue = []
+        result = self._dispatch(message)
+        self._drain()
+        return result
+
+    def retry(self, handler_name: str, event: events.Event) -> None:
+        """Runs one of an event's handlers again, raising if it fails again."""
+        handler = next(
+            (h for h in self.event_handlers[type(event)] if h.__name__ == handler_name),
+            None,
+        )
+        if handler is None:
+            raise LookupError(f"{handler_name} does not handle {type(event).__name__}")
+        handler(event)
+        uow = getattr(handler, "uow", self.uow)
+        self.queue = list(uow.collect_new_events()) if uow is not None else []
+        self._drain()
+
+    def _drain(self) -> None:
         while self.queue:
-            message = self.queue.pop(0)
-            if isinstance(message, events.Event):
-                self.handle_event(message)
-            elif isinstance(message, commands.Command):
-                self.handle_command(message)
-            else:
-                raise Exception(f"{message} was not an Event or Command")
+            self._dispatch(self.queue.pop(0))
+
+    def _dispatch(self, message: Message) -> Any:
+        if isinstance(message, events.Event):
+            self.handle_event(message)
+            return None
+        if isinstance(message, commands.Command):
+            group = self._pop_same_aggregate_commands(message)
+            if group:
+                self.handle_commands_coalesced([message, *group])
+                return None
+            return self.handle_command(message)
+        raise Exception(f"{message} was not an Event or Command")
 
     def handle_event(self, event: events.Event) -> None:
-        for handler in self.event_handlers[type(event)]:
-            try:
-                logger.debug("handling event %s with handler %s", event, handler)
-                handler(event)
-                self.queue.extend(self.uow.collect_new_events())
-            except Exception:
-                logger.exception("Exception handling event %s", event)
-                continue
-
-    def handle_command(self, command: commands.Command) -> None:
+        handlers = self.event_handlers[type(event)]
+        if self.executor is None:
+            for handler in handlers:
+                self.queue.extend(self._run_event_handler(handler, event))
+            return
+        # independent handlers overlap each other and the rest, which run in
+        # order on this thread; new messages are still queued in handler order
+        futures = [
+            self.executor.submit(self._run_event_handler, handler, event)
+            if getattr(handler, "independent", False)
+            else None
+            for handler in handlers
+        ]
+        results = [
+            self._run_event_handler(handler, event) if future is None else []
+            for handler, future in zip(handlers, futures, strict=True)
+        ]
+        for result, future in zip(results, futures, strict=True):
+            self.queue.extend(result if future is None else future.result())
+
+    def _run_event_handler(
+        self, handler: Callable, event: events.Event
+    ) -> list[Message]:
+        # handlers run on another thread carry their own unit of work, or
+        # None if they use none, so never touch the bus's
+        uow = getattr(handler, "uow", self.uow)
+        try:
+            logger.debug("handling event %s with handler %s", event, handler)
+            handler(event)
+            return list(uow.collect_new_events()) if uow is not None else []
+        except Exception as e:
+            logger.exception("Exception handling event %s", event)
+            if self.retries is not None:
+                self.retries.schedule(handler, event, e)
+            return []
+
+    def handle_command(self, command: commands.Command) -> Any:
         logger.debug("handling command %s", command)
+        key = command.idempotency_key
+        if key is None or self.dedup_store is None:
+            return self._run_command_handler(command)
+        if self.dedup_store.seen(self.uow, key):
+            logger.info("skipping duplicate command %s", command)
+            return None
+        try:
+            with self.uow.claiming(key, type(command).__name__):
+                return self._run_command_handler(command)
+        except idempotency.DuplicateCommand:
+            # a concurrent duplicate committed first; this one rolled back
+            logger.info("skipping duplicate command %s", command)
+            return None
+
+    def _run_command_handler(self, command: commands.Command) -> Any:
         try:
             handler = self.command_handlers[type(command)]
-            handler(command)
+            result = handler(command)
             self.queue.extend(self.uow.collect_new_events())
+        except idempotency.DuplicateCommand:
+            raise
         except Exception:
             logger.exception("Exception handling command %s", command)
             raise
+        return result
+
+    def handle_commands_coalesced(self, group: list[commands.Command]) -> None:
+        """Handles commands for one aggregate in a single transaction.
+
+        Commands that ran before a failing one are still committed, as they
+        would have been when each command committed on its own.
+        """
+        logger.debug("handling %s commands in one transaction", len(group))
+        error: Exception | None = None
+        with self.uow.coalesced():
+            for command in group:
+                try:
+                    self.handle_command(command)
+                except Exception as e:
+                    error = e
+                    break
+        if error is not None:
+            raise error
+
+    def _pop_same_aggregate_commands(
+        self, command: commands.Command
+    ) -> list[commands.Command]:
+        sku = getattr(command, "sku", None)
+        if not self.coalesce_commands or sku is None or command.idempotency_key:
+            return []
+        group = []
+        while (
+            self.queue
+            and isinstance(self.queue[0], commands.Command)
+            and getattr(self.queue[0], "sku", None) == sku
+            and self.queue[0].idempotency_key is None
+        ):
+            group.append(self.queue.pop(0))
+        return group
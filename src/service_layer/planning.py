@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from datetime import date
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import select
+
+from src.adapters import orm
+from src.domain import model
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+if TYPE_CHECKING:
+    from . import unit_of_work
+
+
+class PlanningUnavailable(Exception):
+    pass
+
+
+@dataclass
+class SkuStock:
+    """A SKU's batches in the order ``Product.allocate`` tries them."""
+
+    sku: str
+    batchrefs: list[str]
+    etas: list[date | None]
+    available: Any  # numpy int64 array, one entry per batch
+
+
+@dataclass
+class Plan:
+    """Where each order line would be allocated, in the order given.
+
+    ``batchrefs`` holds None for lines that would go out of stock.
+    """
+
+    lines: Sequence[model.OrderLine]
+    batchrefs: list[str | None]
+    etas: list[date | None]
+
+    @property
+    def out_of_stock(self) -> list[model.OrderLine]:
+        return [
+            line
+            for line, batchref in zip(self.lines, self.batchrefs, strict=True)
+            if batchref is None
+        ]
+
+    @property
+    def first_out_of_stock(self) -> dict[str, int]:
+        """The position of the first line of each SKU that would not fit."""
+        first: dict[str, int] = {}
+        for i, (line, batchref) in enumerate(
+            zip(self.lines, self.batchrefs, strict=True)
+        ):
+            if batchref is None:
+                first.setdefault(line.sku, i)
+        return first
+
+
+def stock_from_products(products: Iterable[model.Product]) -> dict[str, SkuStock]:
+    _require_numpy()
+    stock = {}
+    for product in products:
+        batches = sorted(product.batches, key=model.eta_order)
+        stock[product.sku] = SkuStock(
+            sku=product.sku,
+            batchrefs=[b.reference for b in batches],
+            etas=[b.eta for b in batches],
+            available=np.array([b.available_quantity for b in batches], np.int64),
+        )
+    return stock
+
+
+def load_stock(
+    uow: unit_of_work.UnitOfWork, skus: Iterable[str]
+) -> dict[str, SkuStock]:
+    """Reads the SKUs' batches in one query, without loading their aggregates."""
+    _require_numpy()
+    batches = orm.batches.c
+    query = (
+        select(
+            batches.sku,
+            batches.reference,
+            batches.eta,
+            batches.purchased_quantity - batches.allocated_quantity,
+        )
+        .where(batches.sku.in_(set(skus)))
+        .order_by(batches.sku, batches.eta.asc().nulls_first(), batches.id)
+    )
+    rows: defaultdict[str, list[tuple]] = defaultdict(list)
+    with uow:
+        for sku, reference, eta, available in uow.query(query):
+            rows[sku].append((reference, eta, available))
+    return {
+        sku: SkuStock(
+            sku=sku,
+            batchrefs=[r[0] for r in sku_rows],
+            etas=[r[1] for r in sku_rows],
+            available=np.array([r[2] for r in sku_rows], np.int64),
+        )
+        for sku, sku_rows in rows.items()
+    }
+
+
+def plan(stock: dict[str, SkuStock], lines: Sequence[model.OrderLine]) -> Plan:
+    """Allocates ``lines`` in order against ``stock``, leaving it untouched.
+
+    Gives the same batch for every line as calling ``Product.allocate`` for
+    each in turn; lines of unknown SKUs count as out of stock.
+    """
+    _require_numpy()
+    batchrefs: list[str | None] = [None] * len(lines)
+    etas: list[date | None] = [None] * len(lines)
+    positions: defaultdict[str, list[int]] = defaultdict(list)
+    for i, line in enumerate(lines):
+        positions[line.sku].append(i)
+    for sku, sku_positions in positions.items():
+        sku_stock = stock.get(sku)
+        if sku_stock is None:
+            continue
+        qty = np.fromiter(
+            (lines[i].qty for i in sku_positions), np.int64, len(sku_positions)
+        )
+        assigned = first_fit(sku_stock.available, qty)
+        for i, batch in zip(sku_positions, assigned.tolist(), strict=True):
+            if batch >= 0:
+                batchrefs[i] = sku_stock.batchrefs[batch]
+                etas[i] = sku_stock.etas[batch]
+    return Plan(lines=lines, batchrefs=batchrefs, etas=etas)
+
+
+def first_fit(available: Any, qty: Any) -> Any:
+    """The index of the batch each line goes to, or -1 when none has room.
+
+    Every line tries the first batch before any other, so the first batch
+    takes the same lines whatever happens later; the next batch then sees
+    the lines it turned away, in order, and so on. Batches are filled one at
+    a time over whole arrays of lines instead of line by line.
+    """
+    assigned = np.full(len(qty), -1, np.int64)
+    pending = np.arange(len(qty))
+    for batch, capacity in enumerate(available.tolist()):
+        if not len(pending):
+            break
+        taken = _fill(capacity, qty[pending])
+        assigned[pending[taken]] = batch
+        pending = pending[~taken]
+    return assigned
+
+
+def _fill(capacity: int, qty: Any) -> Any:
+    """Which of the lines one batch takes, each in turn if it still fits."""
+    taken = np.zeros(len(qty), bool)
+    # no run of lines longer than this can fit at once
+    longest = capacity // max(1, int(qty.min())) + 1
+    start = 0
+    while start < len(qty):
+        fitting = np.flatnonzero(qty[start:] <= capacity)
+        if not len(fitting):
+            break
+        start += int(fitting[0])
+        # the running total of the lines from there shows how many fit in a row
+        totals = np.cumsum(qty[start : start + longest])
+        run = int(np.searchsorted(totals, capacity, side="right"))
+        taken[start : start + run] = True
+        capacity -= int(totals[run - 1])
+        start += run
+    return taken
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise PlanningUnavailable(
+            "allocation planning requires numpy; install the planning extra"
+        )
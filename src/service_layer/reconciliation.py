@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from sqlalchemy import text
+
+if TYPE_CHECKING:
+    from . import unit_of_work
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class AllocatedQuantityDrift:
+    sku: str
+    batchref: str
+    recorded: int
+    actual: int
+
+
+def find_allocated_quantity_drift(
+    uow: unit_of_work.UnitOfWork,
+) -> list[AllocatedQuantityDrift]:
+    # gathered from every shard when products are sharded
+    results = uow.query(
+        text(
+            """
+            SELECT b.sku, b.reference, b.allocated_quantity, COALESCE(SUM(ol.qty), 0)
+            FROM batches AS b
+            LEFT JOIN allocations AS a ON a.batch_id = b.id
+            LEFT JOIN order_lines AS ol ON a.orderline_id = ol.id
+            GROUP BY b.id, b.sku, b.reference, b.allocated_quantity
+            HAVING b.allocated_quantity <> COALESCE(SUM(ol.qty), 0)
+            """
+        ),
+        consistent=True,
+    )
+    return [
+        AllocatedQuantityDrift(sku=r[0], batchref=r[1], recorded=r[2], actual=r[3])
+        for r in results
+    ]
+
+
+def reconcile_allocated_quantities(
+    uow: unit_of_work.UnitOfWork, repair: bool = True
+) -> list[AllocatedQuantityDrift]:
+    """Compares batches.allocated_quantity with the allocation lines it summarises.
+
+    Drifted batches are logged and, when ``repair`` is set, recomputed from the
+    allocation lines in the same transaction.
+    """
+    with uow:
+        drift = find_allocated_quantity_drift(uow)
+        for d in drift:
+            logger.warning(
+                "allocated_quantity drift on batch %s: recorded=%s actual=%s",
+                d.batchref,
+                d.recorded,
+                d.actual,
+            )
+            if repair:
+                uow.execute(
+                    text(
+                        """
+                        UPDATE batches SET allocated_quantity = (
+                            SELECT COALESCE(SUM(ol.qty), 0)
+                            FROM allocations AS a
+                            JOIN order_lines AS ol ON a.orderline_id = ol.id
+                            WHERE a.batch_id = batches.id
+                        )
+                        WHERE reference = :batchref
+                        """
+                    ),
+                    dict(batchref=d.batchref),
+                    sku=d.sku,
+                )
+                # invalidates cached copies of the product
+                uow.execute(
+                    text(
+                        """
+                        UPDATE products SET version_number = version_number + 1
+                        WHERE sku = :sku
+                        """
+                    ),
+                    dict(sku=d.sku),
+                )
+        uow.commit()
+    return drift
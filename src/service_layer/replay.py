@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import Callable, Collection
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Protocol
+
+from sqlalchemy import delete, insert, select, text, update
+
+from src.adapters import orm
+from src.adapters.event_store import (
+    EventStore,
+    ProductSnapshot,
+    StoredEvent,
+    in_partition,
+)
+from src.domain import events
+
+if TYPE_CHECKING:
+    from . import unit_of_work
+
+logger = logging.getLogger(__name__)
+
+checkpoints = orm.projection_checkpoints
+
+
+class Projection(Protocol):
+    name: str
+
+    def reset(self, uow: unit_of_work.UnitOfWork, skus: Collection[str]) -> None:
+        ...
+
+    def apply_snapshot(
+        self, uow: unit_of_work.UnitOfWork, snapshot: ProductSnapshot
+    ) -> None:
+        ...
+
+    def apply(self, uow: unit_of_work.UnitOfWork, stored: StoredEvent) -> None:
+        ...
+
+
+class AllocationsView:
+    name = "allocations_view"
+
+    def reset(self, uow: unit_of_work.UnitOfWork, skus: Collection[str]) -> None:
+        if skus:
+            uow.execute(
+                delete(orm.allocations_view).where(orm.allocations_view.c.sku.in_(skus))
+            )
+
+    def apply_snapshot(
+        self, uow: unit_of_work.UnitOfWork, snapshot: ProductSnapshot
+    ) -> None:
+        rows = [
+            {"orderid": orderid, "sku": snapshot.sku, "batchref": batch["reference"]}
+            for batch in snapshot.state["batches"]
+            for orderid, _ in batch["allocations"]
+        ]
+        if rows:
+            uow.execute(insert(orm.allocations_view), rows)
+
+    def apply(self, uow: unit_of_work.UnitOfWork, stored: StoredEvent) -> None:
+        event = stored.event
+        if isinstance(event, events.Allocated):
+            uow.execute(
+                text(
+                    """
+                INSERT INTO allocations_view (orderid, sku, batchref)
+                VALUES (:orderid, :sku, :batchref)
+                """
+                ),
+                dict(orderid=event.orderid, sku=event.sku, batchref=event.batchref),
+            )
+        elif isinstance(event, events.Deallocated | events.AllocationCancelled):
+            uow.execute(
+                text(
+                    """
+                DELETE FROM allocations_view
+                WHERE orderid = :orderid AND sku = :sku
+                """
+                ),
+                dict(orderid=event.orderid, sku=event.sku),
+            )
+
+
+PROJECTIONS: dict[str, Projection] = {"allocations_view": AllocationsView()}
+
+
+@dataclass
+class ReplayReport:
+    events: int = 0
+    snapshots: int = 0
+    seconds: float = 0.0
+
+
+def snapshot_all(uow: unit_of_work.UnitOfWork, store: EventStore | None = None) -> int:
+    """Snapshots every product at the head of the log.
+
+    Run once when turning the event store on, so history recorded before it
+    is still reflected in rebuilt projections.
+    """
+    store = store or EventStore()
+    with uow:
+        skus = list(uow.execute(select(orm.products.c.sku)).scalars())
+    for sku in skus:
+        with uow:
+            product = uow.products.get(sku)
+            if product is not None:
+                store.save_snapshot(uow, product, position=store.head(uow))
+            uow.commit()
+    logger.info("snapshotted %s products", len(skus))
+    return len(skus)
+
+
+def rebuild(
+    projection: Projection,
+    uow_factory: Callable[[], unit_of_work.UnitOfWork],
+    store: EventStore | None = None,
+    partitions: int = 4,
+    batch_size: int = 1000,
+    restart: bool = True,
+) -> ReplayReport:
+    """Rebuilds a projection from the event store, one thread per SKU partition.
+
+    Each partition seeds its SKUs from their latest snapshots, then streams the
+    events recorded after them in keyset-paginated batches, committing its
+    checkpoint with every batch. With ``restart=False`` partitions resume from
+    their checkpoints, so an interrupted rebuild picks up where it stopped.
+    """
+    store = store or EventStore()
+    start = time.perf_counter()
+    uow = uow_factory()
+    with uow:
+        saved = uow.execute(
+            select(checkpoints.c.partitions).where(
+                checkpoints.c.projection == projection.name
+            )
+        ).all()
+        resumable = len(saved) == partitions and all(
+            r.partitions == partitions for r in saved
+        )
+        if restart or not resumable:
+            uow.execute(
+                delete(checkpoints).where(checkpoints.c.projection == projection.name)
+            )
+            uow.commit()
+            restart = True
+
+    def replay(partition: int) -> ReplayReport:
+        return _replay_partition(
+            projection,
+            uow_factory(),
+            store,
+            partitions,
+            partition,
+            batch_size,
+            restart,
+        )
+
+    report = ReplayReport()
+    with ThreadPoolExecutor(max_workers=partitions) as pool:
+        for partial in pool.map(replay, range(partitions)):
+            report.events += partial.events
+            report.snapshots += partial.snapshots
+    report.seconds = time.perf_counter() - start
+    logger.info(
+        "rebuilt %s from %s snapshots and %s events in %.2fs",
+        projection.name,
+        report.snapshots,
+        report.events,
+        report.seconds,
+    )
+    return report
+
+
+def _replay_partition(
+    projection: Projection,
+    uow: unit_of_work.UnitOfWork,
+    store: EventStore,
+    partitions: int,
+    partition: int,
+    batch_size: int,
+    restart: bool,
+) -> ReplayReport:
+    report = ReplayReport()
+    with uow:
+        snapshots = store.snapshots(uow, partitions, partition)
+        # events up to a SKU's snapshot are already reflected in it
+        seeded = {s.sku: s.position for s in snapshots}
+        if restart:
+            skus = set(seeded) | set(
+                uow.execute(
+                    select(orm.event_store.c.sku)
+                    .where(
+                        in_partition(orm.event_store.c.sku_hash, partitions, partition)
+                    )
+                    .distinct()
+                ).scalars()
+            )
+            projection.reset(uow, skus)
+            for snapshot in snapshots:
+                projection.apply_snapshot(uow, snapshot)
+            report.snapshots = len(snapshots)
+            uow.execute(
+                insert(checkpoints).values(
+                    projection=projection.name,
+                    partition=partition,
+                    partitions=partitions,
+                    position=0,
+                )
+            )
+            uow.commit()
+            position = 0
+        else:
+            position = uow.execute(
+                select(checkpoints.c.position).where(
+                    (checkpoints.c.projection == projection.name)
+                    & (checkpoints.c.partition == partition)
+                )
+            ).scalar_one()
+
+    while True:
+        with uow:
+            batch = store.read(uow, position, batch_size, partitions, partition)
+            if not batch:
+                return report
+            for stored in batch:
+                if stored.position > seeded.get(stored.sku, 0):
+                    projection.apply(uow, stored)
+                    report.events += 1
+            position = batch[-1].position
+            uow.execute(
+                update(checkpoints)
+                .where(
+                    (checkpoints.c.projection == projection.name)
+                    & (checkpoints.c.partition == partition)
+                )
+                .values(position=position)
+            )
+            uow.commit()
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from src.domain import events
+
+if TYPE_CHECKING:
+    from src.adapters import dead_letters
+
+    from . import messagebus
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How many times to retry a failed handler, with exponential backoff."""
+
+    attempts: int = 5
+    base_delay: float = 0.5
+    max_delay: float = 60.0
+
+    def delay(self, attempt: int) -> float:
+        return min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+
+
+NO_RETRY = RetryPolicy(attempts=0)
+
+
+def policy_for(handler: Callable) -> RetryPolicy:
+    return getattr(handler, "retry_policy", NO_RETRY)
+
+
+@dataclass(frozen=True)
+class _Retry:
+    handler: str
+    event: events.Event
+    policy: RetryPolicy
+    attempt: int
+    error: str
+
+
+class RetryScheduler:
+    """Retries failed event handlers on a background thread.
+
+    Failures are queued by due time and retried on a message bus of the
+    scheduler's own, built by ``bus_factory`` on its thread, so retries never
+    hold up the request that failed. Handlers that fail every attempt their
+    policy allows are written to the dead-letter store.
+    """
+
+    def __init__(
+        self,
+        bus_factory: Callable[[], messagebus.MessageBus],
+        dead_letters: dead_letters.DeadLetterStore,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.dead_letters = dead_letters
+        self.retried = 0
+        self.dead_lettered = 0
+        self._bus_factory = bus_factory
+        self._clock = clock
+        self._due: list[tuple[float, int, _Retry]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._thread = threading.Thread(
+            target=self._run, name="handler-retries", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join()
+
+    @property
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._due)
+
+    def schedule(
+        self,
+        handler: Callable,
+        event: events.Event,
+        error: Exception,
+        attempt: int = 1,
+    ) -> None:
+        self._push(
+            _Retry(
+                handler=handler.__name__,
+                event=event,
+                policy=policy_for(handler),
+                attempt=attempt,
+                error=repr(error),
+            )
+        )
+
+    def _push(self, retry: _Retry) -> None:
+        # exhausted retries are dead-lettered on this thread too, off the caller's
+        delay = (
+            retry.policy.delay(retry.attempt)
+            if retry.attempt <= retry.policy.attempts
+            else 0.0
+        )
+        with self._condition:
+            heapq.heappush(
+                self._due, (self._clock() + delay, next(self._sequence), retry)
+            )
+            self._condition.notify()
+
+    def _run(self) -> None:
+        bus = self._bus_factory()
+        while True:
+            with self._condition:
+                while not self._stopping and (
+                    not self._due or self._due[0][0] > self._clock()
+                ):
+                    timeout = self._due[0][0] - self._clock() if self._due else None
+                    self._condition.wait(timeout)
+                if self._stopping:
+                    return
+                _, _, retry = heapq.heappop(self._due)
+            self._attempt(bus, retry)
+
+    def _attempt(self, bus: messagebus.MessageBus, retry: _Retry) -> None:
+        if retry.attempt > retry.policy.attempts:
+            logger.error(
+                "%s failed %s times handling %s, dead-lettering",
+                retry.handler,
+                retry.attempt,
+                retry.event,
+            )
+            try:
+                self.dead_letters.add(
+                    retry.handler, retry.event, retry.error, retry.attempt
+                )
+                self.dead_lettered += 1
+            except Exception:
+                logger.exception("could not dead-letter %s", retry.event)
+            return
+        try:
+            bus.retry(retry.handler, retry.event)
+            self.retried += 1
+        except Exception as e:
+            logger.warning("retry %s of %s failed: %r", retry.attempt, retry.handler, e)
+            self._push(
+                _Retry(
+                    handler=retry.handler,
+                    event=retry.event,
+                    policy=retry.policy,
+                    attempt=retry.attempt + 1,
+                    error=repr(e),
+                )
+            )
+
+
+def replay_dead_letters(
+    bus: messagebus.MessageBus,
+    store: dead_letters.DeadLetterStore,
+    handler: str | None = None,
+    limit: int = 100,
+) -> tuple[int, int]:
+    """Runs dead-lettered handlers again, removing those that now succeed.
+
+    Returns how many were replayed and how many failed again.
+    """
+    replayed = failed = 0
+    for letter in store.list(handler=handler, limit=limit):
+        try:
+            bus.retry(letter.handler, letter.event)
+        except Exception as e:
+            logger.warning("replaying dead letter %s failed: %r", letter.id, e)
+            store.failed_again(letter.id, repr(e))
+            failed += 1
+        else:
+            store.remove(letter.id)
+            replayed += 1
+    logger.info("replayed %s dead letters, %s failed again", replayed, failed)
+    return replayed, failed
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from datetime import date
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Date, bindparam, column, text
+
+if TYPE_CHECKING:
+    from . import unit_of_work
+
+# the bucket of warehouse stock, available before any shipment arrives
+WAREHOUSE = date.min
+
+_batch_eta = text(
+    "SELECT eta FROM batches WHERE reference = :batchref AND sku = :sku"
+).columns(column("eta", Date))
+
+_delete_bucket = text(
+    "DELETE FROM stock_levels WHERE sku = :sku AND eta = :eta"
+).bindparams(bindparam("eta", type_=Date))
+
+_insert_bucket = text(
+    """
+    INSERT INTO stock_levels (sku, eta, purchased, allocated)
+    SELECT sku, :eta, SUM(purchased_quantity), SUM(allocated_quantity)
+    FROM batches
+    WHERE sku = :sku AND COALESCE(eta, :warehouse) = :eta
+    GROUP BY sku
+    """
+).bindparams(bindparam("eta", type_=Date), bindparam("warehouse", type_=Date))
+
+_delete_sku = text("DELETE FROM stock_levels WHERE sku = :sku")
+
+_insert_sku = text(
+    """
+    INSERT INTO stock_levels (sku, eta, purchased, allocated)
+    SELECT sku, bucket, SUM(purchased_quantity), SUM(allocated_quantity)
+    FROM (
+        SELECT sku, COALESCE(eta, :warehouse) AS bucket,
+            purchased_quantity, allocated_quantity
+        FROM batches
+        WHERE sku = :sku
+    ) AS b
+    GROUP BY sku, bucket
+    """
+).bindparams(bindparam("warehouse", type_=Date))
+
+
+def refresh(
+    uow: unit_of_work.UnitOfWork, sku: str, batchref: str | None = None
+) -> None:
+    """Recomputes the stock level of a batch's bucket from the batches table.
+
+    Recomputing rather than adding up changes means a handler that is
+    retried, or runs after a later event's, still leaves the right totals.
+    Without a batch (or once it has been archived) every bucket of the SKU
+    is recomputed.
+    """
+    row = None
+    if batchref is not None:
+        row = uow.execute(_batch_eta, dict(batchref=batchref, sku=sku)).first()
+    if row is None:
+        rebuild(uow, [sku])
+        return
+    params = dict(sku=sku, eta=row.eta or WAREHOUSE, warehouse=WAREHOUSE)
+    uow.execute(_delete_bucket, params)
+    uow.execute(_insert_bucket, params)
+
+
+def rebuild(uow: unit_of_work.UnitOfWork, skus: Iterable[str]) -> None:
+    """Recomputes every bucket of the SKUs, e.g. after writing batches in bulk."""
+    rows = [dict(sku=sku, warehouse=WAREHOUSE) for sku in skus]
+    if rows:
+        uow.execute(_delete_sku, rows)
+        uow.execute(_insert_sku, rows)
@@ -1,34 +1,161 @@
 from __future__ import annotations
 
-from collections.abc import Iterable
-from typing import Any, Self
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Self
 
-from src.adapters import repository, unit_of_work_strategy
-from src.domain import commands, events
+from src.adapters import idempotency, repository, unit_of_work_strategy
+from src.domain import commands, events, model
+
+if TYPE_CHECKING:
+    from src.adapters import event_store as event_store_
 
 
 class UnitOfWork:
-    def __init__(self, uow: unit_of_work_strategy.UnitOfWorkStrategy) -> None:
+    def __init__(
+        self,
+        uow: unit_of_work_strategy.UnitOfWorkStrategy,
+        event_store: event_store_.EventStore | None = None,
+        dedup_store: idempotency.DedupStore | None = None,
+    ) -> None:
         self._uow = uow
+        self.event_store = event_store
+        self.dedup_store = dedup_store
+        # idempotency key and command type to record with the next commit
+        self._claim: tuple[str, str] | None = None
+        self.messages: list[commands.Command | events.Event] = []
+        self._coalescing = False
+        self._savepoints: list[unit_of_work_strategy.Savepoint] = []
+        # ids of pending events already appended to the event store
+        self._recorded: set[int] = set()
 
     def __enter__(self) -> Self:
+        if self._coalescing:
+            assert isinstance(self._uow, unit_of_work_strategy.SupportsSavepoints)
+            self._savepoints.append(self._uow.begin_nested())
+            return self
         self._uow.__enter__()
         self.products = repository.TrackingRepository(self._uow.products)
+        self._recorded.clear()
         return self
 
     def __exit__(self, *args) -> None:
+        if self._coalescing:
+            savepoint = self._savepoints.pop()
+            if savepoint.is_active:
+                self._discard_messages()
+                savepoint.rollback()
+            return
         self.rollback()
+        self._uow.__exit__(*args)
+
+    @contextmanager
+    def coalesced(self) -> Iterator[None]:
+        """Runs every ``with uow`` block inside one transaction, committed once.
+
+        Each nested block gets its own savepoint, so a block that exits without
+        committing is rolled back on its own, exactly as it would have been in a
+        transaction of its own, so the strategy must support savepoints.
+        """
+        if not isinstance(self._uow, unit_of_work_strategy.SupportsSavepoints):
+            raise TypeError(f"{type(self._uow).__name__} cannot nest savepoints")
+        with self:
+            self._coalescing = True
+            try:
+                yield
+            finally:
+                self._coalescing = False
+            self.commit()
+
+    @contextmanager
+    def claiming(self, key: str, command_type: str) -> Iterator[None]:
+        """Records an idempotency key with the first commit inside the block.
+
+        The key commits or rolls back with the command's changes, so a command
+        whose transaction never committed can still be retried.
+        """
+        self._claim = (key, command_type)
+        try:
+            yield
+        finally:
+            self._claim = None
 
     def commit(self) -> None:
+        if self.event_store is not None:
+            self._record_events()
+        if self._claim is not None and self.dedup_store is not None:
+            key, command_type = self._claim
+            self._claim = None
+            try:
+                self.dedup_store.record(self, key, command_type)
+            except idempotency.DuplicateCommand:
+                self._discard_messages()
+                raise
+        if self._coalescing:
+            self._savepoints[-1].commit()
+            return
         self._uow.commit()
 
     def rollback(self) -> None:
+        if self._coalescing:
+            self._discard_messages()
+            self._savepoints[-1].rollback()
+            return
         self._uow.rollback()
 
     def execute(self, *args, **kwargs) -> Any:
         return self._uow.execute(*args, **kwargs)
 
+    def query(self, *args, **kwargs) -> Any:
+        return self._uow.query(*args, **kwargs)
+
+    def insert_rows(self, *args, **kwargs) -> None:
+        self._uow.insert_rows(*args, **kwargs)
+
+    def fork(self) -> UnitOfWork:
+        """A unit of work with its own session, for handlers run concurrently."""
+        return UnitOfWork(self._uow.fork(), self.event_store)
+
     def collect_new_events(self) -> Iterable[commands.Command | events.Event]:
-        for product in self.products.seen:
+        for product in self._seen():
             while product.messages:
                 yield product.messages.pop(0)
+        while self.messages:
+            yield self.messages.pop(0)
+        self._recorded.clear()
+
+    def _record_events(self) -> None:
+        """Appends pending events to the event store, in the committing transaction."""
+        assert self.event_store is not None
+        recorded = []
+        for product in self._seen():
+            new = self._unrecorded(product.messages)
+            if new:
+                since_snapshot = self.event_store.append(self, new)
+                self.event_store.snapshot_if_due(
+                    self, product, since_snapshot.get(product.sku, 0)
+                )
+                recorded += new
+        new = self._unrecorded(self.messages)
+        self.event_store.append(self, new)
+        self._recorded.update(id(event) for event in recorded + new)
+
+    def _unrecorded(
+        self, messages: list[commands.Command | events.Event]
+    ) -> list[events.Event]:
+        return [
+            m
+            for m in messages
+            if isinstance(m, events.Event) and id(m) not in self._recorded
+        ]
+
+    def _seen(self) -> set[model.Product]:
+        # a unit of work that was never entered has seen nothing yet
+        products = getattr(self, "products", None)
+        return products.seen if products is not None else set()
+
+    def _discard_messages(self) -> None:
+        for product in self._seen():
+            product.messages.clear()
+        self.messages.clear()
+        self._recorded.clear()
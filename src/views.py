@@ -1,24 +1,81 @@
 from __future__ import annotations
 
+from collections.abc import Collection
+from dataclasses import dataclass
+from datetime import date
 from typing import TYPE_CHECKING
 
-from sqlalchemy import text
+from sqlalchemy import select, text
 
+from src.adapters import orm
 from src.domain import events
+from src.service_layer.stock_levels import WAREHOUSE
 
 if TYPE_CHECKING:
     from src.service_layer import unit_of_work
 
 
 def allocations(
-    orderid: str, uow: unit_of_work.UnitOfWork
+    orderid: str, uow: unit_of_work.UnitOfWork, consistent: bool = False
 ) -> list[events.AllocationsViewed]:
+    """Reads from the replica, or from the primary when ``consistent`` is set."""
     with uow:
-        results = uow.execute(
+        results = uow.query(
             text("SELECT sku, batchref FROM allocations_view WHERE orderid = :orderid"),
             dict(orderid=orderid),
-        )
+            consistent=consistent,
+        ).all()
     return [
         events.AllocationsViewed(orderid=orderid, sku=r[0], batchref=r[1])
         for r in results
     ]
+
+
+def sku_for_batchref(
+    batchref: str, uow: unit_of_work.UnitOfWork, consistent: bool = False
+) -> str | None:
+    with uow:
+        return uow.query(
+            text("SELECT sku FROM batches WHERE reference = :batchref"),
+            dict(batchref=batchref),
+            consistent=consistent,
+        ).scalar()
+
+
+@dataclass(frozen=True)
+class StockLevel:
+    """Stock arriving on one date; ``eta`` is None for warehouse stock."""
+
+    eta: date | None
+    purchased: int
+    allocated: int
+
+    @property
+    def available(self) -> int:
+        return self.purchased - self.allocated
+
+
+def stock_levels(
+    skus: Collection[str], uow: unit_of_work.UnitOfWork, consistent: bool = False
+) -> dict[str, list[StockLevel]]:
+    """The stock levels of each SKU that has any, soonest first."""
+    levels = orm.stock_levels.c
+    query = (
+        select(levels.sku, levels.eta, levels.purchased, levels.allocated)
+        .where(levels.sku.in_(skus))
+        .order_by(levels.sku, levels.eta)
+    )
+    result: dict[str, list[StockLevel]] = {}
+    with uow:
+        for sku, eta, purchased, allocated in uow.query(query, consistent=consistent):
+            result.setdefault(sku, []).append(
+                StockLevel(None if eta == WAREHOUSE else eta, purchased, allocated)
+            )
+    return result
+
+
+def available_by(levels: list[StockLevel], when: date) -> int:
+    """How much can be allocated to ship by ``when``."""
+    return sum(
+        level.available for level in levels if level.eta is None or level.eta <= when
+    )
@@ -33,6 +33,45 @@ def post_to_allocate(
     return r
 
 
+def delete_allocation(client: TestClient, orderid: str) -> Response:
+    url = config.API_V1_STR
+    return client.delete(f"{url}/allocations/{orderid}")
+
+
+def post_to_import_batches(
+    client: TestClient, body: str, content_type: str = "text/csv"
+) -> Response:
+    url = config.API_V1_STR
+    return client.post(
+        f"{url}/batches/import",
+        content=body.encode(),
+        headers={"content-type": content_type},
+    )
+
+
 def get_allocation(client: TestClient, orderid: str) -> Response:
     url = config.API_V1_STR
     return client.get(f"{url}/allocations/{orderid}")
+
+
+def post_to_allocate_async(client: TestClient, orderid: str, sku: str, qty: int) -> str:
+    url = config.API_V1_STR
+    r = client.post(
+        f"{url}/allocations",
+        json={"orderid": orderid, "sku": sku, "qty": qty},
+        headers={"prefer": "respond-async"},
+    )
+    assert r.status_code == 202
+    assert r.headers["location"] == f"{url}/jobs/{r.json()['job_id']}"
+    return r.json()["job_id"]
+
+
+def get_job(client: TestClient, job_id: str) -> Response:
+    url = config.API_V1_STR
+    return client.get(f"{url}/jobs/{job_id}")
+
+
+def get_stock(client: TestClient, sku: str, by: str | None = None) -> Response:
+    url = config.API_V1_STR
+    params = {"by": by} if by else {}
+    return client.get(f"{url}/stock/{sku}", params=params)
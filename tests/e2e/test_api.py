@@ -3,10 +3,22 @@ from __future__ import annotations
 import pytest
 from fastapi.testclient import TestClient
 
+from src import bootstrap
 from src.config import config
+from src.entrypoints import fastapi_app
+from src.service_layer import jobs
 
 from ..random_refs import random_batchref, random_orderid, random_sku
-from .api_client import get_allocation, post_to_add_batch
+from .api_client import (
+    delete_allocation,
+    get_allocation,
+    get_job,
+    get_stock,
+    post_to_add_batch,
+    post_to_allocate,
+    post_to_allocate_async,
+    post_to_import_batches,
+)
 
 
 @pytest.fixture(scope="module", autouse=True)
@@ -55,3 +67,73 @@ def test_unhappy_path_returns_400_and_error_message(
     response = postgres_client.post(f"{url}/allocations", json=data)
     assert response.status_code == 400
     assert response.json()["detail"] == f"Invalid sku {unknown_sku}"
+
+
+def test_health_endpoints(postgres_client: TestClient) -> None:
+    assert postgres_client.get("/health/live").status_code == 200
+    fastapi_app.ready.wait(timeout=10)
+    assert postgres_client.get("/health/ready").status_code == 200
+
+
+def test_cancelling_an_allocation(postgres_client: TestClient) -> None:
+    sku, batch, orderid = random_sku(), random_batchref(), random_orderid()
+    post_to_add_batch(client=postgres_client, ref=batch, sku=sku, qty=10, eta=None)
+    data = {"orderid": orderid, "sku": sku, "qty": 3}
+    postgres_client.post(f"{config.API_V1_STR}/allocations", json=data)
+
+    assert delete_allocation(postgres_client, orderid).status_code == 204
+    assert get_allocation(postgres_client, orderid).status_code == 404
+    assert delete_allocation(postgres_client, orderid).status_code == 404
+
+
+def test_imported_batches_can_be_allocated(postgres_client: TestClient) -> None:
+    sku, orderid = random_sku(), random_orderid()
+    batch1, batch2 = random_batchref("1"), random_batchref("2")
+    body = f"ref,sku,qty,eta\n{batch1},{sku},10,\n{batch2},{sku},10,2011-01-01\n"
+
+    response = post_to_import_batches(postgres_client, body)
+
+    assert response.status_code == 201
+    assert response.json()["rows"] == 2
+    data = {"orderid": orderid, "sku": sku, "qty": 3}
+    postgres_client.post(f"{config.API_V1_STR}/allocations", json=data)
+    r = get_allocation(postgres_client, orderid)
+    assert r.json() == [{"orderid": orderid, "sku": sku, "batchref": batch1}]
+
+
+def test_async_allocation_is_run_by_a_worker(postgres_client: TestClient) -> None:
+    sku, batch, orderid = random_sku(), random_batchref(), random_orderid()
+    post_to_add_batch(postgres_client, batch, sku, 100, None)
+
+    job_id = post_to_allocate_async(postgres_client, orderid, sku, 3)
+    assert get_job(postgres_client, job_id).json()["status"] == "queued"
+    assert get_allocation(postgres_client, orderid).status_code == 404
+
+    while jobs.run_next(
+        fastapi_app.get_job_queue(), bootstrap.bootstrap(start_orm=False)
+    ):
+        pass
+
+    job = get_job(postgres_client, job_id).json()
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"batchref": batch, "out_of_stock": False}
+    assert get_allocation(postgres_client, orderid).json() == [
+        {"orderid": orderid, "sku": sku, "batchref": batch}
+    ]
+
+
+def test_stock_counts_warehouse_stock_and_shipments_arriving_in_time(
+    postgres_client: TestClient,
+) -> None:
+    sku, orderid = random_sku(), random_orderid()
+    post_to_add_batch(postgres_client, random_batchref("1"), sku, 10, None)
+    post_to_add_batch(postgres_client, random_batchref("2"), sku, 20, "2011-01-02")
+    post_to_allocate(postgres_client, orderid, sku, 4)
+
+    r = get_stock(postgres_client, sku, by="2011-01-01")
+
+    assert r.status_code == 200
+    assert r.json()["available"] == 6
+    assert [level["eta"] for level in r.json()["levels"]] == [None, "2011-01-02"]
+    assert get_stock(postgres_client, sku, by="2011-01-02").json()["available"] == 26
+    assert get_stock(postgres_client, random_sku("unknown")).status_code == 404
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Generator
+from datetime import date, timedelta
+from unittest import mock
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session, clear_mappers
+
+from src import bootstrap, views
+from src.adapters import orm, unit_of_work_strategy
+from src.domain import commands, events
+from src.service_layer import archival, handlers, messagebus
+
+today = date.today()
+last_week = today - timedelta(days=7)
+
+
+@pytest.fixture
+def sqlite_bus(
+    session_factory: Callable[[], Session]
+) -> Generator[messagebus.MessageBus, None, None]:
+    clear_mappers()
+    bus = bootstrap.bootstrap(
+        start_orm=True,
+        uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(session_factory),
+        notifications=mock.Mock(),
+        publish=lambda *args: None,
+    )
+    yield bus
+    clear_mappers()
+
+
+def test_archives_exhausted_delivered_batches(
+    sqlite_bus: messagebus.MessageBus,
+) -> None:
+    for ref, eta in [
+        ("delivered", last_week),
+        ("in-stock", None),
+        ("arriving", today + timedelta(days=7)),
+    ]:
+        sqlite_bus.handle(commands.CreateBatch(ref=ref, sku="sku1", qty=10, eta=eta))
+    sqlite_bus.handle(
+        commands.CreateBatch(ref="partial", sku="sku1", qty=20, eta=last_week)
+    )
+    for i in range(3):
+        sqlite_bus.handle(commands.Allocate(orderid=f"o{i}", sku="sku1", qty=10))
+
+    assert archival.archivable_skus(sqlite_bus.uow, before=today) == ["sku1"]
+    sqlite_bus.handle(commands.ArchiveBatches(sku="sku1", before=today))
+
+    with sqlite_bus.uow as uow:
+        product = uow.products.get("sku1")
+        assert product is not None
+        assert sorted(b.reference for b in product.batches) == [
+            "arriving",
+            "in-stock",
+            "partial",
+        ]
+        assert product.version_number == 4 + 3 + 1
+        [archived] = uow.execute(select(orm.batches_archive.c.reference)).all()
+        assert archived.reference == "delivered"
+        archived_orders = uow.execute(select(orm.order_lines_archive.c.orderid))
+        assert len(archived_orders.all()) == 1
+    assert archival.archivable_skus(sqlite_bus.uow, before=today) == []
+    # history stays in the read model
+    assert views.allocations("o1", sqlite_bus.uow) == [
+        events.AllocationsViewed(orderid="o1", sku="sku1", batchref="delivered")
+    ]
+
+
+def test_archived_batches_can_no_longer_be_changed(
+    sqlite_bus: messagebus.MessageBus,
+) -> None:
+    sqlite_bus.handle(commands.CreateBatch(ref="b1", sku="sku1", qty=10, eta=last_week))
+    sqlite_bus.handle(commands.Allocate(orderid="o1", sku="sku1", qty=10))
+    sqlite_bus.handle(commands.ArchiveBatches(sku="sku1", before=today))
+
+    with pytest.raises(handlers.InvalidRef):
+        sqlite_bus.handle(commands.ChangeBatchQuantity(ref="b1", qty=5))
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Generator
+from datetime import date
+
+import pytest
+from sqlalchemy.orm import Session, clear_mappers
+
+from src import bootstrap
+from src.adapters import event_store, idempotency, unit_of_work_strategy
+from src.domain import events
+from src.service_layer import batch_import, unit_of_work
+
+
+@pytest.fixture
+def uow(
+    session_factory: Callable[[], Session]
+) -> Generator[unit_of_work.UnitOfWork, None, None]:
+    clear_mappers()
+    bootstrap.start_mappers()
+    yield unit_of_work.UnitOfWork(
+        unit_of_work_strategy.SqlAlchemyUnitOfWork(session_factory)
+    )
+    clear_mappers()
+
+
+def test_imports_batches_in_chunks_creating_missing_products(
+    uow: unit_of_work.UnitOfWork,
+) -> None:
+    lines = ["ref,sku,qty,eta"] + [f"b{i},SKU{i % 3},10," for i in range(10)]
+
+    report = batch_import.import_batches(uow, batch_import.CSV, lines, chunk_size=4)
+
+    assert report.rows == 10
+    assert report.products_created == 3
+    assert report.errors == []
+    with uow:
+        product = uow.products.get("SKU0")
+        assert product is not None
+        assert sorted(b.reference for b in product.batches) == ["b0", "b3", "b6", "b9"]
+        assert product.batches[0].available_quantity == 10
+        # once per chunk that added batches to it
+        assert product.version_number == 3
+
+
+def test_imports_into_existing_products(uow: unit_of_work.UnitOfWork) -> None:
+    batch_import.import_batches(uow, batch_import.CSV, ["ref,sku,qty,eta", "b1,SKU,1,"])
+
+    report = batch_import.import_batches(
+        uow,
+        batch_import.NDJSON,
+        ['{"ref": "b2", "sku": "SKU", "qty": 2, "eta": "2030-01-01"}'],
+    )
+
+    assert (report.rows, report.products_created) == (1, 0)
+    with uow:
+        product = uow.products.get("SKU")
+        assert product is not None
+        assert sorted(b.reference for b in product.batches) == ["b1", "b2"]
+
+
+def test_imported_batches_are_recorded_in_the_event_store(
+    session_factory: Callable[[], Session], mappers: None
+) -> None:
+    store = event_store.EventStore()
+    uow = unit_of_work.UnitOfWork(
+        unit_of_work_strategy.SqlAlchemyUnitOfWork(session_factory), event_store=store
+    )
+    lines = ["ref,sku,qty,eta", "b1,LAMP,10,", "b2,RUG,5,2030-01-01"]
+
+    batch_import.import_batches(uow, batch_import.CSV, lines, chunk_size=1)
+
+    with uow:
+        recorded = [stored.event for stored in store.read(uow, after=0, limit=10)]
+    assert recorded == [
+        events.BatchCreated(sku="LAMP", batchref="b1", qty=10, eta=None),
+        events.BatchCreated(
+            sku="RUG", batchref="b2", qty=5, eta=date.fromisoformat("2030-01-01")
+        ),
+    ]
+    assert uow.messages == []
+
+
+def test_rows_with_processed_idempotency_keys_are_skipped(
+    session_factory: Callable[[], Session], mappers: None
+) -> None:
+    uow = unit_of_work.UnitOfWork(
+        unit_of_work_strategy.SqlAlchemyUnitOfWork(session_factory),
+        dedup_store=idempotency.SqlAlchemyDedupStore(),
+    )
+    lines = ["ref,sku,qty,eta,idempotency_key", "b1,LAMP,10,,k1", "b2,LAMP,10,,k1"]
+    report = batch_import.import_batches(uow, batch_import.CSV, lines)
+    assert (report.rows, report.duplicates) == (1, 1)
+
+    retried = ["ref,sku,qty,eta,idempotency_key", "b1,LAMP,10,,k1", "b3,LAMP,5,,k3"]
+    report = batch_import.import_batches(uow, batch_import.CSV, retried)
+
+    assert (report.rows, report.duplicates) == (1, 1)
+    with uow:
+        product = uow.products.get("LAMP")
+        assert product is not None
+        assert sorted(b.reference for b in product.batches) == ["b1", "b3"]
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Generator
+from datetime import date
+from unittest import mock
+
+import pytest
+from sqlalchemy import Engine, event
+from sqlalchemy.orm import Session, clear_mappers
+
+from src import bootstrap, views
+from src.adapters import unit_of_work_strategy
+from src.domain import commands
+from src.service_layer import messagebus
+
+today = date.today()
+
+
+@pytest.fixture
+def commits(in_memory_db: Engine) -> list[None]:
+    counted: list[None] = []
+    event.listen(in_memory_db, "commit", lambda conn: counted.append(None))
+    return counted
+
+
+@pytest.fixture
+def bulk_bus(
+    session_factory: Callable[[], Session]
+) -> Generator[messagebus.MessageBus, None, None]:
+    clear_mappers()
+    bus = bootstrap.bootstrap(
+        start_orm=True,
+        uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(session_factory),
+        notifications=mock.Mock(),
+        publish=lambda *args: None,
+        bulk_reallocation=True,
+    )
+    yield bus
+    clear_mappers()
+
+
+def test_quantity_change_and_reallocations_commit_once(
+    bulk_bus: messagebus.MessageBus, commits: list[None]
+) -> None:
+    bulk_bus.handle(commands.CreateBatch(ref="b1", sku="sku1", qty=50, eta=None))
+    bulk_bus.handle(commands.CreateBatch(ref="b2", sku="sku1", qty=50, eta=today))
+    for i in range(10):
+        bulk_bus.handle(commands.Allocate(orderid=f"o{i}", sku="sku1", qty=5))
+
+    commits.clear()
+    bulk_bus.handle(commands.ChangeBatchQuantity(ref="b1", qty=10))
+
+    # one for the change and all reallocations, then one per allocations view
+    # update for the eight deallocations and the eight reallocations, and one
+    # per stock-level refresh for the quantity change and the reallocations
+    assert len(commits) == 1 + 8 + 8 + (1 + 8)
+    allocations = [views.allocations(f"o{i}", bulk_bus.uow) for i in range(10)]
+    assert sorted(a[0].batchref for a in allocations) == ["b1"] * 2 + ["b2"] * 8
+    with bulk_bus.uow as uow:
+        product = uow.products.get("sku1")
+        assert product is not None
+        assert {b.reference: b.allocated_quantity for b in product.batches} == {
+            "b1": 10,
+            "b2": 40,
+        }
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Generator
+from datetime import date
+from unittest import mock
+
+import pytest
+from sqlalchemy import Engine, event
+from sqlalchemy.orm import Session, clear_mappers
+
+from src import bootstrap, views
+from src.adapters import unit_of_work_strategy
+from src.domain import commands, events
+from src.service_layer import handlers, messagebus
+
+today = date.today()
+
+
+@pytest.fixture
+def commits(in_memory_db: Engine) -> list[None]:
+    counted: list[None] = []
+    event.listen(in_memory_db, "commit", lambda conn: counted.append(None))
+    return counted
+
+
+@pytest.fixture
+def coalescing_bus(
+    session_factory: Callable[[], Session]
+) -> Generator[messagebus.MessageBus, None, None]:
+    clear_mappers()
+    bus = bootstrap.bootstrap(
+        start_orm=True,
+        uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(session_factory),
+        notifications=mock.Mock(),
+        publish=lambda *args: None,
+        coalesce_commands=True,
+    )
+    yield bus
+    clear_mappers()
+
+
+def test_cascaded_reallocations_commit_once(
+    coalescing_bus: messagebus.MessageBus, commits: list[None]
+) -> None:
+    coalescing_bus.handle(commands.CreateBatch(ref="b1", sku="sku1", qty=50, eta=None))
+    coalescing_bus.handle(commands.CreateBatch(ref="b2", sku="sku1", qty=50, eta=today))
+    for i in range(10):
+        coalescing_bus.handle(commands.Allocate(orderid=f"o{i}", sku="sku1", qty=5))
+
+    commits.clear()
+    coalescing_bus.handle(commands.ChangeBatchQuantity(ref="b1", qty=10))
+
+    # one for the quantity change, one for all eight reallocations, one per
+    # allocations view update for the eight deallocations and reallocations,
+    # and one per stock-level refresh for the quantity change and reallocations
+    assert len(commits) == 1 + 1 + 8 + 8 + (1 + 8)
+    allocations = [views.allocations(f"o{i}", coalescing_bus.uow) for i in range(10)]
+    assert sorted(a[0].batchref for a in allocations) == ["b1"] * 2 + ["b2"] * 8
+
+
+def test_commands_before_a_failure_are_still_committed(
+    coalescing_bus: messagebus.MessageBus,
+) -> None:
+    coalescing_bus.handle(commands.CreateBatch(ref="b1", sku="sku1", qty=50, eta=None))
+    coalescing_bus.queue = []
+
+    with pytest.raises(handlers.InvalidSku):
+        coalescing_bus.handle_commands_coalesced(
+            [
+                commands.Allocate(orderid="o1", sku="sku1", qty=5),
+                commands.Allocate(orderid="o2", sku="unknown", qty=5),
+                commands.Allocate(orderid="o3", sku="sku1", qty=5),
+            ]
+        )
+    coalescing_bus.handle_event(coalescing_bus.queue.pop(0))
+
+    assert views.allocations("o1", coalescing_bus.uow) == [
+        events.AllocationsViewed(orderid="o1", sku="sku1", batchref="b1")
+    ]
+    with coalescing_bus.uow as uow:
+        product = uow.products.get("sku1")
+        assert product is not None
+        [batch] = product.batches
+        assert batch.allocated_quantity == 5
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import pathlib
+import threading
+from collections.abc import Generator
+from unittest import mock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import clear_mappers, sessionmaker
+
+from src import bootstrap, views
+from src.adapters import orm, unit_of_work_strategy
+from src.domain import commands, events
+from src.service_layer import messagebus
+
+
+@pytest.fixture
+def publish() -> mock.Mock:
+    return mock.Mock()
+
+
+@pytest.fixture
+def concurrent_bus(
+    tmp_path: pathlib.Path, publish: mock.Mock
+) -> Generator[messagebus.MessageBus, None, None]:
+    # a file, so each handler's session sees the same database
+    engine = create_engine(f"sqlite:///{tmp_path / 'handlers.db'}")
+    orm.mapper_registry.metadata.create_all(engine)
+    clear_mappers()
+    bus = bootstrap.bootstrap(
+        start_orm=True,
+        uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(sessionmaker(bind=engine)),
+        notifications=mock.Mock(),
+        publish=publish,
+        event_handler_threads=2,
+    )
+    yield bus
+    clear_mappers()
+
+
+def test_independent_handlers_get_their_own_unit_of_work(
+    concurrent_bus: messagebus.MessageBus,
+) -> None:
+    add_to_read_model = concurrent_bus.event_handlers[events.Allocated][1]
+
+    assert add_to_read_model.__name__ == "add_allocation_to_read_model"
+    assert add_to_read_model.uow is not concurrent_bus.uow
+
+
+def test_allocation_is_published_and_projected_off_the_bus_thread(
+    concurrent_bus: messagebus.MessageBus, publish: mock.Mock
+) -> None:
+    threads = []
+    publish.side_effect = lambda *args: threads.append(threading.current_thread())
+    concurrent_bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+    concurrent_bus.handle(commands.Allocate(orderid="o1", sku="LAMP", qty=1))
+
+    assert views.allocations("o1", concurrent_bus.uow) == [
+        events.AllocationsViewed(orderid="o1", sku="LAMP", batchref="b1")
+    ]
+    publish.assert_called_once_with(
+        "line_allocated",
+        events.Allocated(orderid="o1", sku="LAMP", qty=1, batchref="b1"),
+    )
+    assert threads != [threading.current_thread()]
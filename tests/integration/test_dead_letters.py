@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import pathlib
+import threading
+from collections.abc import Generator
+from unittest import mock
+
+import pytest
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.orm import clear_mappers, sessionmaker
+
+from src import bootstrap
+from src.adapters import dead_letters, orm, unit_of_work_strategy
+from src.domain import commands, events
+from src.service_layer import retries
+
+allocated = events.Allocated(orderid="o1", sku="LAMP", qty=1, batchref="b1")
+
+
+@pytest.fixture
+def engine(tmp_path: pathlib.Path) -> Engine:
+    # a file, so the retry thread's session sees the same database
+    engine = create_engine(f"sqlite:///{tmp_path / 'retries.db'}")
+    orm.mapper_registry.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def store(engine: Engine) -> dead_letters.SqlAlchemyDeadLetterStore:
+    return dead_letters.SqlAlchemyDeadLetterStore(
+        unit_of_work_strategy.SqlAlchemyUnitOfWork(sessionmaker(bind=engine))
+    )
+
+
+def test_dead_letters_round_trip(
+    store: dead_letters.SqlAlchemyDeadLetterStore,
+) -> None:
+    store.add("publish_allocated_event", allocated, "ConnectionError()", 6)
+    [letter] = store.list()
+    assert (letter.handler, letter.event, letter.attempts) == (
+        "publish_allocated_event",
+        allocated,
+        6,
+    )
+
+    store.failed_again(letter.id, "TimeoutError()")
+    [letter] = store.list(handler="publish_allocated_event")
+    assert (letter.error, letter.attempts) == ("TimeoutError()", 7)
+    assert store.list(handler="add_allocation_to_read_model") == []
+
+    store.remove(letter.id)
+    assert store.list() == []
+
+
+@pytest.fixture
+def publish() -> mock.Mock:
+    return mock.Mock()
+
+
+@pytest.fixture
+def make_bus(
+    engine: Engine,
+    store: dead_letters.SqlAlchemyDeadLetterStore,
+    publish: mock.Mock,
+) -> Generator:
+    clear_mappers()
+    bootstrap.start_mappers()
+    scheduler = retries.RetryScheduler(lambda: make(), store)
+
+    def make():
+        return bootstrap.bootstrap(
+            start_orm=False,
+            uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(sessionmaker(bind=engine)),
+            notifications=mock.Mock(),
+            publish=publish,
+            retry_scheduler=scheduler,
+        )
+
+    scheduler.start()
+    yield make
+    scheduler.stop()
+    clear_mappers()
+
+
+def test_failed_publish_is_retried_without_failing_the_allocation(
+    make_bus, publish: mock.Mock, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(
+        bootstrap.handlers.publish_allocated_event,
+        "retry_policy",
+        retries.RetryPolicy(base_delay=0.01),
+    )
+    published = threading.Event()
+
+    def fail_once(*args) -> None:
+        if publish.call_count == 1:
+            raise ConnectionError("redis is down")
+        published.set()
+
+    publish.side_effect = fail_once
+    bus = make_bus()
+    bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+
+    bus.handle(commands.Allocate(orderid="o1", sku="LAMP", qty=1))
+
+    assert published.wait(timeout=5)
+    assert publish.call_count == 2
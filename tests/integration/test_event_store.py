@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import pathlib
+from collections.abc import Generator
+from unittest import mock
+
+import pytest
+from sqlalchemy import Engine, create_engine, select, text
+from sqlalchemy.orm import clear_mappers, sessionmaker
+
+from src import bootstrap
+from src.adapters import orm, unit_of_work_strategy
+from src.adapters.event_store import EventStore
+from src.config import config
+from src.domain import commands, events, model
+from src.service_layer import messagebus, replay, unit_of_work
+
+
+@pytest.fixture
+def engine(tmp_path: pathlib.Path) -> Engine:
+    # a file, so replay partitions can each use their own connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'events.db'}")
+    orm.mapper_registry.metadata.create_all(engine)
+    return engine
+
+
+def make_bus(engine: Engine, record_events: bool = True) -> messagebus.MessageBus:
+    return bootstrap.bootstrap(
+        start_orm=True,
+        uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(sessionmaker(bind=engine)),
+        notifications=mock.Mock(),
+        publish=lambda *args: None,
+        record_events=record_events,
+    )
+
+
+@pytest.fixture
+def bus(
+    engine: Engine, monkeypatch: pytest.MonkeyPatch
+) -> Generator[messagebus.MessageBus, None, None]:
+    monkeypatch.setattr(config, "EVENT_SNAPSHOT_EVERY", 3)
+    clear_mappers()
+    yield make_bus(engine)
+    clear_mappers()
+
+
+def uow_factory(engine: Engine):
+    return lambda: unit_of_work.UnitOfWork(
+        unit_of_work_strategy.SqlAlchemyUnitOfWork(sessionmaker(bind=engine))
+    )
+
+
+def view_rows(engine: Engine) -> list[tuple]:
+    with engine.connect() as conn:
+        return sorted(
+            conn.execute(text("SELECT orderid, sku, batchref FROM allocations_view"))
+        )
+
+
+def test_events_are_appended_in_the_committing_transaction(
+    bus: messagebus.MessageBus, engine: Engine
+) -> None:
+    bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+    bus.handle(commands.Allocate(orderid="o1", sku="LAMP", qty=4))
+    bus.handle(commands.Allocate(orderid="o2", sku="LAMP", qty=40))
+    bus.handle(commands.ChangeBatchQuantity(ref="b1", qty=2))
+
+    with engine.connect() as conn:
+        recorded = conn.execute(
+            select(orm.event_store.c.sku, orm.event_store.c.event_type).order_by(
+                orm.event_store.c.id
+            )
+        ).all()
+    # reallocation's Allocate command is not an event and is not recorded
+    assert recorded == [
+        ("LAMP", "BatchCreated"),
+        ("LAMP", "Allocated"),
+        ("LAMP", "OutOfStock"),
+        ("LAMP", "Deallocated"),
+        ("LAMP", "BatchQuantityChanged"),
+        ("LAMP", "OutOfStock"),
+    ]
+    with bus.uow as uow:
+        stored = EventStore().read(uow, after=0, limit=10)
+    assert stored[1].event == events.Allocated(
+        orderid="o1", sku="LAMP", qty=4, batchref="b1"
+    )
+
+
+def test_events_are_recorded_once_when_committed_twice(
+    bus: messagebus.MessageBus, engine: Engine
+) -> None:
+    bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+    with bus.uow as uow:
+        product = uow.products.get("LAMP")
+        product.allocate(model.OrderLine(orderid="o1", sku="LAMP", qty=1))
+        uow.commit()
+        uow.commit()
+        list(uow.collect_new_events())
+
+    allocated = select(orm.event_store).where(
+        orm.event_store.c.event_type == "Allocated"
+    )
+    with engine.connect() as conn:
+        assert len(conn.execute(allocated).all()) == 1
+
+
+def test_products_are_snapshotted_every_n_events(
+    bus: messagebus.MessageBus, engine: Engine
+) -> None:
+    bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+    for i in range(4):
+        bus.handle(commands.Allocate(orderid=f"o{i}", sku="LAMP", qty=1))
+
+    with bus.uow as uow:
+        [snapshot] = EventStore().snapshots(uow)
+    # the batch's creation is the first of the three events
+    assert snapshot.sku == "LAMP"
+    assert snapshot.position == 3
+    assert snapshot.state["batches"] == [
+        {
+            "reference": "b1",
+            "eta": None,
+            "purchased_quantity": 10,
+            "allocations": [["o0", 1], ["o1", 1]],
+        }
+    ]
+    # the stream row counts the two allocations since, so none is due yet
+    with engine.connect() as conn:
+        streams = conn.execute(select(orm.event_streams)).all()
+    assert streams == [("LAMP", 2)]
+
+
+def test_rebuilds_allocations_view_by_partition(
+    bus: messagebus.MessageBus, engine: Engine
+) -> None:
+    for sku in ("LAMP", "TABLE", "CHAIR", "SOFA"):
+        bus.handle(commands.CreateBatch(ref=f"{sku}-1", sku=sku, qty=10, eta=None))
+        bus.handle(commands.CreateBatch(ref=f"{sku}-2", sku=sku, qty=10, eta=None))
+        for i in range(5):
+            bus.handle(commands.Allocate(orderid=f"o{i}", sku=sku, qty=3))
+    bus.handle(commands.ChangeBatchQuantity(ref="LAMP-1", qty=4))
+    bus.handle(commands.Deallocate(orderid="o4", sku="SOFA"))
+    expected = view_rows(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM allocations_view"))
+
+    report = replay.rebuild(
+        replay.AllocationsView(),
+        uow_factory(engine),
+        partitions=3,
+        batch_size=2,
+    )
+
+    assert view_rows(engine) == expected
+    assert report.snapshots == 4
+    with engine.connect() as conn:
+        positions = conn.execute(select(orm.projection_checkpoints.c.position)).all()
+    assert len(positions) == 3
+
+
+class Interrupted(Exception):
+    pass
+
+
+class FailingOnce(replay.AllocationsView):
+    def __init__(self, orderid: str) -> None:
+        self.orderid = orderid
+
+    def apply(self, uow: unit_of_work.UnitOfWork, stored) -> None:
+        if getattr(stored.event, "orderid", None) == self.orderid:
+            self.orderid = ""
+            raise Interrupted
+        super().apply(uow, stored)
+
+
+def test_resuming_continues_from_the_checkpoint(
+    engine: Engine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # no snapshot, so that both allocations are replayed from the log
+    monkeypatch.setattr(config, "EVENT_SNAPSHOT_EVERY", 100)
+    clear_mappers()
+    bus = make_bus(engine)
+    bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+    for orderid in ("o1", "o2"):
+        bus.handle(commands.Allocate(orderid=orderid, sku="LAMP", qty=1))
+    clear_mappers()
+    projection = FailingOnce("o2")
+    with pytest.raises(Interrupted):
+        replay.rebuild(projection, uow_factory(engine), partitions=2, batch_size=1)
+    assert view_rows(engine) == [("o1", "LAMP", "b1")]
+
+    report = replay.rebuild(
+        projection, uow_factory(engine), partitions=2, batch_size=1, restart=False
+    )
+
+    assert report.events == 1
+    assert view_rows(engine) == [("o1", "LAMP", "b1"), ("o2", "LAMP", "b1")]
+
+
+def test_snapshot_all_covers_history_from_before_the_event_store(
+    engine: Engine,
+) -> None:
+    clear_mappers()
+    legacy = make_bus(engine, record_events=False)
+    legacy.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+    legacy.handle(commands.Allocate(orderid="o1", sku="LAMP", qty=1))
+    replay.snapshot_all(legacy.uow)
+
+    clear_mappers()
+    bus = make_bus(engine)
+    bus.handle(commands.Allocate(orderid="o2", sku="LAMP", qty=1))
+    clear_mappers()
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM allocations_view"))
+
+    replay.rebuild(replay.AllocationsView(), uow_factory(engine), partitions=2)
+
+    assert view_rows(engine) == [("o1", "LAMP", "b1"), ("o2", "LAMP", "b1")]
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Generator
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session, clear_mappers
+
+from src import bootstrap, views
+from src.adapters import idempotency, unit_of_work_strategy
+from src.domain import commands, model
+from src.service_layer import handlers, messagebus, unit_of_work
+
+
+def sqlite_uow(
+    session_factory: Callable[[], Session], store: idempotency.DedupStore
+) -> unit_of_work.UnitOfWork:
+    return unit_of_work.UnitOfWork(
+        unit_of_work_strategy.SqlAlchemyUnitOfWork(session_factory), dedup_store=store
+    )
+
+
+def processed_keys(session_factory: Callable[[], Session]) -> list[str]:
+    return list(
+        session_factory()
+        .execute(text("SELECT idempotency_key FROM processed_commands"))
+        .scalars()
+    )
+
+
+@pytest.fixture
+def bus(
+    session_factory: Callable[[], Session]
+) -> Generator[messagebus.MessageBus, None, None]:
+    clear_mappers()
+    yield bootstrap.bootstrap(
+        start_orm=True,
+        uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(session_factory),
+        notifications=mock.Mock(),
+        publish=lambda *args: None,
+        dedup_store=idempotency.SqlAlchemyDedupStore(),
+    )
+    clear_mappers()
+
+
+def test_keys_are_recorded_with_the_command(
+    bus: messagebus.MessageBus, session_factory: Callable[[], Session]
+) -> None:
+    bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+    allocate = commands.Allocate(orderid="o1", sku="LAMP", qty=4, idempotency_key="k1")
+
+    bus.handle(allocate)
+    bus.handle(allocate)
+
+    assert processed_keys(session_factory) == ["k1"]
+    with bus.uow as uow:
+        product = uow.products.get("LAMP")
+        assert product is not None
+        assert product.batches[0].available_quantity == 6
+
+
+def test_a_command_that_never_committed_can_be_retried(
+    bus: messagebus.MessageBus, session_factory: Callable[[], Session]
+) -> None:
+    allocate = commands.Allocate(orderid="o1", sku="LAMP", qty=4, idempotency_key="k1")
+    with pytest.raises(handlers.InvalidSku):
+        bus.handle(allocate)
+    assert processed_keys(session_factory) == []
+
+    bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+    bus.handle(allocate)
+
+    assert [a.batchref for a in views.allocations("o1", bus.uow)] == ["b1"]
+
+
+def test_a_duplicate_that_committed_first_rolls_the_other_back(
+    session_factory: Callable[[], Session], mappers: None
+) -> None:
+    store = idempotency.SqlAlchemyDedupStore()
+    first = sqlite_uow(session_factory, store)
+    second = sqlite_uow(session_factory, store)
+    with first.claiming("k1", "CreateBatch"), first:
+        first.products.add(model.Product(sku="LAMP", batches=[]))
+        first.commit()
+
+    with pytest.raises(idempotency.DuplicateCommand):
+        with second.claiming("k1", "CreateBatch"), second:
+            second.products.add(model.Product(sku="RUG", batches=[]))
+            second.commit()
+
+    with second:
+        assert second.products.get("RUG") is None
+        assert second.products.get("LAMP") is not None
+
+
+def test_expired_keys_are_treated_as_unseen_and_purged(
+    session_factory: Callable[[], Session], mappers: None
+) -> None:
+    store = idempotency.SqlAlchemyDedupStore(ttl=timedelta(seconds=-1))
+    uow = sqlite_uow(session_factory, store)
+    for _ in range(2):
+        assert not store.seen(uow, "k1")
+        with uow.claiming("k1", "Allocate"), uow:
+            uow.commit()
+
+    assert store.purge_expired(uow) == 1
+    assert processed_keys(session_factory) == []
+
+
+class CountingDedupStore(idempotency.DedupStore):
+    def __init__(self) -> None:
+        self.lookups = 0
+        self.keys: set[str] = set()
+
+    def seen(self, uow: unit_of_work.UnitOfWork, key: str) -> bool:
+        self.lookups += 1
+        return key in self.keys
+
+    def record(self, uow: unit_of_work.UnitOfWork, key: str, command_type: str) -> None:
+        self.keys.add(key)
+
+
+def test_cached_store_short_circuits_keys_known_to_be_processed() -> None:
+    backing = CountingDedupStore()
+    store = idempotency.CachedDedupStore(backing, maxsize=2)
+    uow = mock.Mock()
+    assert not store.seen(uow, "k1")
+    store.record(uow, "k1", "Allocate")
+    # not cached until the backing store reports it, as it may roll back
+    assert store.seen(uow, "k1")
+    assert store.seen(uow, "k1")
+    assert backing.lookups == 2
+
+    for key in ("k2", "k3"):
+        store.record(uow, key, "Allocate")
+        store.seen(uow, key)
+    assert store.seen(uow, "k1")  # evicted from the LRU
+    assert backing.lookups == 5
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import pathlib
+import threading
+import time
+from collections.abc import Generator
+from datetime import timedelta
+from unittest import mock
+
+import pytest
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.orm import clear_mappers, sessionmaker
+
+from src import bootstrap, views
+from src.adapters import idempotency, job_queue, orm, unit_of_work_strategy
+from src.domain import commands
+from src.service_layer import jobs, messagebus
+
+
+@pytest.fixture
+def engine(tmp_path: pathlib.Path) -> Engine:
+    # a file, so worker threads see the same database
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    orm.mapper_registry.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def make_queue(engine: Engine):
+    return lambda: job_queue.SqlAlchemyJobQueue(
+        unit_of_work_strategy.SqlAlchemyUnitOfWork(sessionmaker(bind=engine))
+    )
+
+
+@pytest.fixture
+def make_bus(engine: Engine) -> Generator:
+    clear_mappers()
+    bootstrap.start_mappers()
+    yield lambda: bootstrap.bootstrap(
+        start_orm=False,
+        uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(sessionmaker(bind=engine)),
+        notifications=mock.Mock(),
+        publish=lambda *args: None,
+    )
+    clear_mappers()
+
+
+def test_jobs_are_claimed_oldest_first_and_only_once(make_queue) -> None:
+    queue = make_queue()
+    first = queue.enqueue(commands.Allocate(orderid="o1", sku="LAMP", qty=1))
+    second = queue.enqueue(commands.Allocate(orderid="o2", sku="LAMP", qty=1))
+
+    claimed = queue.claim()
+    assert claimed is not None
+    assert (claimed.id, claimed.status) == (first, job_queue.RUNNING)
+    assert claimed.command == commands.Allocate(orderid="o1", sku="LAMP", qty=1)
+    assert make_queue().claim().id == second
+    assert queue.claim() is None
+
+
+def test_stale_running_jobs_can_be_requeued(make_queue) -> None:
+    queue = make_queue()
+    job_id = queue.enqueue(commands.Allocate(orderid="o1", sku="LAMP", qty=1))
+    queue.claim()
+
+    assert queue.requeue_stale(timedelta(hours=1)) == 0
+    assert queue.requeue_stale(timedelta(0)) == 1
+    assert queue.get(job_id).status == job_queue.QUEUED
+
+
+def test_run_next_records_success_and_failure(make_queue, make_bus) -> None:
+    queue, bus = make_queue(), make_bus()
+    bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+    ok = queue.enqueue(commands.Allocate(orderid="o1", sku="LAMP", qty=1))
+    bad = queue.enqueue(commands.Allocate(orderid="o2", sku="NOPE", qty=1))
+
+    assert jobs.run_next(queue, bus)
+    assert jobs.run_next(queue, bus)
+    assert not jobs.run_next(queue, bus)
+
+    assert queue.get(ok).status == job_queue.SUCCEEDED
+    failed = queue.get(bad)
+    assert (failed.status, failed.error) == (job_queue.FAILED, "Invalid sku NOPE")
+    assert failed.finished_at is not None
+
+
+def test_run_next_records_where_an_allocation_went(make_queue, make_bus) -> None:
+    queue, bus = make_queue(), make_bus()
+    bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+    allocate = commands.Allocate(orderid="o1", sku="LAMP", qty=8, idempotency_key="k1")
+    allocated = queue.enqueue(allocate)
+    duplicate = queue.enqueue(allocate)
+    out_of_stock = queue.enqueue(commands.Allocate(orderid="o2", sku="LAMP", qty=8))
+    while jobs.run_next(queue, bus):
+        pass
+
+    expected = {"batchref": "b1", "out_of_stock": False}
+    assert queue.get(allocated).result == expected
+    assert queue.get(duplicate).result == expected
+    assert queue.get(out_of_stock).result == {"batchref": None, "out_of_stock": True}
+
+
+def test_a_duplicate_that_lost_the_race_reports_the_original_outcome(
+    make_queue, make_bus
+) -> None:
+    queue, bus = make_queue(), make_bus()
+    bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+    allocate = commands.Allocate(orderid="o1", sku="LAMP", qty=8, idempotency_key="k2")
+    bus.handle(allocate)
+    job_id = queue.enqueue(allocate)
+
+    with mock.patch.object(bus, "handle", side_effect=idempotency.DuplicateCommand):
+        assert jobs.run_next(queue, bus)
+
+    job = queue.get(job_id)
+    assert (job.status, job.result) == (
+        job_queue.SUCCEEDED,
+        {"batchref": "b1", "out_of_stock": False},
+    )
+
+
+def test_a_queue_can_be_shared_between_threads(make_queue) -> None:
+    queue = make_queue()
+    job_ids: list[str] = []
+    threads = [
+        threading.Thread(
+            target=lambda i=i: job_ids.append(
+                queue.enqueue(commands.Allocate(orderid=f"o{i}", sku="LAMP", qty=1))
+            )
+        )
+        for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [queue.get(job_id).status for job_id in job_ids] == ["queued"] * 4
+
+
+def test_workers_drain_the_queue(make_queue, make_bus) -> None:
+    bus: messagebus.MessageBus = make_bus()
+    bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=100, eta=None))
+    queue = make_queue()
+    job_ids = [
+        queue.enqueue(commands.Allocate(orderid=f"o{i}", sku="LAMP", qty=1))
+        for i in range(10)
+    ]
+    workers = jobs.JobWorkers(make_queue, make_bus, workers=2, poll_interval=0.01)
+    workers.start()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline and any(
+        queue.get(job_id).status != job_queue.SUCCEEDED for job_id in job_ids
+    ):
+        time.sleep(0.01)
+    workers.stop()
+
+    assert [queue.get(job_id).status for job_id in job_ids] == ["succeeded"] * 10
+    assert views.allocations("o9", bus.uow) != []
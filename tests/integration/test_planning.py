@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+
+from src.adapters import unit_of_work_strategy
+from src.domain import model
+from src.service_layer import planning, unit_of_work
+
+pytest.importorskip("numpy")
+
+
+def test_loads_stock_in_allocation_order(session_factory, mappers) -> None:
+    uow = unit_of_work.UnitOfWork(
+        unit_of_work_strategy.SqlAlchemyUnitOfWork(session_factory)
+    )
+    with uow:
+        uow.products.add(
+            model.Product(
+                sku="LAMP",
+                batches=[
+                    model.Batch(
+                        reference="later",
+                        sku="LAMP",
+                        purchased_quantity=5,
+                        eta=date(2030, 2, 1),
+                    ),
+                    model.Batch(
+                        reference="sooner",
+                        sku="LAMP",
+                        purchased_quantity=7,
+                        eta=date(2030, 1, 1),
+                    ),
+                    model.Batch(
+                        reference="warehouse",
+                        sku="LAMP",
+                        purchased_quantity=9,
+                        eta=None,
+                    ),
+                ],
+            )
+        )
+        uow.commit()
+    with uow:
+        product = uow.products.get("LAMP")
+        assert product is not None
+        product.allocate(model.OrderLine(orderid="o1", sku="LAMP", qty=4))
+        uow.commit()
+
+    stock = planning.load_stock(uow, ["LAMP", "RUG"])
+
+    assert list(stock) == ["LAMP"]
+    assert stock["LAMP"].batchrefs == ["warehouse", "sooner", "later"]
+    assert stock["LAMP"].available.tolist() == [5, 7, 5]
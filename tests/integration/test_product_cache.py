@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Generator
+from unittest import mock
+
+import pytest
+from sqlalchemy import Engine, event
+from sqlalchemy.orm import Session, clear_mappers
+
+from src import bootstrap, views
+from src.adapters import unit_of_work_strategy
+from src.adapters.product_cache import ProductCache
+from src.domain import commands, events
+from src.service_layer import messagebus
+
+
+@pytest.fixture
+def statements(in_memory_db: Engine) -> list[str]:
+    executed: list[str] = []
+    event.listen(
+        in_memory_db,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: executed.append(statement),
+    )
+    return executed
+
+
+@pytest.fixture
+def cache() -> ProductCache:
+    return ProductCache()
+
+
+@pytest.fixture
+def make_bus(
+    session_factory: Callable[[], Session]
+) -> Generator[Callable[..., messagebus.MessageBus], None, None]:
+    clear_mappers()
+    bootstrap.start_mappers()
+
+    def make(cache: ProductCache | None = None, **kwargs) -> messagebus.MessageBus:
+        return bootstrap.bootstrap(
+            start_orm=False,
+            uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(session_factory, cache),
+            notifications=mock.Mock(),
+            publish=lambda *args: None,
+            **kwargs,
+        )
+
+    yield make
+    clear_mappers()
+
+
+def batch_loads(statements: list[str]) -> int:
+    return sum(1 for s in statements if s.startswith("SELECT batches."))
+
+
+def test_hot_product_is_not_reloaded(
+    make_bus: Callable[..., messagebus.MessageBus],
+    cache: ProductCache,
+    statements: list[str],
+) -> None:
+    bus = make_bus(cache)
+    bus.handle(commands.CreateBatch(ref="b1", sku="sku1", qty=100, eta=None))
+    bus.handle(commands.Allocate(orderid="o1", sku="sku1", qty=1))
+
+    statements.clear()
+    for i in range(2, 12):
+        bus.handle(commands.Allocate(orderid=f"o{i}", sku="sku1", qty=1))
+
+    assert batch_loads(statements) == 0
+    assert cache.hits >= 10
+    with bus.uow as uow:
+        uow.products.get("sku1")
+    product = cache.get("sku1")
+    assert product is not None
+    assert product.batches[0].allocated_quantity == 11
+
+
+def test_stale_product_is_reloaded(
+    make_bus: Callable[..., messagebus.MessageBus],
+    cache: ProductCache,
+    statements: list[str],
+) -> None:
+    cached_bus, other_node = make_bus(cache), make_bus()
+    cached_bus.handle(commands.CreateBatch(ref="b1", sku="sku1", qty=10, eta=None))
+    cached_bus.handle(commands.Allocate(orderid="o1", sku="sku1", qty=5))
+    other_node.handle(commands.Allocate(orderid="o2", sku="sku1", qty=5))
+
+    statements.clear()
+    cached_bus.handle(commands.Allocate(orderid="o3", sku="sku1", qty=5))
+
+    assert batch_loads(statements) == 1
+    assert views.allocations("o3", cached_bus.uow) == []
+
+
+def test_batch_changes_invalidate_by_version(
+    make_bus: Callable[..., messagebus.MessageBus], cache: ProductCache
+) -> None:
+    cached_bus, other_node = make_bus(cache), make_bus()
+    cached_bus.handle(commands.CreateBatch(ref="b1", sku="sku1", qty=10, eta=None))
+    cached_bus.handle(commands.Allocate(orderid="o1", sku="sku1", qty=5))
+    other_node.handle(commands.CreateBatch(ref="b2", sku="sku1", qty=10, eta=None))
+    other_node.handle(commands.ChangeBatchQuantity(ref="b1", qty=5))
+
+    cached_bus.handle(commands.Allocate(orderid="o2", sku="sku1", qty=8))
+
+    assert views.allocations("o2", cached_bus.uow) == [
+        events.AllocationsViewed(orderid="o2", sku="sku1", batchref="b2")
+    ]
+
+
+def test_rolled_back_changes_are_not_cached(
+    make_bus: Callable[..., messagebus.MessageBus], cache: ProductCache
+) -> None:
+    bus = make_bus(cache)
+    bus.handle(commands.CreateBatch(ref="b1", sku="sku1", qty=10, eta=None))
+    with bus.uow as uow:
+        product = uow.products.get("sku1")
+        assert product is not None
+        product.batches[0].purchased_quantity = 1
+
+    with bus.uow as uow:
+        product = uow.products.get("sku1")
+        assert product is not None
+        assert product.batches[0].purchased_quantity == 10
+
+
+def test_cannot_be_combined_with_row_lock_allocation(
+    make_bus: Callable[..., messagebus.MessageBus], cache: ProductCache
+) -> None:
+    with pytest.raises(ValueError):
+        make_bus(cache, allocation_strategy="row_lock")
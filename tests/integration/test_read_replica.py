@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import pathlib
+from collections.abc import Generator
+from unittest import mock
+
+import pytest
+from sqlalchemy import Engine, create_engine, text
+from sqlalchemy.orm import clear_mappers, sessionmaker
+
+from src import bootstrap, views
+from src.adapters import orm, unit_of_work_strategy
+from src.domain import commands, events
+from src.service_layer import messagebus
+
+
+@pytest.fixture
+def primary_and_replica(tmp_path: pathlib.Path) -> tuple[Engine, Engine]:
+    engines = (
+        create_engine(f"sqlite:///{tmp_path / 'primary.db'}"),
+        create_engine(f"sqlite:///{tmp_path / 'replica.db'}"),
+    )
+    for engine in engines:
+        orm.mapper_registry.metadata.create_all(engine)
+    return engines
+
+
+@pytest.fixture
+def replicated_bus(
+    primary_and_replica: tuple[Engine, Engine]
+) -> Generator[messagebus.MessageBus, None, None]:
+    primary, replica = primary_and_replica
+    clear_mappers()
+    bus = bootstrap.bootstrap(
+        start_orm=True,
+        uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(
+            sessionmaker(bind=primary), read_session_factory=sessionmaker(bind=replica)
+        ),
+        notifications=mock.Mock(),
+        publish=lambda *args: None,
+    )
+    yield bus
+    clear_mappers()
+
+
+def replicate(primary: Engine, replica: Engine) -> None:
+    with primary.connect() as source, replica.begin() as target:
+        rows = source.execute(
+            text("SELECT orderid, sku, batchref FROM allocations_view")
+        )
+        target.execute(text("DELETE FROM allocations_view"))
+        for orderid, sku, batchref in rows:
+            target.execute(
+                text("INSERT INTO allocations_view VALUES (:orderid, :sku, :batchref)"),
+                dict(orderid=orderid, sku=sku, batchref=batchref),
+            )
+
+
+def test_views_read_from_the_replica(
+    replicated_bus: messagebus.MessageBus,
+    primary_and_replica: tuple[Engine, Engine],
+) -> None:
+    replicated_bus.handle(commands.CreateBatch(ref="b1", sku="sku1", qty=10, eta=None))
+    replicated_bus.handle(commands.Allocate(orderid="o1", sku="sku1", qty=1))
+    expected = [events.AllocationsViewed(orderid="o1", sku="sku1", batchref="b1")]
+
+    assert views.allocations("o1", replicated_bus.uow) == []
+    assert views.allocations("o1", replicated_bus.uow, consistent=True) == expected
+
+    replicate(*primary_and_replica)
+    assert views.allocations("o1", replicated_bus.uow) == expected
+
+
+@pytest.mark.parametrize("replica_uri", [None, "postgresql://replica/allocation"])
+def test_queries_share_the_write_session_without_a_replica(
+    replica_uri: str | None,
+) -> None:
+    with mock.patch.object(
+        unit_of_work_strategy.config, "POSTGRES_REPLICA_URI", replica_uri
+    ):
+        uow = unit_of_work_strategy.SqlAlchemyUnitOfWork()
+
+    if replica_uri is None:
+        assert uow.read_session_factory is uow.session_factory
+    else:
+        assert uow.read_session_factory is unit_of_work_strategy.get_read_session
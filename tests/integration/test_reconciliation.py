@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.domain import model
+from src.service_layer import reconciliation, unit_of_work
+
+pytestmark = pytest.mark.usefixtures("mappers")
+
+
+def get_allocated_quantity(session: Session, ref: str) -> int:
+    [[qty]] = session.execute(
+        text("SELECT allocated_quantity FROM batches WHERE reference=:ref"),
+        dict(ref=ref),
+    )
+    return qty
+
+
+def allocate(uow: unit_of_work.UnitOfWork, sku: str, qty: int) -> None:
+    with uow:
+        product = uow.products.get(sku=sku)
+        product.allocate(  # type: ignore[union-attr]
+            model.OrderLine(orderid="o1", sku=sku, qty=qty)
+        )
+        uow.commit()
+
+
+def test_allocating_persists_allocated_quantity(
+    session: Session, uow: unit_of_work.UnitOfWork
+) -> None:
+    batch = model.Batch(reference="b1", sku="SKU", purchased_quantity=10, eta=None)
+    with uow:
+        uow.products.add(model.Product(sku="SKU", batches=[batch]))
+        uow.commit()
+
+    allocate(uow, "SKU", 4)
+
+    assert get_allocated_quantity(session, "b1") == 4
+
+
+def test_reconciliation_repairs_drift(
+    session: Session, uow: unit_of_work.UnitOfWork
+) -> None:
+    batch = model.Batch(reference="b1", sku="SKU", purchased_quantity=10, eta=None)
+    with uow:
+        uow.products.add(model.Product(sku="SKU", batches=[batch]))
+        uow.commit()
+    allocate(uow, "SKU", 4)
+    session.execute(text("UPDATE batches SET allocated_quantity = 9"))
+    session.commit()
+
+    drift = reconciliation.reconcile_allocated_quantities(uow)
+
+    assert drift == [
+        reconciliation.AllocatedQuantityDrift(
+            sku="SKU", batchref="b1", recorded=9, actual=4
+        )
+    ]
+    assert get_allocated_quantity(session, "b1") == 4
+    assert reconciliation.reconcile_allocated_quantities(uow) == []
+
+
+def test_reconciliation_dry_run_does_not_repair(
+    session: Session, uow: unit_of_work.UnitOfWork
+) -> None:
+    with uow:
+        uow.products.add(
+            model.Product(
+                sku="SKU",
+                batches=[
+                    model.Batch(
+                        reference="b1", sku="SKU", purchased_quantity=10, eta=None
+                    )
+                ],
+            )
+        )
+        uow.commit()
+    session.execute(text("UPDATE batches SET allocated_quantity = 3"))
+    session.commit()
+
+    reconciliation.reconcile_allocated_quantities(uow, repair=False)
+
+    assert get_allocated_quantity(session, "b1") == 3
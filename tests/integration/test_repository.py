@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import pytest
+from sqlalchemy import inspect
 from sqlalchemy.orm import Session
 
 from src.adapters import repository
@@ -20,3 +21,36 @@ def test_get_by_batchref(session: Session) -> None:
     repo.add(p2)
     assert repo.get_by_batchref("b2") == p1
     assert repo.get_by_batchref("b3") == p2
+
+
+def test_finds_an_orders_lines_without_loading_the_products_other_lines(
+    session: Session,
+) -> None:
+    line = model.OrderLine(orderid="o1", sku="sku1", qty=5)
+    other = model.OrderLine(orderid="o2", sku="sku1", qty=5)
+    b1 = model.Batch(
+        reference="b1", sku="sku1", purchased_quantity=100, eta=None, allocations={line}
+    )
+    b2 = model.Batch(
+        reference="b2",
+        sku="sku1",
+        purchased_quantity=100,
+        eta=None,
+        allocations={other},
+    )
+    session.add(model.Product(sku="sku1", batches=[b1, b2]))
+    session.commit()
+    session.expunge_all()
+
+    repo = repository.SqlAlchemyRepository(session)
+    product = repo.get("sku1")
+    assert product is not None
+    allocated = repo.allocations("sku1", "o1")
+    assert allocated == [("b1", model.OrderLine(orderid="o1", sku="sku1", qty=5))]
+    assert repo.allocations("sku2", "o1") == []
+
+    product.deallocate("o1", allocated)
+
+    assert [b.allocated_quantity for b in product.batches] == [0, 5]
+    b2 = next(b for b in product.batches if b.reference == "b2")
+    assert "allocations" in inspect(b2).unloaded
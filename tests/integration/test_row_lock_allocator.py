@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import random
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.adapters import row_lock_allocator
+from src.domain import commands, events, model
+from src.service_layer import handlers, unit_of_work
+
+today = date.today()
+
+
+def random_scenario(
+    rng: random.Random,
+) -> tuple[list[model.Batch], list[model.OrderLine]]:
+    batches = [
+        model.Batch(
+            reference=f"batch{i}",
+            sku="SKU",
+            purchased_quantity=rng.randint(0, 50),
+            eta=rng.choice([None, today, today + timedelta(days=rng.randint(1, 3))]),
+        )
+        for i in range(rng.randint(1, 6))
+    ]
+    lines = [
+        model.OrderLine(orderid=f"order{i}", sku="SKU", qty=rng.randint(1, 20))
+        for i in range(rng.randint(1, 30))
+    ]
+    return batches, lines
+
+
+def insert_batches(session: Session, batches: list[model.Batch]) -> None:
+    session.execute(text("INSERT INTO products (sku) VALUES ('SKU')"))
+    for b in batches:
+        session.execute(
+            text(
+                "INSERT INTO batches (reference, sku, purchased_quantity, eta)"
+                " VALUES (:ref, :sku, :qty, :eta)"
+            ),
+            dict(ref=b.reference, sku=b.sku, qty=b.purchased_quantity, eta=b.eta),
+        )
+    session.commit()
+
+
+def allocate_with_row_locks(
+    uow: unit_of_work.UnitOfWork, line: model.OrderLine
+) -> list[events.Event | commands.Command]:
+    handlers.allocate_with_row_locks(
+        commands.Allocate(orderid=line.orderid, sku=line.sku, qty=line.qty),
+        uow=uow,
+        allocator=row_lock_allocator.RowLockAllocator(),
+    )
+    return list(uow.collect_new_events())
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_row_lock_allocation_is_equivalent_to_product_allocate(
+    seed: int, session: Session, uow: unit_of_work.UnitOfWork
+) -> None:
+    batches, lines = random_scenario(random.Random(seed))
+    insert_batches(session, batches)
+    product = model.Product(sku="SKU", batches=batches)
+
+    for line in lines:
+        product.allocate(line)
+        expected = product.messages[:]
+        product.messages.clear()
+
+        assert allocate_with_row_locks(uow, line) == expected
+
+
+def test_row_lock_allocation_errors_for_invalid_sku(
+    uow: unit_of_work.UnitOfWork,
+) -> None:
+    with pytest.raises(handlers.InvalidSku, match="Invalid sku NONEXISTENTSKU"):
+        handlers.allocate_with_row_locks(
+            commands.Allocate(orderid="o1", sku="NONEXISTENTSKU", qty=10),
+            uow=uow,
+            allocator=row_lock_allocator.RowLockAllocator(),
+        )
+
+
+def test_row_lock_allocation_persists_the_allocation(
+    session: Session, uow: unit_of_work.UnitOfWork
+) -> None:
+    batch = model.Batch(reference="b1", sku="SKU", purchased_quantity=10, eta=None)
+    insert_batches(session, [batch])
+
+    allocate_with_row_locks(uow, model.OrderLine(orderid="o1", sku="SKU", qty=4))
+
+    [[batchref, qty]] = session.execute(
+        text(
+            "SELECT b.reference, ol.qty FROM allocations AS a"
+            " JOIN batches AS b ON a.batch_id = b.id"
+            " JOIN order_lines AS ol ON a.orderline_id = ol.id"
+            " WHERE ol.orderid = 'o1'"
+        )
+    )
+    assert (batchref, qty) == ("b1", 4)
+
+
+def test_row_lock_allocation_bumps_the_product_version(
+    session: Session, uow: unit_of_work.UnitOfWork
+) -> None:
+    batch = model.Batch(reference="b1", sku="SKU", purchased_quantity=10, eta=None)
+    insert_batches(session, [batch])
+
+    allocate_with_row_locks(uow, model.OrderLine(orderid="o1", sku="SKU", qty=4))
+    allocate_with_row_locks(uow, model.OrderLine(orderid="o2", sku="SKU", qty=40))
+
+    [version] = session.execute(
+        text("SELECT version_number FROM products WHERE sku = 'SKU'")
+    ).scalars()
+    assert version == 1
+
+
+def test_a_batch_filled_since_the_snapshot_is_not_over_allocated(
+    session: Session, uow: unit_of_work.UnitOfWork
+) -> None:
+    insert_batches(
+        session,
+        [
+            model.Batch(reference="b1", sku="SKU", purchased_quantity=10, eta=None),
+            model.Batch(reference="b2", sku="SKU", purchased_quantity=10, eta=today),
+        ],
+    )
+    allocator = row_lock_allocator.RowLockAllocator()
+    with uow:
+        stale = allocator.candidate_batches(uow, "SKU")
+        allocator.allocate(uow, model.OrderLine(orderid="o1", sku="SKU", qty=8))
+        allocator.candidate_batches = lambda *args: stale  # type: ignore[method-assign]
+
+        batchref = allocator.allocate(
+            uow, model.OrderLine(orderid="o2", sku="SKU", qty=8)
+        )
+        uow.commit()
+
+    assert batchref == "b2"
+    allocated = session.execute(
+        text("SELECT reference, allocated_quantity FROM batches ORDER BY reference")
+    )
+    assert list(allocated) == [("b1", 8), ("b2", 8)]
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import pathlib
+from collections import Counter
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest import mock
+
+import pytest
+from sqlalchemy import Engine, create_engine, text
+from sqlalchemy.orm import clear_mappers, sessionmaker
+
+from src import bootstrap, views
+from src.adapters import orm, sharding, sku_locks, unit_of_work_strategy
+from src.config import config
+from src.domain import commands, model
+from src.service_layer import archival, batch_import, messagebus
+
+SKUS = [f"SKU-{i}" for i in range(30)]
+
+
+@pytest.fixture
+def shards(tmp_path: pathlib.Path) -> dict[str, Engine]:
+    engines = {}
+    for name in ("shard-0", "shard-1", "shard-2"):
+        engine = create_engine(f"sqlite:///{tmp_path / name}.db")
+        orm.mapper_registry.metadata.create_all(engine)
+        engines[name] = engine
+    return engines
+
+
+@pytest.fixture
+def sharded_uow(shards: dict[str, Engine]) -> unit_of_work_strategy.ShardedUnitOfWork:
+    return unit_of_work_strategy.ShardedUnitOfWork(
+        {name: sessionmaker(bind=engine) for name, engine in shards.items()}
+    )
+
+
+@pytest.fixture
+def bus(
+    sharded_uow: unit_of_work_strategy.ShardedUnitOfWork,
+) -> Generator[messagebus.MessageBus, None, None]:
+    clear_mappers()
+    yield bootstrap.bootstrap(
+        start_orm=True,
+        uow=sharded_uow,
+        notifications=mock.Mock(),
+        publish=mock.Mock(),
+    )
+    clear_mappers()
+
+
+def skus_in(engine: Engine) -> set[str]:
+    with engine.connect() as connection:
+        return set(connection.execute(text("SELECT sku FROM products")).scalars())
+
+
+def one_sku_per_shard(ring: sharding.HashRing) -> dict[str, str]:
+    skus = {ring.shard_for(sku): sku for sku in SKUS}
+    assert len(skus) == 3
+    return skus
+
+
+def test_ring_spreads_keys_and_adding_a_shard_moves_only_its_share() -> None:
+    keys = [f"SKU-{i}" for i in range(3000)]
+    before = sharding.HashRing(["shard-0", "shard-1", "shard-2"])
+    after = sharding.HashRing(["shard-0", "shard-1", "shard-2", "shard-3"])
+
+    counts = Counter(before.shard_for(key) for key in keys)
+    assert min(counts.values()) > 600
+    moved = [key for key in keys if before.shard_for(key) != after.shard_for(key)]
+    assert all(after.shard_for(key) == "shard-3" for key in moved)
+    assert len(moved) < len(keys) / 3
+
+
+def test_products_are_stored_on_the_shard_of_their_sku(
+    bus: messagebus.MessageBus,
+    sharded_uow: unit_of_work_strategy.ShardedUnitOfWork,
+    shards: dict[str, Engine],
+) -> None:
+    for sku in SKUS:
+        bus.handle(commands.CreateBatch(ref=f"b-{sku}", sku=sku, qty=10, eta=None))
+
+    for name, engine in shards.items():
+        expected = {sku for sku in SKUS if sharded_uow.ring.shard_for(sku) == name}
+        assert skus_in(engine) == expected
+        assert expected
+
+
+def test_batches_are_found_through_the_directory(
+    bus: messagebus.MessageBus, shards: dict[str, Engine]
+) -> None:
+    for sku in SKUS:
+        bus.handle(commands.CreateBatch(ref=f"b-{sku}", sku=sku, qty=10, eta=None))
+    bus.handle(commands.Allocate(orderid="o1", sku="SKU-7", qty=8))
+
+    bus.handle(commands.ChangeBatchQuantity(ref="b-SKU-7", qty=5))
+
+    with shards["shard-0"].connect() as connection:
+        directory = dict(
+            connection.execute(text("SELECT * FROM batch_directory")).tuples().all()
+        )
+    assert directory == {f"b-{sku}": sku for sku in SKUS}
+    assert views.allocations("o1", bus.uow, consistent=True) == []
+
+
+def test_read_model_is_scattered_and_gathered(
+    bus: messagebus.MessageBus,
+    sharded_uow: unit_of_work_strategy.ShardedUnitOfWork,
+) -> None:
+    skus = one_sku_per_shard(sharded_uow.ring)
+    for sku in skus.values():
+        bus.handle(commands.CreateBatch(ref=f"b-{sku}", sku=sku, qty=10, eta=None))
+        bus.handle(commands.Allocate(orderid="o1", sku=sku, qty=1))
+
+    allocations = views.allocations("o1", bus.uow)
+
+    assert sorted(a.sku for a in allocations) == sorted(skus.values())
+    assert views.sku_for_batchref(f"b-{skus['shard-2']}", bus.uow) == skus["shard-2"]
+
+
+def test_batches_are_archived_on_the_shard_of_their_sku(
+    bus: messagebus.MessageBus,
+    sharded_uow: unit_of_work_strategy.ShardedUnitOfWork,
+    shards: dict[str, Engine],
+) -> None:
+    skus = one_sku_per_shard(sharded_uow.ring)
+    last_week = date.today() - timedelta(days=7)
+    for sku in skus.values():
+        bus.handle(commands.CreateBatch(ref=f"b-{sku}", sku=sku, qty=5, eta=last_week))
+        bus.handle(commands.Allocate(orderid=f"o-{sku}", sku=sku, qty=5))
+
+    archivable = archival.archivable_skus(bus.uow, before=date.today())
+    assert sorted(archivable) == sorted(skus.values())
+    for sku in archivable:
+        bus.handle(commands.ArchiveBatches(sku=sku, before=date.today()))
+
+    for name, engine in shards.items():
+        with engine.connect() as connection:
+            assert connection.execute(text("SELECT * FROM batches")).all() == []
+            archived = connection.execute(
+                text("SELECT reference FROM batches_archive")
+            ).scalars()
+            assert list(archived) == [f"b-{skus[name]}"]
+
+
+def test_imported_batches_are_written_to_the_shard_of_their_sku(
+    bus: messagebus.MessageBus,
+    sharded_uow: unit_of_work_strategy.ShardedUnitOfWork,
+    shards: dict[str, Engine],
+) -> None:
+    lines = ["ref,sku,qty,eta"] + [f"b-{sku},{sku},10," for sku in SKUS]
+
+    report = batch_import.import_batches(bus.uow, batch_import.CSV, lines, chunk_size=7)
+
+    assert report.products_created == len(SKUS)
+    for name, engine in shards.items():
+        expected = {sku for sku in SKUS if sharded_uow.ring.shard_for(sku) == name}
+        assert skus_in(engine) == expected
+    bus.handle(commands.ChangeBatchQuantity(ref="b-SKU-7", qty=5))
+    with bus.uow as uow:
+        product = uow.products.get("SKU-7")
+        assert product is not None
+        assert product.batches[0].purchased_quantity == 5
+
+
+@pytest.mark.parametrize(
+    "options", [{"coalesce_commands": True}, {"record_events": True}]
+)
+def test_sharding_rejects_a_single_transaction_write_path(
+    sharded_uow: unit_of_work_strategy.ShardedUnitOfWork, options: dict
+) -> None:
+    with pytest.raises(ValueError):
+        bootstrap.bootstrap(
+            start_orm=False,
+            uow=sharded_uow,
+            notifications=mock.Mock(),
+            publish=mock.Mock(),
+            **options,
+        )
+
+
+def test_sku_locks_find_batches_through_the_directory(
+    bus: messagebus.MessageBus,
+    sharded_uow: unit_of_work_strategy.ShardedUnitOfWork,
+    shards: dict[str, Engine],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(config, "SHARD_URIS", ["sqlite://"] * len(shards))
+    monkeypatch.setattr(unit_of_work_strategy, "shard_engines", lambda urls: shards)
+    skus = one_sku_per_shard(sharded_uow.ring)
+    sku = skus["shard-2"]
+    bus.handle(commands.CreateBatch(ref="b1", sku=sku, qty=10, eta=None))
+    monkeypatch.setattr(config, "SKU_LOCK_TIMEOUT", 0.05)
+    lock = bootstrap.process_sku_lock.__wrapped__("local")
+
+    with lock.hold_batch("b1"), lock.hold_batch("unknown"):
+        contender = ThreadPoolExecutor(1).submit(lambda: lock.hold(sku).__enter__())
+        with pytest.raises(sku_locks.SkuLockTimeout):
+            contender.result(timeout=5)
+
+    assert lock.stats.acquired == 1
+
+
+def test_warm_up_connects_to_every_shard(monkeypatch: pytest.MonkeyPatch) -> None:
+    shard_uris = ["postgresql://shard-0/app", "postgresql://shard-1/app"]
+    monkeypatch.setattr(config, "SHARD_URIS", shard_uris)
+    engines: dict[str, mock.MagicMock] = {}
+    monkeypatch.setattr(
+        unit_of_work_strategy,
+        "get_engine",
+        lambda url: engines.setdefault(url, mock.MagicMock()),
+    )
+    monkeypatch.setattr(bootstrap.redis_event_publisher, "get_client", mock.Mock())
+
+    bootstrap.warm_up(connections=2)
+
+    assert set(shard_uris) <= set(engines)
+    assert [engine.connect.call_count for engine in engines.values()] == [2] * len(
+        engines
+    )
+
+
+def test_batches_a_shard_failed_to_commit_are_removed_from_the_directory(
+    bus: messagebus.MessageBus,
+    sharded_uow: unit_of_work_strategy.ShardedUnitOfWork,
+    shards: dict[str, Engine],
+) -> None:
+    skus = one_sku_per_shard(sharded_uow.ring)
+    failing = sharded_uow.session_factories["shard-1"]
+
+    def session_that_fails_to_commit():
+        session = failing()
+        session.commit = mock.Mock(side_effect=RuntimeError("shard-1 is down"))
+        return session
+
+    sharded_uow.session_factories["shard-1"] = session_that_fails_to_commit
+    with pytest.raises(RuntimeError):
+        with sharded_uow:
+            for sku in skus.values():
+                batch = model.Batch(
+                    reference=f"b-{sku}", sku=sku, purchased_quantity=10, eta=None
+                )
+                sharded_uow.products.add(model.Product(sku=sku, batches=[batch]))
+            sharded_uow.commit()
+
+    with shards["shard-0"].connect() as connection:
+        directory = dict(
+            connection.execute(text("SELECT * FROM batch_directory")).tuples().all()
+        )
+    assert directory == {
+        f"b-{sku}": sku for shard, sku in skus.items() if shard != "shard-1"
+    }
+    assert skus_in(shards["shard-1"]) == set()
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import pathlib
+import threading
+from collections.abc import Generator
+from unittest import mock
+
+import pytest
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.orm import clear_mappers, sessionmaker
+
+from src import bootstrap
+from src.adapters import orm, sku_locks, unit_of_work_strategy
+from src.domain import commands
+from src.service_layer import messagebus
+
+
+@pytest.fixture
+def engine(tmp_path: pathlib.Path) -> Engine:
+    # a file, so every thread's session sees the same database
+    engine = create_engine(f"sqlite:///{tmp_path / 'locks.db'}")
+    orm.mapper_registry.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture
+def sku_lock(engine: Engine) -> sku_locks.LocalSkuLock:
+    return sku_locks.LocalSkuLock(engine, timeout=0.05)
+
+
+@pytest.fixture
+def bus(
+    engine: Engine, sku_lock: sku_locks.LocalSkuLock
+) -> Generator[messagebus.MessageBus, None, None]:
+    clear_mappers()
+    yield bootstrap.bootstrap(
+        start_orm=True,
+        uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(sessionmaker(bind=engine)),
+        notifications=mock.Mock(),
+        publish=mock.Mock(),
+        sku_lock=sku_lock,
+    )
+    clear_mappers()
+
+
+def test_allocation_holds_the_sku_lock(
+    bus: messagebus.MessageBus, sku_lock: sku_locks.LocalSkuLock
+) -> None:
+    bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+    bus.handle(commands.Allocate(orderid="o1", sku="LAMP", qty=1))
+
+    assert sku_lock.stats.acquired == 1
+    assert sku_lock.stats.max_wait >= 0
+
+
+def test_batch_quantity_changes_lock_the_batch_sku(
+    bus: messagebus.MessageBus, sku_lock: sku_locks.LocalSkuLock
+) -> None:
+    bus.handle(commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None))
+    errors = []
+
+    def change_quantity() -> None:
+        try:
+            bus.handle(commands.ChangeBatchQuantity(ref="b1", qty=5))
+        except sku_locks.SkuLockTimeout as e:
+            errors.append(e)
+
+    with sku_lock.hold("LAMP"):
+        thread = threading.Thread(target=change_quantity)
+        thread.start()
+        thread.join()
+
+    assert len(errors) == 1
+
+    bus.handle(commands.ChangeBatchQuantity(ref="b1", qty=5))
+    assert sku_lock.stats.acquired == 2
+
+
+def test_times_out_while_another_thread_holds_the_sku(
+    sku_lock: sku_locks.LocalSkuLock,
+) -> None:
+    errors = []
+
+    def allocate() -> None:
+        try:
+            with sku_lock.hold("LAMP"):
+                pass
+        except sku_locks.SkuLockTimeout as e:
+            errors.append(e)
+
+    with sku_lock.hold("LAMP"):
+        thread = threading.Thread(target=allocate)
+        thread.start()
+        thread.join()
+    with sku_lock.hold("LAMP"):
+        pass
+
+    assert len(errors) == 1
+    assert sku_lock.stats.timeouts == 1
+    assert sku_lock.stats.acquired == 2
+
+
+def test_other_skus_are_not_held_up(sku_lock: sku_locks.LocalSkuLock) -> None:
+    acquired = threading.Event()
+
+    def allocate() -> None:
+        with sku_lock.hold("RUG"):
+            acquired.set()
+
+    with sku_lock.hold("LAMP"):
+        thread = threading.Thread(target=allocate)
+        thread.start()
+        thread.join()
+
+    assert acquired.is_set()
+
+
+def test_unknown_batches_take_no_lock(sku_lock: sku_locks.LocalSkuLock) -> None:
+    with sku_lock.hold_batch("nonexistent"):
+        pass
+
+    assert sku_lock.stats.acquired == 0
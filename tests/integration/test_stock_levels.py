@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Generator
+from datetime import date, timedelta
+from unittest import mock
+
+import pytest
+from sqlalchemy import Engine, text
+from sqlalchemy.orm import Session, clear_mappers
+
+from src import bootstrap, views
+from src.adapters import unit_of_work_strategy
+from src.domain import commands
+from src.service_layer import batch_import, messagebus, stock_levels
+
+today = date.today()
+tomorrow = today + timedelta(days=1)
+later = today + timedelta(days=10)
+
+
+@pytest.fixture
+def bus(
+    session_factory: Callable[[], Session]
+) -> Generator[messagebus.MessageBus, None, None]:
+    clear_mappers()
+    yield bootstrap.bootstrap(
+        start_orm=True,
+        uow=unit_of_work_strategy.SqlAlchemyUnitOfWork(session_factory),
+        notifications=mock.Mock(),
+        publish=lambda *args: None,
+    )
+    clear_mappers()
+
+
+def levels(bus: messagebus.MessageBus, sku: str) -> list[tuple]:
+    return [
+        (level.eta, level.purchased, level.allocated)
+        for level in views.stock_levels([sku], bus.uow).get(sku, [])
+    ]
+
+
+def expected_levels(bus: messagebus.MessageBus, sku: str) -> list[tuple]:
+    """The stock levels worked out from the product itself."""
+    totals: dict[date | None, tuple[int, int]] = {}
+    with bus.uow as uow:
+        product = uow.products.get(sku)
+        assert product is not None
+        for batch in product.batches:
+            purchased, allocated = totals.get(batch.eta, (0, 0))
+            totals[batch.eta] = (
+                purchased + batch.purchased_quantity,
+                allocated + batch.allocated_quantity,
+            )
+    return sorted(
+        ((eta, *total) for eta, total in totals.items()),
+        key=lambda level: level[0] or stock_levels.WAREHOUSE,
+    )
+
+
+def test_levels_follow_batches_and_allocations_per_eta(
+    bus: messagebus.MessageBus,
+) -> None:
+    bus.handle(commands.CreateBatch(ref="w1", sku="LAMP", qty=10, eta=None))
+    bus.handle(commands.CreateBatch(ref="w2", sku="LAMP", qty=5, eta=None))
+    bus.handle(commands.CreateBatch(ref="s1", sku="LAMP", qty=20, eta=tomorrow))
+    bus.handle(commands.CreateBatch(ref="s2", sku="LAMP", qty=30, eta=later))
+    for i in range(6):
+        bus.handle(commands.Allocate(orderid=f"o{i}", sku="LAMP", qty=4))
+
+    assert levels(bus, "LAMP") == [(None, 15, 12), (tomorrow, 20, 12), (later, 30, 0)]
+    assert levels(bus, "LAMP") == expected_levels(bus, "LAMP")
+
+
+def test_levels_follow_quantity_changes_reallocations_and_cancellations(
+    bus: messagebus.MessageBus,
+) -> None:
+    bus.handle(commands.CreateBatch(ref="w1", sku="LAMP", qty=20, eta=None))
+    bus.handle(commands.CreateBatch(ref="s1", sku="LAMP", qty=20, eta=tomorrow))
+    for i in range(4):
+        bus.handle(commands.Allocate(orderid=f"o{i}", sku="LAMP", qty=5))
+
+    bus.handle(commands.ChangeBatchQuantity(ref="w1", qty=8))
+    assert levels(bus, "LAMP") == [(None, 8, 5), (tomorrow, 20, 15)]
+
+    bus.handle(commands.Deallocate(orderid="o0", sku="LAMP"))
+    assert levels(bus, "LAMP") == expected_levels(bus, "LAMP")
+
+
+def test_available_by_counts_warehouse_stock_and_shipments_arriving_in_time(
+    bus: messagebus.MessageBus,
+) -> None:
+    bus.handle(commands.CreateBatch(ref="w1", sku="LAMP", qty=10, eta=None))
+    bus.handle(commands.CreateBatch(ref="s1", sku="LAMP", qty=20, eta=tomorrow))
+    bus.handle(commands.CreateBatch(ref="s2", sku="LAMP", qty=30, eta=later))
+    bus.handle(commands.Allocate(orderid="o1", sku="LAMP", qty=4))
+
+    lamp = views.stock_levels(["LAMP", "UNKNOWN"], bus.uow)
+
+    assert list(lamp) == ["LAMP"]
+    assert views.available_by(lamp["LAMP"], today) == 6
+    assert views.available_by(lamp["LAMP"], tomorrow) == 26
+    assert views.available_by(lamp["LAMP"], later) == 56
+
+
+def test_imported_batches_are_counted(
+    bus: messagebus.MessageBus, in_memory_db: Engine
+) -> None:
+    bus.handle(commands.CreateBatch(ref="w1", sku="LAMP", qty=10, eta=None))
+    lines = ["ref,sku,qty,eta", f"s1,LAMP,20,{tomorrow}", "w2,RUG,5,"]
+
+    batch_import.import_batches(bus.uow, batch_import.CSV, lines, chunk_size=10)
+
+    assert levels(bus, "LAMP") == [(None, 10, 0), (tomorrow, 20, 0)]
+    assert levels(bus, "RUG") == [(None, 5, 0)]
+    with in_memory_db.begin() as conn:
+        conn.execute(text("DELETE FROM stock_levels"))
+    with bus.uow as uow:
+        stock_levels.rebuild(uow, ["LAMP", "RUG"])
+        uow.commit()
+    assert levels(bus, "LAMP") == [(None, 10, 0), (tomorrow, 20, 0)]
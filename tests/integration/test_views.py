@@ -62,3 +62,25 @@ def test_deallocation(sqlite_bus: messagebus.MessageBus) -> None:
     assert views.allocations("o1", sqlite_bus.uow) == [
         events.AllocationsViewed(orderid="o1", sku="sku1", batchref="b2"),
     ]
+
+
+def test_cancelled_allocation_is_removed_from_the_view(
+    sqlite_bus: messagebus.MessageBus,
+) -> None:
+    sqlite_bus.handle(commands.CreateBatch(ref="b1", sku="sku1", qty=50, eta=None))
+    sqlite_bus.handle(commands.Allocate(orderid="o1", sku="sku1", qty=40))
+    sqlite_bus.handle(commands.Deallocate(orderid="o1", sku="sku1"))
+
+    assert views.allocations("o1", sqlite_bus.uow) == []
+    with sqlite_bus.uow as uow:
+        product = uow.products.get("sku1")
+        assert product is not None
+        [batch] = product.batches
+        assert batch.allocations == set()
+        assert batch.allocated_quantity == 0
+
+
+def test_sku_for_batchref(sqlite_bus: messagebus.MessageBus) -> None:
+    sqlite_bus.handle(commands.CreateBatch(ref="b1", sku="sku1", qty=50, eta=None))
+    assert views.sku_for_batchref("b1", sqlite_bus.uow) == "sku1"
+    assert views.sku_for_batchref("missing", sqlite_bus.uow) is None
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections.abc import Callable
+
+import pytest
+
+from src.domain import commands
+from src.service_layer import admission
+
+
+def hold(
+    controller: admission.AdmissionController,
+    command_type: type[commands.Command],
+    release: threading.Event,
+    log: list,
+) -> threading.Thread:
+    """Runs a command on a thread that holds its slot until ``release`` is set."""
+
+    def run() -> None:
+        try:
+            with controller.admit(command_type):
+                log.append(command_type)
+                release.wait(5)
+        except admission.Rejected as e:
+            log.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_for(condition: Callable[[], bool]) -> None:
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_zero_capacity_admits_everything() -> None:
+    controller = admission.AdmissionController(capacity=0)
+    with controller.admit(commands.Allocate), controller.admit(commands.Allocate):
+        assert controller.running == 0
+
+
+def test_runs_up_to_capacity_and_queues_the_rest() -> None:
+    controller = admission.AdmissionController(capacity=2, timeout=5)
+    release, log = threading.Event(), []
+    threads = [hold(controller, commands.Allocate, release, log) for _ in range(3)]
+    wait_for(lambda: controller.running == 2 and controller.queued == 1)
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert log == [commands.Allocate] * 3
+    assert controller.running == 0
+
+
+def test_bulk_commands_are_held_to_their_share() -> None:
+    controller = admission.AdmissionController(capacity=4, timeout=5)
+    release, log = threading.Event(), []
+    threads = [hold(controller, commands.CreateBatch, release, log) for _ in range(3)]
+    wait_for(lambda: controller.running == 2 and controller.queued == 1)
+
+    # interactive commands still get the capacity bulk ones may not use
+    with controller.admit(commands.Allocate):
+        assert controller.running == 3
+
+    release.set()
+    for thread in threads:
+        thread.join()
+
+
+def test_interactive_commands_are_admitted_before_bulk_ones() -> None:
+    controller = admission.AdmissionController(capacity=1, timeout=5)
+    first, rest, log = threading.Event(), threading.Event(), []
+    running = hold(controller, commands.Allocate, first, log)
+    wait_for(lambda: controller.running == 1)
+    bulk = hold(controller, commands.CreateBatch, rest, log)
+    wait_for(lambda: controller.queued == 1)
+    interactive = hold(controller, commands.Allocate, rest, log)
+    wait_for(lambda: controller.queued == 2)
+
+    first.set()
+    running.join()
+    wait_for(lambda: len(log) == 2)
+    rest.set()
+    bulk.join()
+    interactive.join()
+    assert log == [commands.Allocate, commands.Allocate, commands.CreateBatch]
+
+
+def test_rejects_with_429_when_the_queue_is_full() -> None:
+    controller = admission.AdmissionController(capacity=1, max_queue=1, timeout=5)
+    release, log = threading.Event(), []
+    threads = [hold(controller, commands.Allocate, release, log) for _ in range(2)]
+    wait_for(lambda: controller.running == 1 and controller.queued == 1)
+
+    with pytest.raises(admission.Rejected) as rejected:
+        with controller.admit(commands.Allocate):
+            pass
+    assert rejected.value.status_code == 429
+    assert rejected.value.retry_after >= 1
+    assert controller.rejected == 1
+
+    release.set()
+    for thread in threads:
+        thread.join()
+
+
+def test_interactive_command_displaces_a_waiting_bulk_one() -> None:
+    controller = admission.AdmissionController(capacity=1, max_queue=1, timeout=5)
+    release, log = threading.Event(), []
+    running = hold(controller, commands.Allocate, release, log)
+    wait_for(lambda: controller.running == 1)
+    bulk = hold(controller, commands.CreateBatch, release, log)
+    wait_for(lambda: controller.queued == 1)
+    interactive = hold(controller, commands.Allocate, release, log)
+
+    bulk.join()
+    [shed] = [entry for entry in log if isinstance(entry, admission.Rejected)]
+    assert shed.status_code == 429
+    release.set()
+    running.join()
+    interactive.join()
+    assert log.count(commands.Allocate) == 2
+
+
+def test_rejects_with_503_after_waiting_too_long() -> None:
+    controller = admission.AdmissionController(capacity=1, timeout=0.05)
+    release, log = threading.Event(), []
+    thread = hold(controller, commands.Allocate, release, log)
+    wait_for(lambda: controller.running == 1)
+
+    with pytest.raises(admission.Rejected) as rejected:
+        with controller.admit(commands.Allocate):
+            pass
+    assert rejected.value.status_code == 503
+    assert controller.queued == 0
+
+    release.set()
+    thread.join()
+
+
+def test_waits_on_the_event_loop_for_a_slot() -> None:
+    controller = admission.AdmissionController(capacity=1, timeout=5)
+    release, log = threading.Event(), []
+    thread = hold(controller, commands.Allocate, release, log)
+    wait_for(lambda: controller.running == 1)
+
+    async def admit() -> int:
+        async with controller.admit_async(commands.Allocate):
+            return controller.running
+
+    async def main() -> int:
+        waiting = asyncio.ensure_future(admit())
+        while controller.queued == 0:
+            await asyncio.sleep(0.01)
+        release.set()
+        return await waiting
+
+    assert asyncio.run(main()) == 1
+    thread.join()
+    assert controller.running == 0
+
+
+def test_async_waiters_time_out_and_give_up_their_place_when_cancelled() -> None:
+    controller = admission.AdmissionController(capacity=1, timeout=0.05)
+    release, log = threading.Event(), []
+    thread = hold(controller, commands.Allocate, release, log)
+    wait_for(lambda: controller.running == 1)
+
+    async def admit() -> None:
+        async with controller.admit_async(commands.Allocate):
+            pass
+
+    with pytest.raises(admission.Rejected) as rejected:
+        asyncio.run(admit())
+    assert rejected.value.status_code == 503
+
+    async def cancelled() -> None:
+        controller.timeout = 5
+        waiting = asyncio.ensure_future(admit())
+        while controller.queued == 0:
+            await asyncio.sleep(0.01)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    asyncio.run(cancelled())
+    assert controller.queued == 0
+    release.set()
+    thread.join()
+    assert controller.running == 0
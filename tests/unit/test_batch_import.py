@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from datetime import date
+
+from src.domain import commands
+from src.service_layer import batch_import
+
+
+def test_decode_lines_handles_lines_split_across_chunks() -> None:
+    chunks = [b"ref,sku\r\nb1,", b"LAMP\nb2,\xc3", b"\xa9\n", b"b3,SOFA"]
+    assert list(batch_import.decode_lines(chunks)) == [
+        "ref,sku",
+        "b1,LAMP",
+        "b2,é",
+        "b3,SOFA",
+    ]
+
+
+def test_parses_csv_and_records_invalid_rows() -> None:
+    report = batch_import.ImportReport()
+    lines = ["ref,sku,qty,eta", "b1,LAMP,10,", "b2,LAMP,ten,", "b3,LAMP,5,2030-01-01"]
+
+    parsed = list(batch_import.parse(batch_import.CSV, lines, report))
+
+    assert parsed == [
+        commands.CreateBatch(ref="b1", sku="LAMP", qty=10, eta=None),
+        commands.CreateBatch(ref="b3", sku="LAMP", qty=5, eta=date(2030, 1, 1)),
+    ]
+    assert [error.line for error in report.errors] == [3]
+
+
+def test_parses_ndjson_skipping_blank_lines() -> None:
+    report = batch_import.ImportReport()
+    lines = ['{"ref": "b1", "sku": "LAMP", "qty": 1, "eta": null}', "", "{oops"]
+
+    parsed = list(batch_import.parse(batch_import.NDJSON, lines, report))
+
+    assert parsed == [commands.CreateBatch(ref="b1", sku="LAMP", qty=1, eta=None)]
+    assert [error.line for error in report.errors] == [3]
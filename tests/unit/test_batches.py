@@ -62,3 +62,25 @@ def test_allocation_is_idempotent() -> None:
     batch.allocate(line=line)
     batch.allocate(line=line)
     assert batch.available_quantity == 18
+
+
+def test_deallocating_restores_the_available_quantity() -> None:
+    batch, line = make_batch_and_line("DECORATIVE-TRINKET", 20, 2)
+    batch.allocate(line)
+    assert batch.deallocate_one() == line
+    assert batch.allocated_quantity == 0
+    assert batch.available_quantity == 20
+
+
+def test_allocated_quantity_is_computed_from_initial_allocations() -> None:
+    batch = Batch(
+        reference="batch-001",
+        sku="DECORATIVE-TRINKET",
+        purchased_quantity=20,
+        eta=None,
+        allocations={
+            OrderLine(orderid="o1", sku="DECORATIVE-TRINKET", qty=3),
+            OrderLine(orderid="o2", sku="DECORATIVE-TRINKET", qty=4),
+        },
+    )
+    assert batch.allocated_quantity == 7
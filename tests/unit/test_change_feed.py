@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from src.adapters import change_feed
+from src.domain import events
+
+
+def allocated(orderid: str, sku: str = "LAMP") -> events.Allocated:
+    return events.Allocated(orderid=orderid, sku=sku, qty=1, batchref="b1")
+
+
+def test_subscriptions_only_get_their_orders_and_skus() -> None:
+    async def scenario() -> tuple[list, list, list]:
+        feed = change_feed.ChangeFeed()
+        by_order = feed.subscribe(orderid="o1")
+        by_sku = feed.subscribe(sku="TABLE")
+        both = feed.subscribe(orderid="o2", sku="LAMP")
+        for change in [
+            allocated("o1"),
+            allocated("o2", sku="TABLE"),
+            allocated("o2"),
+            events.Deallocated(orderid="o1", sku="LAMP", qty=1),
+        ]:
+            feed.publish(change)
+        return (
+            await by_order.next(timeout=1),
+            await by_sku.next(timeout=1),
+            await both.next(timeout=1),
+        )
+
+    by_order, by_sku, both = asyncio.run(scenario())
+
+    assert by_order == [
+        allocated("o1"),
+        events.Deallocated(orderid="o1", sku="LAMP", qty=1),
+    ]
+    assert by_sku == [allocated("o2", sku="TABLE")]
+    assert both == [allocated("o2")]
+
+
+def test_changes_published_from_another_thread_wake_the_subscriber() -> None:
+    async def scenario() -> list:
+        feed = change_feed.ChangeFeed()
+        subscription = feed.subscribe(orderid="o1")
+        threading.Timer(0.05, feed.publish, args=(allocated("o1"),)).start()
+        return await subscription.next(timeout=5)
+
+    assert asyncio.run(scenario()) == [allocated("o1")]
+
+
+def test_slow_subscribers_keep_the_latest_changes_and_count_the_rest() -> None:
+    async def scenario() -> tuple[list, int]:
+        feed = change_feed.ChangeFeed(buffer=3)
+        subscription = feed.subscribe(sku="LAMP")
+        for i in range(5):
+            feed.publish(allocated(f"o{i}"))
+        await asyncio.sleep(0)
+        return await subscription.next(timeout=1), subscription.dropped
+
+    changes, dropped = asyncio.run(scenario())
+
+    assert [c.orderid for c in changes] == ["o2", "o3", "o4"]
+    assert dropped == 2
+
+
+def test_next_returns_nothing_on_timeout() -> None:
+    async def scenario() -> list:
+        feed = change_feed.ChangeFeed()
+        return await feed.subscribe(orderid="o1").next(timeout=0.01)
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_subscribers_are_bounded_and_released() -> None:
+    async def scenario() -> int:
+        feed = change_feed.ChangeFeed(max_subscribers=1)
+        subscription = feed.subscribe(orderid="o1")
+        with pytest.raises(change_feed.TooManySubscribers):
+            feed.subscribe(orderid="o2")
+        feed.unsubscribe(subscription)
+        feed.subscribe(orderid="o2")
+        return len(feed)
+
+    assert asyncio.run(scenario()) == 1
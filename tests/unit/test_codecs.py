@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+
+from src.adapters import codecs
+from src.domain import commands, events
+
+
+def test_json_round_trip_of_events_and_commands() -> None:
+    codec = codecs.Codec()
+    event = events.Allocated(orderid="o1", sku="SKU", qty=3, batchref="b1")
+    command = commands.CreateBatch(ref="b1", sku="SKU", qty=3, eta=date(2011, 1, 2))
+
+    assert codec.decode(events.Allocated, codec.encode(event)) == event
+    assert codec.decode(commands.CreateBatch, codec.encode(command)) == command
+
+
+def test_decodes_json_produced_by_pydantic() -> None:
+    command = commands.ChangeBatchQuantity(ref="b1", qty=5)
+    decoded = codecs.Codec().decode(
+        commands.ChangeBatchQuantity, command.model_dump_json()
+    )
+    assert decoded == command
+
+
+def test_bulk_round_trip() -> None:
+    codec = codecs.Codec()
+    views = [
+        events.AllocationsViewed(orderid="o1", sku=f"SKU{i}", batchref="b1")
+        for i in range(3)
+    ]
+    encoded = codec.encode_many(events.AllocationsViewed, views)
+    assert codec.decode_many(events.AllocationsViewed, encoded) == views
+
+
+def test_msgpack_round_trip_with_header() -> None:
+    pytest.importorskip("msgpack")
+    codec = codecs.Codec(fmt=codecs.MSGPACK)
+    command = commands.CreateBatch(ref="b1", sku="SKU", qty=3, eta=date(2011, 1, 2))
+
+    encoded = codec.encode(command)
+
+    assert encoded.startswith(b"AP")
+    assert codec.decode(commands.CreateBatch, encoded) == command
+    assert codecs.Codec().decode(commands.CreateBatch, encoded) == command
+
+
+def test_rejects_unknown_schema_versions() -> None:
+    pytest.importorskip("msgpack")
+    encoded = codecs.Codec(fmt=codecs.MSGPACK, schema_version=2).encode(
+        events.OutOfStock(sku="SKU")
+    )
+    with pytest.raises(codecs.UnsupportedPayload, match="schema version 2"):
+        codecs.Codec().decode(events.OutOfStock, encoded)
+
+
+def test_registry_resolves_type_names() -> None:
+    assert codecs.registry.type_for("Allocated") is events.Allocated
+    with pytest.raises(codecs.UnsupportedPayload):
+        codecs.registry.type_for("Nope")
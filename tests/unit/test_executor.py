@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Generator
+
+import pytest
+
+from src.domain import commands
+from src.service_layer import executor, handlers
+
+
+class RecordingBus:
+    handled: list[tuple[str, commands.Command]] = []
+    lock = threading.Lock()
+
+    def handle(self, message: commands.Command) -> None:
+        if isinstance(message, commands.Allocate) and message.qty < 0:
+            raise ValueError("negative quantity")
+        with self.lock:
+            self.handled.append((threading.current_thread().name, message))
+
+
+@pytest.fixture
+def lanes() -> Generator[executor.ShardedCommandExecutor, None, None]:
+    RecordingBus.handled = []
+    ex = executor.ShardedCommandExecutor(
+        bus_factory=RecordingBus,  # type: ignore[arg-type]
+        lanes=4,
+        resolve_sku={"b1": "SKU-1"}.get,
+    )
+    yield ex
+    ex.shutdown()
+
+
+def test_commands_for_the_same_sku_run_in_order_on_one_lane(
+    lanes: executor.ShardedCommandExecutor,
+) -> None:
+    allocations = [
+        commands.Allocate(orderid=f"o{i}", sku="SKU-1", qty=1) for i in range(50)
+    ]
+    futures = [lanes.submit(c) for c in allocations]
+    for f in futures:
+        f.result(timeout=5)
+
+    assert [c for _, c in RecordingBus.handled] == allocations
+    assert len({thread for thread, _ in RecordingBus.handled}) == 1
+
+
+def test_change_batch_quantity_is_routed_by_the_batch_sku(
+    lanes: executor.ShardedCommandExecutor,
+) -> None:
+    allocate = commands.Allocate(orderid="o1", sku="SKU-1", qty=1)
+    change = commands.ChangeBatchQuantity(ref="b1", qty=10)
+    assert lanes.lane_for(change) == lanes.lane_for(allocate)
+
+
+def test_change_batch_quantity_follows_a_batch_created_through_the_lanes(
+    lanes: executor.ShardedCommandExecutor,
+) -> None:
+    create = commands.CreateBatch(ref="b2", sku="SKU-2", qty=10, eta=None)
+    change = commands.ChangeBatchQuantity(ref="b2", qty=5)
+    futures = [lanes.submit(create), lanes.submit(change)]
+    for f in futures:
+        f.result(timeout=5)
+
+    assert [c for _, c in RecordingBus.handled] == [create, change]
+    assert lanes.lane_for(change) == lanes.lane_for(create)
+
+
+def test_change_batch_quantity_for_an_unknown_batch_is_rejected(
+    lanes: executor.ShardedCommandExecutor,
+) -> None:
+    future = lanes.submit(commands.ChangeBatchQuantity(ref="unknown", qty=5))
+    with pytest.raises(handlers.InvalidRef, match="unknown"):
+        future.result(timeout=5)
+    assert RecordingBus.handled == []
+
+
+def test_a_lane_whose_bus_cannot_be_built_fails_its_commands() -> None:
+    def broken_bus() -> RecordingBus:
+        raise RuntimeError("database unreachable")
+
+    lanes = executor.ShardedCommandExecutor(
+        bus_factory=broken_bus,  # type: ignore[arg-type]
+        lanes=1,
+        resolve_sku={}.get,
+        queue_size=1,
+    )
+    futures = [
+        lanes.submit(commands.Allocate(orderid=f"o{i}", sku="SKU-1", qty=1))
+        for i in range(3)
+    ]
+    for f in futures:
+        with pytest.raises(RuntimeError, match="database unreachable"):
+            f.result(timeout=5)
+    lanes.shutdown()
+    assert [s.failed for s in lanes.stats()] == [3]
+
+
+def test_failures_are_reported_on_the_future(
+    lanes: executor.ShardedCommandExecutor,
+) -> None:
+    future = lanes.submit(commands.Allocate(orderid="o1", sku="SKU-1", qty=-1))
+    with pytest.raises(ValueError, match="negative quantity"):
+        future.result(timeout=5)
+    lanes.submit(commands.Allocate(orderid="o2", sku="SKU-1", qty=1)).result(5)
+
+    [stats] = [s for s in lanes.stats() if s.processed or s.failed]
+    assert (stats.processed, stats.failed, stats.queue_depth) == (1, 1, 0)
+
+
+class BlockingBus:
+    release = threading.Event()
+
+    def handle(self, message: commands.Command) -> None:
+        self.release.wait(timeout=5)
+
+
+def test_a_full_lane_holds_back_the_submitter() -> None:
+    BlockingBus.release.clear()
+    lanes = executor.ShardedCommandExecutor(
+        bus_factory=BlockingBus,  # type: ignore[arg-type]
+        lanes=1,
+        resolve_sku={}.get,
+        queue_size=1,
+    )
+    allocations = [
+        commands.Allocate(orderid=f"o{i}", sku="SKU-1", qty=1) for i in range(3)
+    ]
+    futures = [lanes.submit(allocations[0])]
+    while not futures[0].running():
+        time.sleep(0.01)
+    futures.append(lanes.submit(allocations[1]))  # waits in the queue
+
+    submitter = threading.Thread(
+        target=lambda: futures.append(lanes.submit(allocations[2]))
+    )
+    submitter.start()
+    submitter.join(timeout=0.2)
+    assert submitter.is_alive()
+    assert [s.queue_depth for s in lanes.stats()] == [1]
+
+    BlockingBus.release.set()
+    submitter.join(timeout=5)
+    for f in futures:
+        f.result(timeout=5)
+    lanes.shutdown()
+    assert [s.processed for s in lanes.stats()] == [3]
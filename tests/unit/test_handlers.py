@@ -7,9 +7,14 @@ from typing import Any, Self
 import pytest
 
 from src import bootstrap
-from src.adapters import notifications, repository, unit_of_work_strategy
-from src.domain import commands, model
-from src.service_layer import handlers, messagebus
+from src.adapters import (
+    idempotency,
+    notifications,
+    repository,
+    unit_of_work_strategy,
+)
+from src.domain import commands, events, model
+from src.service_layer import handlers, messagebus, unit_of_work
 
 
 class FakeRepository(repository.Repository[model.Product]):
@@ -29,6 +34,12 @@ class FakeRepository(repository.Repository[model.Product]):
             None,
         )
 
+    def allocations(self, sku: str, orderid: str) -> list[tuple[str, model.OrderLine]]:
+        product = self.get(sku)
+        if product is None:
+            return []
+        return [(b.reference, line) for b, line in product.allocations_for(orderid)]
+
 
 class FakeUnitOfWorkStrategy(unit_of_work_strategy.UnitOfWorkStrategy):
     def __init__(self) -> None:
@@ -50,6 +61,9 @@ class FakeUnitOfWorkStrategy(unit_of_work_strategy.UnitOfWorkStrategy):
     def execute(self, *args, **kwargs) -> Any:
         pass
 
+    def query(self, *args, **kwargs) -> Any:
+        pass
+
 
 class FakeNotifications(notifications.NotificationsProtocol):
     def __init__(self) -> None:
@@ -59,12 +73,26 @@ class FakeNotifications(notifications.NotificationsProtocol):
         self.sent[destination].append(message)
 
 
+class FakeDedupStore(idempotency.DedupStore):
+    def __init__(self) -> None:
+        self.keys: set[str] = set()
+
+    def seen(self, uow: unit_of_work.UnitOfWork, key: str) -> bool:
+        return key in self.keys
+
+    def record(self, uow: unit_of_work.UnitOfWork, key: str, command_type: str) -> None:
+        if key in self.keys:
+            raise idempotency.DuplicateCommand(key)
+        self.keys.add(key)
+
+
 def bootstrap_test_app() -> messagebus.MessageBus:
     return bootstrap.bootstrap(
         start_orm=False,
         uow=FakeUnitOfWorkStrategy(),
         notifications=FakeNotifications(),
         publish=lambda *args: None,
+        dedup_store=FakeDedupStore(),
     )
 
 
@@ -131,6 +159,39 @@ class TestAllocate:
         ]
 
 
+class TestDeallocate:
+    def test_deallocates(self) -> None:
+        bus = bootstrap_test_app()
+        bus.handle(
+            commands.CreateBatch(ref="b1", sku="WOBBLY-SHELF", qty=100, eta=None)
+        )
+        bus.handle(commands.Allocate(orderid="o1", sku="WOBBLY-SHELF", qty=10))
+
+        bus.handle(commands.Deallocate(orderid="o1", sku="WOBBLY-SHELF"))
+
+        product = bus.uow.products.get("WOBBLY-SHELF")
+        assert product is not None
+        [batch] = product.batches
+        assert batch.available_quantity == 100
+
+    def test_cancelled_lines_are_not_reallocated(self) -> None:
+        bus = bootstrap_test_app()
+        bus.handle(commands.CreateBatch(ref="b1", sku="WOBBLY-SHELF", qty=10, eta=None))
+        bus.handle(commands.CreateBatch(ref="b2", sku="WOBBLY-SHELF", qty=10, eta=None))
+        bus.handle(commands.Allocate(orderid="o1", sku="WOBBLY-SHELF", qty=10))
+
+        bus.handle(commands.Deallocate(orderid="o1", sku="WOBBLY-SHELF"))
+
+        product = bus.uow.products.get("WOBBLY-SHELF")
+        assert product is not None
+        assert sum(b.allocated_quantity for b in product.batches) == 0
+
+    def test_errors_for_invalid_sku(self) -> None:
+        bus = bootstrap_test_app()
+        with pytest.raises(handlers.InvalidSku, match="Invalid sku NONEXISTENTSKU"):
+            bus.handle(commands.Deallocate(orderid="o1", sku="NONEXISTENTSKU"))
+
+
 class TestChangeBatchQuantity:
     def test_changes_available_quantity(self) -> None:
         bus = bootstrap_test_app()
@@ -171,3 +232,70 @@ class TestChangeBatchQuantity:
         assert batch1.available_quantity == 5
         # and 20 will be reallocated to the next batch
         assert batch2.available_quantity == 30
+
+    def test_bulk_reallocation_emits_the_same_events(self) -> None:
+        published: list[events.Event] = []
+        bus = bootstrap.bootstrap(
+            start_orm=False,
+            uow=FakeUnitOfWorkStrategy(),
+            notifications=FakeNotifications(),
+            publish=lambda channel, event: published.append(event),
+            dedup_store=FakeDedupStore(),
+            bulk_reallocation=True,
+        )
+        bus.handle(commands.CreateBatch(ref="b1", sku="LOW-STOOL", qty=50, eta=None))
+        bus.handle(
+            commands.CreateBatch(ref="b2", sku="LOW-STOOL", qty=50, eta=date.today())
+        )
+        bus.handle(commands.Allocate(orderid="o1", sku="LOW-STOOL", qty=20))
+        bus.handle(commands.Allocate(orderid="o2", sku="LOW-STOOL", qty=20))
+        published.clear()
+
+        bus.handle(commands.ChangeBatchQuantity(ref="b1", qty=25))
+
+        product = bus.uow.products.get("LOW-STOOL")
+        assert product is not None
+        [batch1, batch2] = product.batches
+        assert batch1.available_quantity == 5
+        assert batch2.available_quantity == 30
+        [allocated] = [e for e in published if isinstance(e, events.Allocated)]
+        assert allocated.batchref == "b2"  # type: ignore[attr-defined]
+
+
+class TestIdempotency:
+    def test_duplicate_command_is_only_handled_once(self) -> None:
+        bus = bootstrap_test_app()
+        bus.handle(commands.CreateBatch(ref="b1", sku="FUSSY-SOFA", qty=100, eta=None))
+        allocate = commands.Allocate(
+            orderid="o1", sku="FUSSY-SOFA", qty=10, idempotency_key="k1"
+        )
+        bus.handle(allocate)
+        bus.handle(allocate)
+        product = bus.uow.products.get("FUSSY-SOFA")
+        assert product is not None
+        [batch] = product.batches
+        assert batch.available_quantity == 90
+
+    def test_commands_without_a_key_are_not_deduplicated(self) -> None:
+        bus = bootstrap_test_app()
+        bus.handle(commands.CreateBatch(ref="b1", sku="FUSSY-SOFA", qty=100, eta=None))
+        bus.handle(commands.Allocate(orderid="o1", sku="FUSSY-SOFA", qty=10))
+        bus.handle(commands.Allocate(orderid="o2", sku="FUSSY-SOFA", qty=10))
+        product = bus.uow.products.get("FUSSY-SOFA")
+        assert product is not None
+        [batch] = product.batches
+        assert batch.available_quantity == 80
+
+    def test_failed_command_can_be_retried(self) -> None:
+        bus = bootstrap_test_app()
+        allocate = commands.Allocate(
+            orderid="o1", sku="LATE-SKU", qty=10, idempotency_key="k1"
+        )
+        with pytest.raises(handlers.InvalidSku):
+            bus.handle(allocate)
+        bus.handle(commands.CreateBatch(ref="b1", sku="LATE-SKU", qty=100, eta=None))
+        bus.handle(allocate)
+        product = bus.uow.products.get("LATE-SKU")
+        assert product is not None
+        [batch] = product.batches
+        assert batch.available_quantity == 90
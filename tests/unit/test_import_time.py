@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+IMPORT_BUDGET_SECONDS = float(os.environ.get("IMPORT_BUDGET_SECONDS", 2.0))
+
+SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import src.entrypoints.fastapi_app
+print(time.perf_counter() - start)
+print(",".join(m for m in ("redis", "smtplib") if m in sys.modules))
+"""
+
+
+def test_app_imports_within_budget_without_connecting_adapters() -> None:
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT], capture_output=True, text=True, check=True
+    )
+    elapsed, eagerly_imported = result.stdout.splitlines()
+
+    assert float(elapsed) < IMPORT_BUDGET_SECONDS
+    assert eagerly_imported == ""
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from src.domain import commands, events
+from src.service_layer import messagebus
+
+allocated = events.Allocated(orderid="o1", sku="LAMP", qty=1, batchref="b1")
+
+
+class Emitting:
+    """Stands in for a handler's own unit of work, holding the messages it raised."""
+
+    def __init__(self, *messages: messagebus.Message) -> None:
+        self.messages = list(messages)
+
+    def collect_new_events(self) -> list[messagebus.Message]:
+        collected, self.messages = self.messages, []
+        return collected
+
+
+def handler(
+    body: Callable[[], None], *emits: messagebus.Message, independent: bool = True
+) -> Callable:
+    def run(event: events.Event) -> None:
+        body()
+
+    run.independent = independent  # type: ignore[attr-defined]
+    run.uow = Emitting(*emits)  # type: ignore[attr-defined]
+    return run
+
+
+def make_bus(handlers: list[Callable]) -> messagebus.MessageBus:
+    return messagebus.MessageBus(
+        uow=Emitting(),  # type: ignore[arg-type]
+        event_handlers={events.Allocated: handlers},
+        command_handlers={commands.Deallocate: lambda cmd: None},
+        executor=ThreadPoolExecutor(max_workers=4),
+    )
+
+
+def test_independent_handlers_run_concurrently() -> None:
+    # each handler waits for the other, so running them in turn would time out
+    barrier = threading.Barrier(2, timeout=5)
+    bus = make_bus([handler(barrier.wait), handler(barrier.wait)])
+
+    bus.handle(allocated)
+
+    assert not barrier.broken
+
+
+def test_new_messages_are_queued_in_handler_order() -> None:
+    handled: list[messagebus.Message] = []
+    first = commands.Deallocate(orderid="first", sku="LAMP")
+    second = commands.Deallocate(orderid="second", sku="LAMP")
+    third = commands.Deallocate(orderid="third", sku="LAMP")
+    bus = make_bus(
+        [
+            handler(lambda: time.sleep(0.05), first),
+            handler(lambda: None, second, independent=False),
+            handler(lambda: None, third),
+        ]
+    )
+    bus.command_handlers[commands.Deallocate] = handled.append
+
+    bus.handle(allocated)
+
+    assert handled == [first, second, third]
+
+
+def test_a_failing_handler_does_not_stop_the_others() -> None:
+    ran = []
+
+    def fail() -> None:
+        raise RuntimeError("redis is down")
+
+    bus = make_bus([handler(fail), handler(lambda: ran.append(True))])
+
+    bus.handle(allocated)
+
+    assert ran == [True]
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from src.domain import model
+from src.service_layer import planning
+
+np = pytest.importorskip("numpy")
+
+today = date.today()
+
+
+def random_products(rng: random.Random, skus: list[str]) -> list[model.Product]:
+    return [
+        model.Product(
+            sku=sku,
+            batches=[
+                model.Batch(
+                    reference=f"{sku}-batch{i}",
+                    sku=sku,
+                    purchased_quantity=rng.randint(0, 60),
+                    eta=rng.choice(
+                        [None, today, today + timedelta(days=rng.randint(1, 3))]
+                    ),
+                )
+                for i in range(rng.randint(1, 6))
+            ],
+        )
+        for sku in skus
+    ]
+
+
+def random_lines(rng: random.Random, skus: list[str]) -> list[model.OrderLine]:
+    return [
+        model.OrderLine(
+            orderid=f"order{i}", sku=rng.choice(skus), qty=rng.randint(1, 25)
+        )
+        for i in range(rng.randint(1, 80))
+    ]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_plan_matches_allocating_each_line_with_the_domain_model(seed: int) -> None:
+    rng = random.Random(seed)
+    skus = ["LAMP", "RUG", "SOFA"]
+    products = random_products(rng, skus)
+    lines = random_lines(rng, skus)
+
+    result = planning.plan(planning.stock_from_products(products), lines)
+
+    by_sku = {product.sku: product for product in products}
+    expected = [by_sku[line.sku].allocate(line) for line in lines]
+    assert result.batchrefs == [e.batchref if e else None for e in expected]
+
+
+def test_a_line_that_does_not_fit_is_skipped_by_later_smaller_ones() -> None:
+    stock = {
+        "LAMP": planning.SkuStock(
+            sku="LAMP",
+            batchrefs=["warehouse", "shipment"],
+            etas=[None, today],
+            available=np.array([10, 100]),
+        )
+    }
+    lines = [
+        model.OrderLine(orderid="o1", sku="LAMP", qty=6),
+        model.OrderLine(orderid="o2", sku="LAMP", qty=6),
+        model.OrderLine(orderid="o3", sku="LAMP", qty=4),
+    ]
+
+    result = planning.plan(stock, lines)
+
+    assert result.batchrefs == ["warehouse", "shipment", "warehouse"]
+    assert result.etas == [None, today, None]
+    assert list(stock["LAMP"].available) == [10, 100]
+
+
+def test_reports_where_each_sku_runs_out() -> None:
+    stock = {
+        "LAMP": planning.SkuStock(
+            sku="LAMP", batchrefs=["b1"], etas=[None], available=np.array([5])
+        )
+    }
+    lines = [
+        model.OrderLine(orderid="o1", sku="LAMP", qty=3),
+        model.OrderLine(orderid="o2", sku="UNKNOWN", qty=1),
+        model.OrderLine(orderid="o3", sku="LAMP", qty=3),
+        model.OrderLine(orderid="o4", sku="LAMP", qty=2),
+    ]
+
+    result = planning.plan(stock, lines)
+
+    assert result.first_out_of_stock == {"UNKNOWN": 1, "LAMP": 2}
+    assert [line.orderid for line in result.out_of_stock] == ["o2", "o3"]
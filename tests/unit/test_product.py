@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import date, timedelta
 
-from src.domain import events
+from src.domain import deallocation, events
 from src.domain.model import Batch, OrderLine, Product
 
 today = date.today()
@@ -100,3 +100,88 @@ def test_increments_version_number() -> None:
     product.version_number = 7
     product.allocate(line)
     assert product.version_number == 8
+
+
+def make_product_with_lines(*quantities: int) -> tuple[Product, Batch]:
+    batch = Batch(reference="b1", sku="TALL-LAMP", purchased_quantity=100, eta=None)
+    for i, qty in enumerate(quantities):
+        batch.allocate(OrderLine(orderid=f"o{i}", sku="TALL-LAMP", qty=qty))
+    return Product(sku="TALL-LAMP", batches=[batch]), batch
+
+
+def test_shrinking_a_batch_evicts_the_fewest_lines() -> None:
+    product, batch = make_product_with_lines(1, 1, 1, 1, 1, 20)
+
+    evicted = product.change_batch_quantity(ref="b1", qty=20)
+
+    assert [line.qty for line in evicted] == [20]
+    assert batch.available_quantity == 15
+    assert product.messages == [
+        events.Deallocated(orderid="o5", sku="TALL-LAMP", qty=20)
+    ]
+
+
+def test_shrinking_a_batch_evicts_the_best_fitting_last_line() -> None:
+    product, batch = make_product_with_lines(30, 12, 8, 3)
+
+    evicted = product.change_batch_quantity(ref="b1", qty=20)
+
+    assert [line.qty for line in evicted] == [30, 3]
+    assert batch.available_quantity == 0
+
+
+def test_shrinking_a_batch_with_a_priority_policy() -> None:
+    product, batch = make_product_with_lines(5, 5, 5)
+
+    evicted = product.change_batch_quantity(
+        ref="b1",
+        qty=8,
+        policy=deallocation.by_priority(lambda line: line.orderid, reverse=True),
+    )
+
+    assert [line.orderid for line in evicted] == ["o2", "o1"]
+    assert batch.allocated_quantity == 5
+
+
+def test_growing_a_batch_evicts_nothing() -> None:
+    product, batch = make_product_with_lines(5, 5)
+
+    assert product.change_batch_quantity(ref="b1", qty=200) == []
+    assert product.messages == []
+
+
+def test_deallocate_cancels_every_line_of_the_order() -> None:
+    product, batch = make_product_with_lines(5, 7)
+
+    cancelled = product.deallocate("o1")
+
+    assert cancelled == [OrderLine(orderid="o1", sku="TALL-LAMP", qty=7)]
+    assert batch.allocated_quantity == 5
+    assert product.messages == [
+        events.AllocationCancelled(orderid="o1", sku="TALL-LAMP", qty=7, batchref="b1")
+    ]
+    assert product.deallocate("o1") == []
+
+
+def test_deallocate_cancels_lines_already_looked_up() -> None:
+    product, batch = make_product_with_lines(5, 7)
+    line = OrderLine(orderid="o1", sku="TALL-LAMP", qty=7)
+
+    assert product.deallocate("o1", [("b1", line)]) == [line]
+    assert batch.allocated_quantity == 5
+    assert product.allocations_for("o1") == []
+
+
+def test_allocations_for_follows_allocations_and_evictions() -> None:
+    product, batch = make_product_with_lines(5)
+    assert product.allocations_for("o0") == [
+        (batch, OrderLine(orderid="o0", sku="TALL-LAMP", qty=5))
+    ]
+
+    product.allocate(OrderLine(orderid="new", sku="TALL-LAMP", qty=3))
+    product.change_batch_quantity(ref="b1", qty=3)
+
+    assert product.allocations_for("o0") == []
+    assert product.allocations_for("new") == [
+        (batch, OrderLine(orderid="new", sku="TALL-LAMP", qty=3))
+    ]
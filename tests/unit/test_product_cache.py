@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from src.adapters.product_cache import ProductCache
+from src.domain.model import Batch, Product
+
+
+def make_product(sku: str, version_number: int = 0) -> Product:
+    return Product(
+        sku=sku,
+        batches=[
+            Batch(reference=f"{sku}-batch", sku=sku, purchased_quantity=10, eta=None)
+        ],
+        version_number=version_number,
+    )
+
+
+def test_evicts_least_recently_used_products() -> None:
+    cache = ProductCache(maxsize=2)
+    cache.put(make_product("a"))
+    cache.put(make_product("b"))
+    cache.get("a")
+    cache.put(make_product("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.sku_for_batchref("b-batch") is None
+    assert cache.sku_for_batchref("c-batch") == "c"
+
+
+def test_counts_hits_and_misses() -> None:
+    cache = ProductCache()
+    cache.put(make_product("a"))
+    cache.get("a")
+    cache.get("b")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_notifies_only_when_the_version_changes() -> None:
+    changed: list[str] = []
+    cache = ProductCache(on_put=changed.append)
+    cache.put(make_product("a", version_number=1))
+    cache.put(make_product("a", version_number=1))
+    cache.put(make_product("a", version_number=2))
+    assert changed == ["a", "a"]
+
+
+def test_invalidate_forgets_the_product() -> None:
+    cache = ProductCache()
+    cache.put(make_product("a"))
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    assert cache.sku_for_batchref("a-batch") is None
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import threading
+from collections import defaultdict
+from collections.abc import Callable, Generator
+from datetime import UTC, datetime
+
+import pytest
+
+from src.adapters import dead_letters
+from src.domain import events
+from src.service_layer import retries
+
+allocated = events.Allocated(orderid="o1", sku="LAMP", qty=1, batchref="b1")
+
+
+class FakeDeadLetterStore(dead_letters.DeadLetterStore):
+    def __init__(self) -> None:
+        self.letters: dict[int, dead_letters.DeadLetter] = {}
+        self.added = threading.Event()
+
+    def add(self, handler: str, event: events.Event, error: str, attempts: int) -> None:
+        id = len(self.letters) + 1
+        self.letters[id] = dead_letters.DeadLetter(
+            id, handler, event, error, attempts, datetime.now(UTC)
+        )
+        self.added.set()
+
+    def list(
+        self, handler: str | None = None, limit: int = 100
+    ) -> list[dead_letters.DeadLetter]:
+        return list(self.letters.values())[:limit]
+
+    def remove(self, id: int) -> None:
+        del self.letters[id]
+
+    def failed_again(self, id: int, error: str) -> None:
+        letter = self.letters[id]
+        self.letters[id] = dead_letters.DeadLetter(
+            id,
+            letter.handler,
+            letter.event,
+            error,
+            letter.attempts + 1,
+            letter.failed_at,
+        )
+
+
+class FlakyBus:
+    """Fails each handler a set number of times before it succeeds."""
+
+    def __init__(self, failures: int) -> None:
+        self.failures = failures
+        self.calls: defaultdict[str, int] = defaultdict(int)
+        self.succeeded = threading.Event()
+
+    def retry(self, handler_name: str, event: events.Event) -> None:
+        self.calls[handler_name] += 1
+        if self.calls[handler_name] <= self.failures:
+            raise ConnectionError("redis is down")
+        self.succeeded.set()
+
+
+def publish_allocated_event(event: events.Allocated) -> None:
+    pass
+
+
+publish_allocated_event.retry_policy = retries.RetryPolicy(  # type: ignore[attr-defined]
+    attempts=3, base_delay=0.01
+)
+
+
+@pytest.fixture
+def store() -> FakeDeadLetterStore:
+    return FakeDeadLetterStore()
+
+
+@pytest.fixture
+def start_scheduler(
+    store: FakeDeadLetterStore,
+) -> Generator[Callable[[FlakyBus], retries.RetryScheduler], None, None]:
+    started = []
+
+    def start(bus: FlakyBus) -> retries.RetryScheduler:
+        scheduler = retries.RetryScheduler(lambda: bus, store)  # type: ignore
+        scheduler.start()
+        started.append(scheduler)
+        return scheduler
+
+    yield start
+    for scheduler in started:
+        scheduler.stop()
+
+
+def test_backoff_doubles_up_to_the_maximum() -> None:
+    policy = retries.RetryPolicy(base_delay=1.0, max_delay=5.0)
+
+    assert [policy.delay(attempt) for attempt in range(1, 6)] == [1, 2, 4, 5, 5]
+
+
+def test_transient_failures_are_retried_in_the_background(
+    start_scheduler: Callable[[FlakyBus], retries.RetryScheduler],
+    store: FakeDeadLetterStore,
+) -> None:
+    bus = FlakyBus(failures=2)
+    scheduler = start_scheduler(bus)
+
+    scheduler.schedule(publish_allocated_event, allocated, ConnectionError())
+
+    assert bus.succeeded.wait(timeout=5)
+    assert bus.calls == {"publish_allocated_event": 3}
+    assert store.letters == {}
+
+
+def test_handlers_failing_every_retry_are_dead_lettered(
+    start_scheduler: Callable[[FlakyBus], retries.RetryScheduler],
+    store: FakeDeadLetterStore,
+) -> None:
+    bus = FlakyBus(failures=10)
+    scheduler = start_scheduler(bus)
+
+    scheduler.schedule(publish_allocated_event, allocated, ConnectionError())
+
+    assert store.added.wait(timeout=5)
+    [letter] = store.letters.values()
+    assert (letter.handler, letter.event, letter.attempts) == (
+        "publish_allocated_event",
+        allocated,
+        4,
+    )
+    assert "redis is down" in letter.error
+    assert bus.calls == {"publish_allocated_event": 3}
+
+
+def test_handlers_without_a_policy_are_dead_lettered_straight_away(
+    start_scheduler: Callable[[FlakyBus], retries.RetryScheduler],
+    store: FakeDeadLetterStore,
+) -> None:
+    bus = FlakyBus(failures=0)
+    scheduler = start_scheduler(bus)
+
+    def reallocate(event: events.Event) -> None:
+        pass
+
+    scheduler.schedule(reallocate, allocated, ValueError("boom"))
+
+    assert store.added.wait(timeout=5)
+    assert bus.calls == {}
+
+
+def test_replay_removes_dead_letters_that_now_succeed(
+    store: FakeDeadLetterStore,
+) -> None:
+    store.add("publish_allocated_event", allocated, "ConnectionError()", 4)
+    store.add("add_allocation_to_read_model", allocated, "OperationalError()", 4)
+    bus = FlakyBus(failures=0)
+
+    assert retries.replay_dead_letters(bus, store) == (2, 0)  # type: ignore
+    assert store.letters == {}